@@ -821,6 +821,7 @@ def pyrogram_api():
             Message.reply_voice
             Message.reply_web_page
             Message.get_media_group
+            Message.resolve_relations
             Message.react
             Message.transcribe
             Message.translate
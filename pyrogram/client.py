@@ -26,6 +26,8 @@ import platform
 import re
 import shutil
 import sys
+import time
+from collections import Counter, OrderedDict
 from concurrent.futures.thread import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from hashlib import sha256
@@ -33,7 +35,7 @@ from importlib import import_module
 from io import StringIO, BytesIO
 from mimetypes import MimeTypes
 from pathlib import Path
-from typing import Union, List, Optional, Callable, AsyncGenerator, Tuple
+from typing import Union, List, Optional, Callable, AsyncGenerator, Tuple, Iterable
 
 import pyrogram
 from pyrogram import __version__, __license__
@@ -43,20 +45,28 @@ from pyrogram import types
 from pyrogram import utils
 from pyrogram.crypto import aes
 from pyrogram.errors import CDNFileHashMismatch
+from pyrogram.filters import CommandRouter
 from pyrogram.errors import (
     SessionPasswordNeeded,
-    VolumeLocNotFound, ChannelPrivate,
+    VolumeLocNotFound, ChannelPrivate, FloodWait,
     BadRequest, ChannelInvalid, PersistentTimestampInvalid, PersistentTimestampOutdated
 )
 from pyrogram.handlers.handler import Handler
 from pyrogram.methods import Methods
 from pyrogram.session import Auth, Session
 from pyrogram.storage import FileStorage, MemoryStorage, Storage
+from pyrogram.storage.message_store import MessageStore
+from pyrogram.storage.peer_buffer import PeerBuffer
+from pyrogram.storage.state_buffer import StateBuffer
 from pyrogram.types import User
+from pyrogram.types.pyromod.listener_index import ListenerIndex
 from pyrogram.utils import ainput
 from .connection import Connection
 from .connection.transport import TCPAbridged
+from .difference_batcher import DifferenceBatcher
 from .dispatcher import Dispatcher
+from .reply_loader import ReplyLoader
+from .updates_sequencer import UpdatesSequencer
 from .file_id import FileId, FileType, ThumbnailSource
 from .mime_types import mime_types
 from .parser import Parser
@@ -73,6 +83,16 @@ else:
     from pyrogram.storage import MongoStorage
     MONGO_AVAIL = True
 
+REDIS_AVAIL = False
+
+try:
+    import redis as redis_lib
+except Exception:
+    pass
+else:
+    from pyrogram.storage import RedisStorage
+    REDIS_AVAIL = True
+
 
 class Client(Methods):
     """Pyrogram Client, the main means for interacting with Telegram.
@@ -145,6 +165,10 @@ class Client(Methods):
             Mongodb config as dict, e.g.: *dict(connection=async_pymongo.AsyncClient("mongodb://..."), remove_peers=False)*.
             Only applicable for new sessions.
 
+        redis (``dict``, *optional*):
+            Redis config as dict, e.g.: *dict(connection=redis.asyncio.Redis.from_url("redis://..."), remove_peers=False)*.
+            Lets several processes share one session. Only applicable for new sessions.
+
         storage (:obj:`~pyrogram.storage.Storage`, *optional*):
             Custom session storage.
 
@@ -164,6 +188,40 @@ class Client(Methods):
             Number of maximum concurrent workers for handling incoming updates.
             Defaults to ``min(32, os.cpu_count() + 4)``.
 
+        max_updates_queue_size (``int``, *optional*):
+            Set the maximum number of updates waiting to be handled.
+            Once reached, new updates are handled according to *updates_overflow_policy*.
+            With *update_lanes*, each lane drops or coalesces its own updates past this size, while the
+            :obj:`~pyrogram.enums.UpdatesOverflowPolicy.BLOCK` policy bounds the updates pending in all lanes together.
+            :obj:`~pyrogram.enums.UpdatesOverflowPolicy.BLOCK` never drops anything and doesn't bound memory: updates
+            received while the queue is full wait to be queued instead, since pausing the connection would also hold
+            back the results of the requests the handlers are waiting for. Use a dropping policy to bound memory.
+            Defaults to 0 (unbounded).
+
+        updates_overflow_policy (:obj:`~pyrogram.enums.UpdatesOverflowPolicy`, *optional*):
+            What to do with new updates when the updates queue is full.
+            Defaults to :obj:`~pyrogram.enums.UpdatesOverflowPolicy.BLOCK`.
+
+        update_lanes (``int``, *optional*):
+            Pass a number of lanes to dispatch updates per chat instead of sharing them among all workers.
+            Updates belonging to the same chat (or user) always go to the same lane and are handled strictly one at a
+            time in arrival order, while different lanes run in parallel; one worker runs per lane. Updates not tied to
+            a chat (e.g. deletions outside channels) wait for every lane to catch up (up to 10 seconds) and are handled
+            alone. While a listener or a conversation is waiting, updates whose lane is busy are handled right away
+            instead, since the waiting handler may be the one holding the lane; those updates aren't ordered.
+            Defaults to None (updates are shared by *workers* workers and their order is not guaranteed).
+
+        update_state_interval (``float``, *optional*):
+            How often, in seconds, the latest update state (pts, qts, date) is checkpointed to the storage.
+            After a crash, updates received since the last checkpoint are fetched again on the next start.
+            Pass 0 to write every state as soon as it is received.
+            Defaults to 1.
+
+        update_state_threshold (``int``, *optional*):
+            Checkpoint the update state as soon as this many chats have a new state, without waiting for
+            *update_state_interval*.
+            Defaults to 100.
+
         workdir (``str``, *optional*):
             Define a custom working directory.
             The working directory is the location in the filesystem where Pyrogram will store the session files.
@@ -186,6 +244,26 @@ class Client(Methods):
             Pass True to skip pending updates that arrived while the client was offline.
             Defaults to True.
 
+        max_peers (``int``, *optional*):
+            Maximum number of peers to keep in the storage. The least recently updated ones above this number are
+            deleted in the background, a batch at a time.
+            Defaults to None (peers are never deleted).
+
+        max_peer_age (``int``, *optional*):
+            Delete the peers that haven't been seen for this many seconds from the storage, in the background.
+            Should be longer than an hour, the interval at which the peers still being seen are rewritten.
+            Defaults to None (peers are never deleted).
+
+        gap_recovery_workers (``int``, *optional*):
+            Number of chats whose missed updates are recovered at the same time when *skip_updates* is False.
+            Defaults to 8.
+
+        gap_recovery_in_background (``bool``, *optional*):
+            Pass True to recover the missed updates of channels in the background instead of before the client is
+            started. Live updates of a channel are held back until its missed updates were dispatched, so the
+            order within each channel is preserved.
+            Defaults to False.
+
         takeout (``bool``, *optional*):
             Pass True to let the client use a takeout session instead of a normal one, implies *no_updates=True*.
             Useful for exporting Telegram data. Methods invoked inside a takeout session (such as get_chat_history,
@@ -213,6 +291,27 @@ class Client(Methods):
             Set the maximum size of the message cache.
             Defaults to 10000.
 
+        message_cache_ttl (``float``, *optional*):
+            Number of seconds after which a cached message is considered stale and fetched again.
+            Defaults to None (cached messages don't expire).
+
+        max_message_cache_memory (``int``, *optional*):
+            Approximate number of bytes the message cache may take, least recently used messages are evicted first.
+            Defaults to None (bounded by entry count only).
+
+        message_store_size (``int``, *optional*):
+            Maximum size in bytes of an on-disk message cache kept in the working directory, next to the session file.
+            Messages missing from the in-memory cache are looked up there before being requested again, also after a
+            restart. Stored messages expire after *message_cache_ttl* seconds, or after a day if that is None.
+            Defaults to None (disabled).
+
+        defer_message_relations (``bool``, *optional*):
+            Pass True to skip the requests made while parsing incoming messages to fetch replied and pinned messages,
+            replied stories and forum topics. Cached messages are still attached; anything else can be fetched on
+            demand with :meth:`~pyrogram.types.Message.resolve_relations`, keeping these requests off the dispatch
+            path of every update.
+            Defaults to False.
+
         max_business_user_connection_cache_size (``int``, *optional*):
             Set the maximum size of the message cache.
             Defaults to 10000.
@@ -266,22 +365,36 @@ class Client(Methods):
         use_qrcode: Optional[bool] = False,
         in_memory: Optional[bool] = None,
         mongodb: Optional[dict] = None,
+        redis: Optional[dict] = None,
         storage: Optional[Storage] = None,
         phone_number: Optional[str] = None,
         phone_code: Optional[str] = None,
         password: Optional[str] = None,
         workers: int = WORKERS,
+        max_updates_queue_size: int = 0,
+        updates_overflow_policy: "enums.UpdatesOverflowPolicy" = enums.UpdatesOverflowPolicy.BLOCK,
+        update_lanes: Optional[int] = None,
+        update_state_interval: float = 1,
+        update_state_threshold: int = 100,
         workdir: Union[str, Path] = WORKDIR,
         plugins: Optional[dict] = None,
         parse_mode: "enums.ParseMode" = enums.ParseMode.DEFAULT,
         no_updates: Optional[bool] = None,
         skip_updates: bool = True,
+        max_peers: Optional[int] = None,
+        max_peer_age: Optional[int] = None,
+        gap_recovery_workers: int = 8,
+        gap_recovery_in_background: bool = False,
         takeout: bool = None,
         sleep_threshold: int = Session.SLEEP_THRESHOLD,
         hide_password: Optional[bool] = True,
         max_concurrent_transmissions: int = MAX_CONCURRENT_TRANSMISSIONS,
         client_platform: "enums.ClientPlatform" = enums.ClientPlatform.OTHER,
         max_message_cache_size: int = MAX_CACHE_SIZE,
+        message_cache_ttl: Optional[float] = None,
+        max_message_cache_memory: Optional[int] = None,
+        message_store_size: Optional[int] = None,
+        defer_message_relations: bool = False,
         max_business_user_connection_cache_size: int = MAX_CACHE_SIZE
     ):
         super().__init__()
@@ -304,22 +417,35 @@ class Client(Methods):
         self.use_qrcode = use_qrcode
         self.in_memory = in_memory
         self.mongodb = mongodb
+        self.redis = redis
         self.phone_number = phone_number
         self.phone_code = phone_code
         self.password = password
         self.workers = workers
+        self.max_updates_queue_size = max_updates_queue_size
+        self.updates_overflow_policy = updates_overflow_policy
+        self.update_lanes = update_lanes
+        self.update_state_interval = update_state_interval
+        self.update_state_threshold = update_state_threshold
         self.workdir = Path(workdir)
         self.plugins = plugins
         self.parse_mode = parse_mode
         self.no_updates = no_updates
         self.skip_updates = skip_updates
+        self.max_peers = max_peers
+        self.max_peer_age = max_peer_age
+        self.gap_recovery_workers = gap_recovery_workers
+        self.gap_recovery_in_background = gap_recovery_in_background
         self.takeout = takeout
         self.sleep_threshold = sleep_threshold
         self.hide_password = hide_password
         self.max_concurrent_transmissions = max_concurrent_transmissions
         self.client_platform = client_platform
         self.max_message_cache_size = max_message_cache_size
-        self.max_message_cache_size = max_message_cache_size
+        self.message_cache_ttl = message_cache_ttl
+        self.max_message_cache_memory = max_message_cache_memory
+        self.message_store_size = message_store_size
+        self.defer_message_relations = defer_message_relations
         self.max_business_user_connection_cache_size = max_business_user_connection_cache_size
 
         self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix="Handler")
@@ -339,6 +465,15 @@ class Client(Methods):
                 self.storage = MemoryStorage(self.name)
             else:
                 self.storage = MongoStorage(self.name, **self.mongodb)
+        elif self.redis:
+            if not REDIS_AVAIL:
+                log.warning(
+                    "redis is missing! "
+                    "Using MemoryStorage as session storage"
+                )
+                self.storage = MemoryStorage(self.name)
+            else:
+                self.storage = RedisStorage(self.name, **self.redis)
         else:
             self.storage = FileStorage(self.name, self.workdir)
 
@@ -351,6 +486,8 @@ class Client(Methods):
 
         self.parser = Parser(self)
 
+        self.command_router = CommandRouter(self)
+
         self.session = None
 
         self.media_sessions = {}
@@ -368,7 +505,25 @@ class Client(Methods):
 
         self.me: Optional[User] = None
 
-        self.message_cache = Cache(self.max_message_cache_size)
+        self.peer_buffer = PeerBuffer(self)
+        self.updates_sequencer = UpdatesSequencer(self)
+        self.difference_batcher = DifferenceBatcher(self)
+        self.reply_loader = ReplyLoader(self)
+        self.state_buffer = StateBuffer(self, self.update_state_interval, self.update_state_threshold)
+        self.gap_recovery_task = None
+        self.difference_resume_at = 0
+
+        self.message_cache = MessageCache(
+            self.max_message_cache_size,
+            self.message_cache_ttl,
+            self.max_message_cache_memory
+        )
+        self.message_store = MessageStore(
+            self,
+            self.workdir / f"{self.name}.messages",
+            self.message_store_size,
+            self.message_cache_ttl
+        ) if self.message_store_size else None
         self.business_user_connection_cache = Cache(self.max_business_user_connection_cache_size)
 
         # Sometimes, for some reason, the server will stop sending updates and will only respond to pings.
@@ -377,7 +532,7 @@ class Client(Methods):
         self.updates_watchdog_task = None
         self.updates_watchdog_event = asyncio.Event()
         self.last_update_time = datetime.now()
-        self.listeners = {listener_type: [] for listener_type in pyrogram.enums.ListenerTypes}
+        self.listeners = {listener_type: ListenerIndex() for listener_type in pyrogram.enums.ListenerTypes}
         self.loop = asyncio.get_event_loop()
 
     def __enter__(self):
@@ -568,6 +723,15 @@ class Client(Methods):
 
         self.parse_mode = parse_mode
 
+    async def get_cached_message(self, chat_id: int, message_id: int) -> Optional["types.Message"]:
+        """Look a message up in the message cache, then in the message store; None if neither has it."""
+        message = self.message_cache[(chat_id, message_id)]
+
+        if message is None and self.message_store is not None:
+            message = await self.message_store.get(chat_id, message_id)
+
+        return message
+
     async def fetch_peers(self, peers: List[Union[raw.types.User, raw.types.Chat, raw.types.Channel]]) -> bool:
         is_min = False
         parsed_peers = []
@@ -619,8 +783,7 @@ class Client(Methods):
 
             parsed_peers.append((peer_id, access_hash, peer_type, username, phone_number))
 
-        await self.storage.update_peers(parsed_peers)
-        await self.storage.update_usernames(usernames)
+        await self.peer_buffer.update(parsed_peers, usernames)
 
         return is_min
 
@@ -636,6 +799,8 @@ class Client(Methods):
             users = {u.id: u for u in updates.users}
             chats = {c.id: c for c in updates.chats}
 
+            self.updates_sequencer.check_seq(updates)
+
             for update in updates.updates:
                 channel_id = getattr(
                     getattr(
@@ -647,170 +812,219 @@ class Client(Methods):
 
                 pts = getattr(update, "pts", None)
                 pts_count = getattr(update, "pts_count", None)
-
-                if pts:
-                    await self.storage.update_state(
-                        (
-                            utils.get_channel_id(channel_id) if channel_id else 0,
-                            pts,
-                            None,
-                            updates.date,
-                            None
-                        )
-                    )
+                qts = getattr(update, "qts", None)
 
                 if isinstance(update, raw.types.UpdateChannelTooLong):
                     log.info(update)
 
+                    # Its pts isn't counted, the channel difference tells what was missed
+                    if channel_id:
+                        self.updates_sequencer.fetch_difference(utils.get_channel_id(channel_id))
+
+                    await self.dispatcher.updates_queue.put((update, users, chats))
+                    continue
+
                 if isinstance(update, raw.types.UpdateNewChannelMessage) and is_min:
                     message = update.message
 
                     if not isinstance(message, raw.types.MessageEmpty):
-                        try:
-                            diff = await self.invoke(
-                                raw.functions.updates.GetChannelDifference(
-                                    channel=await self.resolve_peer(utils.get_channel_id(channel_id)),
-                                    filter=raw.types.ChannelMessagesFilter(
-                                        ranges=[raw.types.MessageRange(
-                                            min_id=update.message.id,
-                                            max_id=update.message.id
-                                        )]
-                                    ),
-                                    pts=pts - pts_count,
-                                    limit=pts,
-                                    force=False
-                                )
-                            )
-                        except (ChannelPrivate, PersistentTimestampOutdated, PersistentTimestampInvalid):
-                            pass
-                        else:
-                            if not isinstance(diff, raw.types.updates.ChannelDifferenceEmpty):
-                                users.update({u.id: u for u in diff.users})
-                                chats.update({c.id: c for c in diff.chats})
-
-                self.dispatcher.updates_queue.put_nowait((update, users, chats))
-        elif isinstance(updates, (raw.types.UpdateShortMessage, raw.types.UpdateShortChatMessage)):
-            await self.storage.update_state(
-                (
-                    0,
-                    updates.pts,
-                    None,
-                    updates.date,
-                    None
-                )
-            )
+                        diff_users, diff_chats = await self.difference_batcher.fetch_channel_peers(
+                            channel_id, message.id, pts, pts_count
+                        )
 
-            diff = await self.invoke(
-                raw.functions.updates.GetDifference(
-                    pts=updates.pts - updates.pts_count,
-                    date=updates.date,
-                    qts=-1
-                )
-            )
+                        users.update(diff_users)
+                        chats.update(diff_chats)
 
-            if diff.new_messages:
-                self.dispatcher.updates_queue.put_nowait((
-                    raw.types.UpdateNewMessage(
-                        message=diff.new_messages[0],
-                        pts=updates.pts,
-                        pts_count=updates.pts_count
-                    ),
-                    {u.id: u for u in diff.users},
-                    {c.id: c for c in diff.chats}
-                ))
-            else:
-                if diff.other_updates:  # The other_updates list can be empty
-                    self.dispatcher.updates_queue.put_nowait((diff.other_updates[0], {}, {}))
+                if pts:
+                    await self.updates_sequencer.put(
+                        utils.get_channel_id(channel_id) if channel_id else 0,
+                        pts,
+                        pts_count,
+                        updates.date,
+                        (update, users, chats)
+                    )
+                elif qts:
+                    await self.updates_sequencer.put(
+                        self.updates_sequencer.QTS_BOX,
+                        qts,
+                        1,
+                        updates.date,
+                        (update, users, chats)
+                    )
+                else:
+                    await self.dispatcher.updates_queue.put((update, users, chats))
+        elif isinstance(updates, (raw.types.UpdateShortMessage, raw.types.UpdateShortChatMessage)):
+            if not self.updates_sequencer.is_duplicate(0, updates.pts):
+                await self.difference_batcher.fetch_common_difference(updates.pts, updates.pts_count, updates.date)
         elif isinstance(updates, raw.types.UpdateShort):
-            self.dispatcher.updates_queue.put_nowait((updates.update, {}, {}))
+            await self.dispatcher.updates_queue.put((updates.update, {}, {}))
         elif isinstance(updates, raw.types.UpdatesTooLong):
             log.info(updates)
 
     async def recover_gaps(self) -> Tuple[int, int]:
+        await self.state_buffer.checkpoint()
+
         states = await self.storage.update_state()
 
-        message_updates_counter = 0
-        other_updates_counter = 0
+        counters = [0, 0]
 
         if not states:
             log.info("No states found, skipping recovery.")
-            return (message_updates_counter, other_updates_counter)
+            return (0, 0)
 
-        for state in states:
+        semaphore = asyncio.Semaphore(self.gap_recovery_workers)
+
+        async def recover(state):
             id, local_pts, _, local_date, _ = state
 
-            prev_pts = 0
+            async with semaphore:
+                messages, others, (pts, _, _) = await self.get_box_difference(id, local_pts, local_date)
 
-            while True:
-                try:
-                    diff = await self.invoke(
-                        raw.functions.updates.GetChannelDifference(
-                            channel=await self.resolve_peer(id),
-                            filter=raw.types.ChannelMessagesFilterEmpty(),
-                            pts=local_pts,
-                            limit=10000,
-                            force=False
-                        ) if id < 0 else
-                        raw.functions.updates.GetDifference(
-                            pts=local_pts,
-                            date=local_date,
-                            qts=0
-                        )
+            counters[0] += messages
+            counters[1] += others
+
+            if id in self.updates_sequencer.held:
+                await self.updates_sequencer.release(id, pts)
+            else:
+                self.updates_sequencer.set_state(id, pts)
+
+            if self.updates_sequencer.states[id] <= pts:
+                await self.state_buffer.remove(id)
+            # Otherwise live updates moved the box further meanwhile, and their state was already recorded
+
+        channel_states = [state for state in states if state[0] < 0]
+
+        if self.gap_recovery_in_background:
+            for state in channel_states:
+                self.updates_sequencer.hold(state[0])
+
+        # The common box goes first: a single request that the following ones don't depend on
+        for state in states:
+            if state[0] >= 0:
+                await recover(state)
+
+        async def recover_channels():
+            results = await asyncio.gather(*[recover(state) for state in channel_states], return_exceptions=True)
+
+            for state, result in zip(channel_states, results):
+                if isinstance(result, Exception):
+                    log.error("Unable to recover updates of %s: %r", state[0], result)
+
+                    if state[0] in self.updates_sequencer.held:
+                        await self.updates_sequencer.release(state[0], state[1])
+
+            log.info("Recovered %s messages and %s updates.", *counters)
+
+        if self.gap_recovery_in_background:
+            self.gap_recovery_task = asyncio.create_task(recover_channels())
+        else:
+            await recover_channels()
+
+        return (counters[0], counters[1])
+
+    async def get_box_difference(
+        self,
+        id: int,
+        local_pts: int,
+        local_date: int,
+        local_qts: int = 0
+    ) -> Tuple[int, int, Tuple[int, int, int]]:
+        """Fetch and dispatch the updates missed by a box (0 for the common box, a channel id otherwise).
+
+        Returns the number of dispatched messages and other updates, and the (pts, qts, date) reached.
+        """
+        message_updates_counter = 0
+        other_updates_counter = 0
+
+        prev_pts = 0
+
+        while True:
+            # Every box waits out a flood wait hit by any of them
+            delay = self.difference_resume_at - self.loop.time()
+
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            try:
+                diff = await self.invoke(
+                    raw.functions.updates.GetChannelDifference(
+                        channel=await self.resolve_peer(id),
+                        filter=raw.types.ChannelMessagesFilterEmpty(),
+                        pts=local_pts,
+                        limit=10000,
+                        force=False
+                    ) if id < 0 else
+                    raw.functions.updates.GetDifference(
+                        pts=local_pts,
+                        date=local_date,
+                        qts=local_qts
                     )
-                except (ChannelPrivate, ChannelInvalid, PersistentTimestampOutdated, PersistentTimestampInvalid):
-                    break
+                )
+            except FloodWait as e:
+                log.warning("Waiting for %s seconds before fetching more differences", e.value)
+                self.difference_resume_at = max(self.difference_resume_at, self.loop.time() + e.value)
+                continue
+            except (ChannelPrivate, ChannelInvalid, PersistentTimestampOutdated, PersistentTimestampInvalid):
+                break
 
-                if isinstance(diff, raw.types.updates.DifferenceEmpty):
-                    break
-                elif isinstance(diff, raw.types.updates.DifferenceTooLong):
+            if isinstance(diff, raw.types.updates.DifferenceEmpty):
+                break
+            elif isinstance(diff, raw.types.updates.DifferenceTooLong):
+                local_pts = diff.pts
+                break
+            elif isinstance(diff, raw.types.updates.Difference):
+                local_pts = diff.state.pts
+                local_qts = diff.state.qts
+                local_date = diff.state.date
+            elif isinstance(diff, raw.types.updates.DifferenceSlice):
+                local_pts = diff.intermediate_state.pts
+                local_qts = diff.intermediate_state.qts
+                local_date = diff.intermediate_state.date
+
+                if prev_pts == local_pts:
                     break
-                elif isinstance(diff, raw.types.updates.Difference):
-                    local_pts = diff.state.pts
-                elif isinstance(diff, raw.types.updates.DifferenceSlice):
-                    local_pts = diff.intermediate_state.pts
-                    local_date = diff.intermediate_state.date
 
-                    if prev_pts == local_pts:
-                        break
+                prev_pts = local_pts
+            elif isinstance(diff, raw.types.updates.ChannelDifferenceEmpty):
+                local_pts = diff.pts
+                break
+            elif isinstance(diff, raw.types.updates.ChannelDifferenceTooLong):
+                local_pts = getattr(diff.dialog, "pts", None) or local_pts
+                break
+            elif isinstance(diff, raw.types.updates.ChannelDifference):
+                local_pts = diff.pts
 
-                    prev_pts = local_pts
-                elif isinstance(diff, raw.types.updates.ChannelDifferenceEmpty):
-                    break
-                elif isinstance(diff, raw.types.updates.ChannelDifferenceTooLong):
-                    break
-                elif isinstance(diff, raw.types.updates.ChannelDifference):
-                    local_pts = diff.pts
-
-                users = {i.id: i for i in diff.users}
-                chats = {i.id: i for i in diff.chats}
-
-                for message in diff.new_messages:
-                    message_updates_counter += 1
-                    self.dispatcher.updates_queue.put_nowait(
-                        (
-                            raw.types.UpdateNewMessage(
-                                message=message,
-                                pts=local_pts,
-                                pts_count=-1
-                            ),
-                            users,
-                            chats
-                        )
-                    )
+            users = {i.id: i for i in diff.users}
+            chats = {i.id: i for i in diff.chats}
 
-                for update in diff.other_updates:
-                    other_updates_counter += 1
-                    self.dispatcher.updates_queue.put_nowait(
-                        (update, users, chats)
+            for message in diff.new_messages:
+                if self.updates_sequencer.is_sent(message):
+                    # Sent by this client, it was never pushed as an update
+                    continue
+
+                message_updates_counter += 1
+                await self.dispatcher.updates_queue.put(
+                    (
+                        raw.types.UpdateNewMessage(
+                            message=message,
+                            pts=local_pts,
+                            pts_count=-1
+                        ),
+                        users,
+                        chats
                     )
+                )
 
-                if isinstance(diff, (raw.types.updates.Difference, raw.types.updates.ChannelDifference)):
-                    break
+            for update in diff.other_updates:
+                other_updates_counter += 1
+                await self.dispatcher.updates_queue.put(
+                    (update, users, chats)
+                )
 
-            await self.storage.update_state(id)
+            if isinstance(diff, (raw.types.updates.Difference, raw.types.updates.ChannelDifference)):
+                break
 
-        log.info("Recovered %s messages and %s updates.", message_updates_counter, other_updates_counter)
-        return (message_updates_counter, other_updates_counter)
+        return message_updates_counter, other_updates_counter, (local_pts, local_qts, local_date)
 
     async def load_session(self):
         await self.storage.open()
@@ -1376,19 +1590,189 @@ class Client(Methods):
 
 
 class Cache:
-    def __init__(self, capacity: int):
+    """LRU cache with optional expiry and memory bound.
+
+    Reading an entry marks it as recently used. Once *capacity* entries, or *max_memory* approximate bytes, are
+    exceeded, the least recently used entries are evicted one by one. Entries older than *ttl* seconds are treated as
+    missing. Looking up a missing key returns None.
+    """
+
+    def __init__(self, capacity: int, ttl: Optional[float] = None, max_memory: Optional[int] = None):
         self.capacity = capacity
-        self.store = {}
+        self.ttl = ttl
+        self.max_memory = max_memory
+
+        # key -> (value, expires at or None, approximate size)
+        self.store = OrderedDict()
+        self.memory = 0
+
+        self.stats = Counter()
+
+    @staticmethod
+    def get_size(value) -> int:
+        """Approximate the memory taken by ``value`` and the objects it references, clients excluded."""
+        size = 0
+        seen = set()
+        stack = [value]
+
+        while stack:
+            obj = stack.pop()
+
+            if id(obj) in seen or isinstance(obj, (Client, type)):
+                continue
+
+            seen.add(id(obj))
+            size += sys.getsizeof(obj)
+
+            if isinstance(obj, dict):
+                stack.extend(obj.keys())
+                stack.extend(obj.values())
+            elif isinstance(obj, (list, tuple, set, frozenset)):
+                stack.extend(obj)
+            elif hasattr(obj, "__dict__"):
+                stack.extend(v for k, v in vars(obj).items() if k != "_client")
+            elif hasattr(obj, "__slots__"):
+                stack.extend(getattr(obj, k) for k in obj.__slots__ if hasattr(obj, k))
+
+        return size
 
     def __getitem__(self, key):
-        return self.store.get(key, None)
+        entry = self.store.get(key)
+
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+
+        value, _, _ = entry
+
+        if self.expire(key, entry):
+            self.stats["misses"] += 1
+            return None
+
+        self.store.move_to_end(key)
+        self.stats["hits"] += 1
+
+        return value
+
+    def __setitem__(self, key, value):
+        self.pop(key)
+
+        size = self.get_size(value) if self.max_memory is not None else 0
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+
+        self.store[key] = (value, expires_at, size)
+        self.memory += size
+
+        while len(self.store) > self.capacity or (
+            self.max_memory is not None and self.memory > self.max_memory and len(self.store) > 1
+        ):
+            self.pop(next(iter(self.store)))
+            self.stats["evictions"] += 1
+
+    def __contains__(self, key) -> bool:
+        entry = self.store.get(key)
+
+        return entry is not None and not self.expire(key, entry)
+
+    def expire(self, key, entry) -> bool:
+        """Evict ``entry`` if it is older than *ttl*. Returns whether it was."""
+        expires_at = entry[1]
+
+        if expires_at is None or expires_at > time.monotonic():
+            return False
+
+        self.pop(key)
+        self.stats["expired"] += 1
+
+        return True
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def pop(self, key):
+        entry = self.store.pop(key, None)
+
+        if entry is None:
+            return None
+
+        self.memory -= entry[2]
+
+        return entry[0]
+
+    def clear(self):
+        self.store.clear()
+        self.memory = 0
+        self.stats.clear()
+
+    def get_stats(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+
+        return {
+            "size": len(self.store),
+            "memory": self.memory,
+            "hits": self.stats["hits"],
+            "misses": self.stats["misses"],
+            "evictions": self.stats["evictions"],
+            "expired": self.stats["expired"],
+            "invalidations": self.stats["invalidations"],
+            "hit_rate": self.stats["hits"] / lookups if lookups else 0.0
+        }
+
+
+class MessageCache(Cache):
+    """Cache of parsed messages keyed by ``(chat_id, message_id)``, invalidated by edit and delete updates.
+
+    Deletions outside channels only carry message ids, which are unique across the non-channel chats of an account,
+    so these keys are also indexed by message id.
+    """
+
+    def __init__(self, capacity: int, ttl: Optional[float] = None, max_memory: Optional[int] = None):
+        super().__init__(capacity, ttl, max_memory)
+
+        self.keys_by_message_id = {}
 
     def __setitem__(self, key, value):
-        if key in self.store:
-            del self.store[key]
+        super().__setitem__(key, value)
 
-        self.store[key] = value
+        if key in self.store and key[0] > utils.MAX_CHANNEL_ID:
+            self.keys_by_message_id.setdefault(key[1], set()).add(key)
 
-        if len(self.store) > self.capacity:
-            for _ in range(self.capacity // 2 + 1):
-                del self.store[next(iter(self.store))]
+    def pop(self, key):
+        keys = self.keys_by_message_id.get(key[1])
+
+        if keys is not None:
+            keys.discard(key)
+
+            if not keys:
+                del self.keys_by_message_id[key[1]]
+
+        return super().pop(key)
+
+    def invalidate(self, chat_id: Optional[int], message_ids: Iterable[int]):
+        """Forget the given messages; a None ``chat_id`` stands for any chat that is not a channel."""
+        for message_id in message_ids:
+            if chat_id is None:
+                keys = list(self.keys_by_message_id.get(message_id, ()))
+            else:
+                keys = [(chat_id, message_id)]
+
+            for key in keys:
+                if key in self.store:
+                    self.pop(key)
+                    self.stats["invalidations"] += 1
+
+    def invalidate_update(self, update: "raw.base.Update"):
+        """Forget the messages an edit or delete update makes stale."""
+        if isinstance(update, (raw.types.UpdateEditMessage, raw.types.UpdateEditChannelMessage)):
+            message = update.message
+
+            if not isinstance(message, raw.types.MessageEmpty) and message.peer_id is not None:
+                self.invalidate(utils.get_peer_id(message.peer_id), [message.id])
+        elif isinstance(update, raw.types.UpdateDeleteChannelMessages):
+            self.invalidate(utils.get_channel_id(update.channel_id), update.messages)
+        elif isinstance(update, raw.types.UpdateDeleteMessages):
+            self.invalidate(None, update.messages)
+
+    def clear(self):
+        super().clear()
+        self.keys_by_message_id.clear()
@@ -0,0 +1,198 @@
+#  Pyrofork - Telegram MTProto API Client Library for Python
+#  Copyright (C) 2017-present Dan <https://github.com/delivrance>
+#  Copyright (C) 2022-present Mayuri-Chan <https://github.com/Mayuri-Chan>
+#
+#  This file is part of Pyrofork.
+#
+#  Pyrofork is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Pyrofork is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with Pyrofork.  If not, see <http://www.gnu.org/licenses/>.
+import asyncio
+import logging
+from collections import Counter
+from typing import Awaitable, Callable, Dict, Hashable, List, Tuple
+
+import pyrogram
+from pyrogram import raw, utils
+from pyrogram.errors import ChannelPrivate, PersistentTimestampOutdated, PersistentTimestampInvalid
+
+log = logging.getLogger(__name__)
+
+
+class DifferenceBatch:
+    def __init__(self):
+        self.requests = []
+        self.future = asyncio.get_running_loop().create_future()
+
+
+class DifferenceBatcher:
+    """Coalesces the difference requests :meth:`~pyrogram.Client.handle_updates` needs to complete updates.
+
+    Short message updates don't carry the full message, and channel messages sent by min peers don't carry the
+    peers' access hashes; both used to cost one difference request each. Requests for the same box made within
+    :attr:`WINDOW` seconds now share a single ``updates.GetDifference`` or ``updates.GetChannelDifference`` call,
+    and everything it returns is dispatched.
+    """
+
+    WINDOW = 0.05
+
+    def __init__(self, client: "pyrogram.Client"):
+        self.client = client
+
+        self.batches: Dict[Hashable, DifferenceBatch] = {}
+        self.tasks = set()
+
+        self.stats = Counter()
+
+    async def join(self, key: Hashable, request, runner: Callable[[Hashable, list], Awaitable]):
+        batch = self.batches.get(key)
+
+        if batch is None:
+            batch = self.batches[key] = DifferenceBatch()
+
+            task = asyncio.create_task(self.run(key, batch, runner))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+        batch.requests.append(request)
+        self.stats["requests"] += 1
+
+        return await asyncio.shield(batch.future)
+
+    async def run(self, key: Hashable, batch: DifferenceBatch, runner: Callable[[Hashable, list], Awaitable]):
+        await asyncio.sleep(self.WINDOW)
+
+        # Requests made from now on start a new batch
+        del self.batches[key]
+        self.stats["fetches"] += 1
+
+        try:
+            batch.future.set_result(await runner(key, batch.requests))
+        except Exception as e:
+            batch.future.set_exception(e)
+
+    async def fetch_common_difference(self, pts: int, pts_count: int, date: int):
+        """Fetch the common box difference covering a short update and dispatch everything it contains."""
+        await self.join(0, (pts - pts_count, date), self.run_common_difference)
+
+    async def run_common_difference(self, _, requests: List[Tuple[int, int]]):
+        sequencer = self.client.updates_sequencer
+
+        # Start from what was applied last; only fall back to the updates themselves when nothing was applied yet
+        pts, date = min(requests)
+        local_pts = sequencer.states.get(0)
+
+        if local_pts is not None:
+            pts = local_pts
+
+        while True:
+            diff = await self.client.invoke(
+                raw.functions.updates.GetDifference(
+                    pts=pts,
+                    date=date,
+                    qts=-1
+                )
+            )
+
+            if isinstance(diff, raw.types.updates.Difference):
+                state = diff.state
+            elif isinstance(diff, raw.types.updates.DifferenceSlice):
+                state = diff.intermediate_state
+            elif isinstance(diff, raw.types.updates.DifferenceTooLong):
+                await sequencer.put_difference(0, diff.pts, None, [])
+                return
+            else:
+                return
+
+            users = {u.id: u for u in diff.users}
+            chats = {c.id: c for c in diff.chats}
+
+            items = [
+                (
+                    raw.types.UpdateNewMessage(
+                        message=message,
+                        pts=state.pts,
+                        pts_count=-1
+                    ),
+                    users,
+                    chats
+                )
+                for message in diff.new_messages
+                # Sent by this client, it was never pushed as an update
+                if not sequencer.is_sent(message)
+            ]
+
+            items.extend((update, users, chats) for update in diff.other_updates)
+
+            await sequencer.put_difference(0, state.pts, state.date, items)
+
+            if isinstance(diff, raw.types.updates.Difference) or state.pts <= pts:
+                return
+
+            # A slice, continue from its intermediate state
+            pts, date = state.pts, state.date
+
+    async def fetch_channel_peers(
+        self,
+        channel_id: int,
+        message_id: int,
+        pts: int,
+        pts_count: int
+    ) -> Tuple[dict, dict]:
+        """Fetch the users and chats of a channel message whose update only carried min peers."""
+        return await self.join(
+            utils.get_channel_id(channel_id),
+            (message_id, pts - pts_count, pts),
+            self.run_channel_difference
+        )
+
+    async def run_channel_difference(
+        self,
+        channel_id: int,
+        requests: List[Tuple[int, int, int]]
+    ) -> Tuple[dict, dict]:
+        message_ids = sorted({message_id for message_id, _, _ in requests})
+        ranges = []
+
+        for message_id in message_ids:
+            if ranges and ranges[-1].max_id + 1 == message_id:
+                ranges[-1].max_id = message_id
+            else:
+                ranges.append(raw.types.MessageRange(min_id=message_id, max_id=message_id))
+
+        try:
+            diff = await self.client.invoke(
+                raw.functions.updates.GetChannelDifference(
+                    channel=await self.client.resolve_peer(channel_id),
+                    filter=raw.types.ChannelMessagesFilter(ranges=ranges),
+                    pts=min(start for _, start, _ in requests),
+                    limit=max(pts for _, _, pts in requests),
+                    force=False
+                )
+            )
+        except (ChannelPrivate, PersistentTimestampOutdated, PersistentTimestampInvalid):
+            return {}, {}
+
+        if isinstance(diff, raw.types.updates.ChannelDifferenceEmpty):
+            return {}, {}
+
+        return {u.id: u for u in diff.users}, {c.id: c for c in diff.chats}
+
+    async def stop(self):
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    def get_stats(self) -> dict:
+        return {
+            "requests": self.stats["requests"],
+            "fetches": self.stats["fetches"],
+            "saved": self.stats["requests"] - self.stats["fetches"]
+        }
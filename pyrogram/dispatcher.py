@@ -20,11 +20,12 @@
 import asyncio
 import inspect
 import logging
-from collections import OrderedDict
-from typing import Any
+import re
+from collections import Counter, OrderedDict
+from typing import Any, Optional
 
 import pyrogram
-from pyrogram import raw, types, utils
+from pyrogram import enums, filters, raw, types, utils
 from pyrogram.handlers.handler import Handler
 from pyrogram.handlers import (
   BotBusinessConnectHandler,
@@ -65,12 +66,338 @@ from pyrogram.raw.types import (
     UpdateBotMessageReactions,
     UpdateBotShippingQuery,
     UpdateBusinessBotCallbackQuery,
-    UpdateBotPurchasedPaidMedia
+    UpdateBotPurchasedPaidMedia,
+    UpdateUserTyping, UpdateChatUserTyping, UpdateChannelUserTyping, UpdateUserEmojiStatus,
+    UpdateReadHistoryInbox, UpdateReadHistoryOutbox, UpdateReadChannelInbox, UpdateReadChannelOutbox,
+    UpdateReadChannelDiscussionInbox, UpdateReadChannelDiscussionOutbox,
+    UpdateChannelMessageViews, UpdateChannelMessageForwards
 )
 
 log = logging.getLogger(__name__)
 
 
+class UpdatesQueue(asyncio.Queue):
+    """The queue incoming updates wait in before being dispatched, optionally bounded.
+
+    Once *capacity* updates are pending, new updates are handled according to *policy*. ``None`` items (used to
+    stop the workers) always go through.
+
+    Under BLOCK, :meth:`put` waits for room, but the updates are received by tasks nothing waits for, so those tasks
+    keep their updates in memory while they wait: BLOCK only keeps delivery in order and loses nothing, the dropping
+    policies are the ones that bound memory.
+    """
+
+    LOW_PRIORITY_UPDATES = (
+        UpdateUserStatus, UpdateUserEmojiStatus,
+        UpdateUserTyping, UpdateChatUserTyping, UpdateChannelUserTyping,
+        UpdateReadHistoryInbox, UpdateReadHistoryOutbox, UpdateReadChannelInbox, UpdateReadChannelOutbox,
+        UpdateReadChannelDiscussionInbox, UpdateReadChannelDiscussionOutbox,
+        UpdateChannelMessageViews, UpdateChannelMessageForwards
+    )
+
+    # Updates that are fully superseded by a newer update with the same key
+    COALESCE_KEYS = {
+        UpdateUserStatus: lambda update: update.user_id,
+        UpdateUserEmojiStatus: lambda update: update.user_id,
+        UpdateReadChannelInbox: lambda update: update.channel_id,
+        UpdateReadChannelOutbox: lambda update: update.channel_id,
+        UpdateChannelMessageViews: lambda update: (update.channel_id, update.id),
+        UpdateChannelMessageForwards: lambda update: (update.channel_id, update.id),
+    }
+
+    def __init__(
+        self,
+        capacity: int = 0,
+        policy: "enums.UpdatesOverflowPolicy" = enums.UpdatesOverflowPolicy.BLOCK
+    ):
+        super().__init__()
+
+        self.capacity = capacity or 0
+        self.policy = policy
+
+        self.max_depth = 0
+        self.dropped = Counter()
+        self.coalesced = Counter()
+
+        # Coalescing key -> pending packet (kept as a list so that it can be replaced in place)
+        self.pending = {}
+        self.not_full = asyncio.Event()
+        self.not_full.set()
+
+    def is_full(self) -> bool:
+        return 0 < self.capacity <= self.qsize()
+
+    def is_busy(self) -> bool:
+        """Whether updates put in the queue are still waiting or being handled."""
+        return self._unfinished_tasks > 0
+
+    async def put(self, item):
+        if item is not None and self.policy == enums.UpdatesOverflowPolicy.BLOCK:
+            while self.is_full():
+                self.not_full.clear()
+                await self.not_full.wait()
+
+        self.put_nowait(item)
+
+    def put_nowait(self, item):
+        if item is not None:
+            if self.policy == enums.UpdatesOverflowPolicy.COALESCE and self.coalesce(item):
+                return
+
+            if self.is_full() and self.policy != enums.UpdatesOverflowPolicy.BLOCK:
+                if not self.make_room(item):
+                    self.dropped[type(item[0]).__name__] += 1
+                    return
+
+        super().put_nowait(item)
+        self.max_depth = max(self.max_depth, self.qsize())
+
+    def coalesce(self, item) -> bool:
+        get_key = self.COALESCE_KEYS.get(type(item[0]))
+
+        if get_key is None:
+            return False
+
+        key = (type(item[0]), get_key(item[0]))
+        pending = self.pending.get(key)
+
+        if pending is not None:
+            pending[:] = item
+            self.coalesced[type(item[0]).__name__] += 1
+            return True
+
+        self.pending[key] = item = list(item)
+        # Enqueue the mutable copy, so that newer updates can replace it while it's waiting
+        if self.is_full() and not self.make_room(item):
+            self.pending.pop(key)
+            self.dropped[type(item[0]).__name__] += 1
+        else:
+            super().put_nowait(item)
+            self.max_depth = max(self.max_depth, self.qsize())
+
+        return True
+
+    def make_room(self, item) -> bool:
+        """Evict one pending update to make room for *item*. Returns False if *item* itself should be dropped.
+
+        Under DROP_LOW_PRIORITY a pending low priority update is evicted first; if there is none, the oldest pending
+        update is evicted even though it isn't low priority, so that new high priority updates are never lost.
+        """
+        if self.policy == enums.UpdatesOverflowPolicy.DROP_LOW_PRIORITY:
+            if isinstance(item[0], self.LOW_PRIORITY_UPDATES):
+                return False
+
+            for pending in self._queue:
+                if pending is not None and isinstance(pending[0], self.LOW_PRIORITY_UPDATES):
+                    self._queue.remove(pending)
+                    self.evicted(pending)
+                    return True
+
+        for pending in self._queue:
+            if pending is not None:
+                self._queue.remove(pending)
+                self.evicted(pending)
+                return True
+
+        return True
+
+    def evicted(self, item):
+        self.dropped[type(item[0]).__name__] += 1
+        self.forget(item)
+        # The evicted update will never be processed, balance its put() for join()
+        self.task_done()
+
+    def forget(self, item):
+        get_key = self.COALESCE_KEYS.get(type(item[0]))
+
+        if get_key is not None:
+            key = (type(item[0]), get_key(item[0]))
+
+            if self.pending.get(key) is item:
+                del self.pending[key]
+
+    def _get(self):
+        item = super()._get()
+
+        if item is not None:
+            self.forget(item)
+
+        if not self.is_full():
+            self.not_full.set()
+
+        return item
+
+    def get_stats(self) -> dict:
+        """Get the queue statistics.
+
+        Returns:
+            ``dict``: Current and maximum depth, capacity and the number of dropped and coalesced updates by
+            raw update type.
+        """
+        return {
+            "depth": self.qsize(),
+            "max_depth": self.max_depth,
+            "capacity": self.capacity,
+            "dropped": dict(self.dropped),
+            "coalesced": dict(self.coalesced)
+        }
+
+
+class RegexIndex:
+    """Literal-prefix index over the regex handlers of a group.
+
+    Handlers whose filters require an anchored regex (e.g. ``filters.regex("^page_")``, alone or and-ed with other
+    filters) are indexed by the literal prefix of the pattern, so that a single lookup tells which of them can't
+    possibly match an update and can be skipped without running their filters.
+    """
+
+    def __init__(self, handlers: tuple):
+        self.handlers = set()
+        # Prefix length -> prefix -> handlers, for case sensitive and case insensitive patterns
+        self.prefixes = {}
+        self.ignore_case_prefixes = {}
+
+        for handler in handlers:
+            pattern = self.get_required_pattern(getattr(handler, "filters", None))
+
+            if pattern is None:
+                continue
+
+            prefix, ignore_case = pattern.literal_prefix, pattern.p.flags & re.IGNORECASE
+
+            if ignore_case:
+                prefix = prefix.lower()
+
+            index = self.ignore_case_prefixes if ignore_case else self.prefixes
+            index.setdefault(len(prefix), {}).setdefault(prefix, set()).add(handler)
+            self.handlers.add(handler)
+
+    @staticmethod
+    def get_required_pattern(flt) -> Optional[filters.Filter]:
+        if isinstance(flt, filters.AndFilter):
+            candidates = flt.filters
+        else:
+            candidates = (flt,)
+
+        for candidate in candidates:
+            if type(candidate).__call__ is filters.regex_filter and candidate.literal_prefix:
+                return candidate
+
+        return None
+
+    def get_rejected(self, value: str) -> set:
+        """Get the indexed handlers that can't match *value*."""
+        accepted = set()
+
+        for length, prefixes in self.prefixes.items():
+            accepted.update(prefixes.get(value[:length], ()))
+
+        for length, prefixes in self.ignore_case_prefixes.items():
+            head = value[:length]
+
+            if head.isascii():
+                accepted.update(prefixes.get(head.lower(), ()))
+            else:
+                # Unicode case folding rules differ from str.lower(), let the pattern decide
+                for handlers in prefixes.values():
+                    accepted.update(handlers)
+
+        return self.handlers - accepted
+
+
+class HandlerTable:
+    """An immutable snapshot of the registered handlers, indexed by the handler type they accept.
+
+    A new table is built whenever handlers are added or removed; in-flight dispatches keep using the table they
+    started with, so registering handlers never needs to wait for (or block) update processing.
+    """
+
+    def __init__(self, groups: OrderedDict, conversation_handler: ConversationHandler):
+        self.groups = groups
+        self.conversation_handler = conversation_handler
+
+        self.raw_update_handlers = OrderedDict(
+            (group, tuple(handler for handler in handlers if isinstance(handler, RawUpdateHandler)))
+            for group, handlers in groups.items()
+        )
+        self.has_raw_update_handlers = any(self.raw_update_handlers.values())
+        self.registered_handler_types = Counter(
+            type(handler)
+            for handlers in groups.values()
+            for handler in handlers
+            if handler is not conversation_handler
+        )
+
+        # Filled lazily, one entry per handler type actually seen
+        self.routes = {}
+        self.regex_indexes = {}
+        self.regex_indexes_version = Handler.filters_version
+        self.consumers = {}
+
+    def get_routes(self, handler_type: type) -> list:
+        """Get the handlers that may receive an update of the given handler type.
+
+        The result is a list with one entry per group (lowest group first) that contains at least one candidate.
+        Each entry keeps the registration order of the group and includes its raw update handlers.
+        Groups with no candidate handlers are left out entirely.
+        """
+        routes = self.routes.get(handler_type)
+
+        if routes is None:
+            routes = []
+
+            for group, handlers in self.groups.items():
+                raw_update_handlers = self.raw_update_handlers[group]
+                typed_handlers = tuple(handler for handler in handlers if isinstance(handler, handler_type))
+
+                if typed_handlers and raw_update_handlers:
+                    routes.append(tuple(
+                        handler for handler in handlers
+                        if isinstance(handler, (handler_type, RawUpdateHandler))
+                    ))
+                elif typed_handlers or raw_update_handlers:
+                    routes.append(typed_handlers or raw_update_handlers)
+
+            self.routes[handler_type] = routes
+
+        return routes
+
+    def get_regex_indexes(self, handler_type: type) -> list:
+        """Get the regex index of each group returned by :meth:`get_routes` (None for groups that need none)."""
+        if self.regex_indexes_version != Handler.filters_version:
+            # Filters were reassigned since the indexes were built
+            self.regex_indexes = {}
+            self.regex_indexes_version = Handler.filters_version
+
+        regex_indexes = self.regex_indexes.get(handler_type)
+
+        if regex_indexes is None:
+            regex_indexes = self.regex_indexes[handler_type] = [
+                regex_index if regex_index.handlers else None
+                for regex_index in map(RegexIndex, self.get_routes(handler_type))
+            ]
+
+        return regex_indexes
+
+    def has_consumers(self, handler_type: type) -> bool:
+        """Check whether a parsed update of the given handler type would be looked at by any handler.
+
+        The built-in conversation handler only counts while somebody is actually waiting for an update.
+        """
+        consumers = self.consumers.get(handler_type)
+
+        if consumers is None:
+            consumers = self.consumers[handler_type] = any(
+                issubclass(registered_type, handler_type)
+                for registered_type in self.registered_handler_types
+            )
+
+        return consumers or (
+            bool(self.conversation_handler.waiters)
+            and isinstance(self.conversation_handler, handler_type)
+        )
+
+
 class Dispatcher:
     NEW_MESSAGE_UPDATES = (UpdateNewMessage, UpdateNewChannelMessage, UpdateNewScheduledMessage)
     NEW_BOT_BUSINESS_MESSAGE_UPDATES = (UpdateBotNewBusinessMessage,)
@@ -93,6 +420,9 @@ class Dispatcher:
     SHIPPING_QUERY_UPDATES = (UpdateBotShippingQuery,)
     PURCHASED_PAID_MEDIA_UPDATES = (UpdateBotPurchasedPaidMedia,)
 
+    # Longest time updates not tied to a chat wait for the lanes to catch up, in seconds
+    LANE_JOIN_TIMEOUT = 10
+
     def __init__(self, client: "pyrogram.Client"):
         self.client = client
         try:
@@ -103,19 +433,38 @@ class Dispatcher:
         self.loop = loop
 
         self.handler_worker_tasks = []
-        self.locks_list = []
         self.error_handlers = []
 
-        self.updates_queue = asyncio.Queue()
-        self.groups = OrderedDict()
+        self.updates_queue = UpdatesQueue(
+            client.max_updates_queue_size,
+            client.updates_overflow_policy
+        )
+
+        # Per-chat dispatch: one queue (and worker) per lane, updates of the same chat always go to the same lane
+        self.lanes = []
+        self.lane_updates = []
+        self.lane_taken = asyncio.Event()
+        # Updates handled outside of their lane, because a handler of that lane may be waiting for them
+        self.bypass_tasks = set()
+        self.bypassed_updates = 0
+
+        # Number of updates parsed and skipped (no handler could consume them), by raw update type name
+        self.parsed_updates = Counter()
+        self.skipped_updates = Counter()
 
         self.conversation_handler = ConversationHandler()
-        self.groups[0] = [self.conversation_handler]
+        self.set_groups(OrderedDict({0: (self.conversation_handler,)}))
 
         async def message_parser(update, users, chats):
             return (
-                await pyrogram.types.Message._parse(self.client, update.message, users, chats,
-                                                    is_scheduled=isinstance(update, UpdateNewScheduledMessage)),
+                await pyrogram.types.Message._parse(
+                    self.client,
+                    update.message,
+                    users,
+                    chats,
+                    is_scheduled=isinstance(update, UpdateNewScheduledMessage),
+                    fetch_relations=not self.client.defer_message_relations
+                ),
                 MessageHandler
             )
 
@@ -126,7 +475,8 @@ class Dispatcher:
                     update.message,
                     users,
                     chats,
-                    business_connection_id=update.connection_id
+                    business_connection_id=update.connection_id,
+                    fetch_relations=not self.client.defer_message_relations
                 ),
                 BotBusinessMessageHandler
             )
@@ -270,109 +620,315 @@ class Dispatcher:
 
         self.update_parsers = {key: value for key_tuple, value in self.update_parsers.items() for key in key_tuple}
 
-    async def start(self):
-        if not self.client.no_updates:
-            for _ in range(self.client.workers):
-                self.locks_list.append(asyncio.Lock())
+        # Handler type each parser produces, known up front so that parsing can be skipped when nobody listens
+        self.update_handler_types = {
+            Dispatcher.NEW_MESSAGE_UPDATES: MessageHandler,
+            Dispatcher.NEW_BOT_BUSINESS_MESSAGE_UPDATES: BotBusinessMessageHandler,
+            Dispatcher.EDIT_MESSAGE_UPDATES: EditedMessageHandler,
+            Dispatcher.EDIT_BOT_BUSINESS_MESSAGE_UPDATES: EditedBotBusinessMessageHandler,
+            Dispatcher.DELETE_MESSAGES_UPDATES: DeletedMessagesHandler,
+            Dispatcher.DELETE_BOT_BUSINESS_MESSAGES_UPDATES: DeletedBotBusinessMessagesHandler,
+            Dispatcher.CALLBACK_QUERY_UPDATES: CallbackQueryHandler,
+            Dispatcher.USER_STATUS_UPDATES: UserStatusHandler,
+            Dispatcher.BOT_INLINE_QUERY_UPDATES: InlineQueryHandler,
+            Dispatcher.POLL_UPDATES: PollHandler,
+            Dispatcher.CHOSEN_INLINE_RESULT_UPDATES: ChosenInlineResultHandler,
+            Dispatcher.CHAT_MEMBER_UPDATES: ChatMemberUpdatedHandler,
+            Dispatcher.CHAT_JOIN_REQUEST_UPDATES: ChatJoinRequestHandler,
+            Dispatcher.NEW_STORY_UPDATES: StoryHandler,
+            Dispatcher.SHIPPING_QUERY_UPDATES: ShippingQueryHandler,
+            Dispatcher.PRE_CHECKOUT_QUERY_UPDATES: PreCheckoutQueryHandler,
+            Dispatcher.MESSAGE_BOT_NA_REACTION_UPDATES: MessageReactionUpdatedHandler,
+            Dispatcher.MESSAGE_BOT_A_REACTION_UPDATES: MessageReactionCountUpdatedHandler,
+            Dispatcher.BOT_BUSSINESS_CONNECT_UPDATES: BotBusinessConnectHandler,
+            Dispatcher.PURCHASED_PAID_MEDIA_UPDATES: PurchasedPaidMediaHandler
+        }
 
-                self.handler_worker_tasks.append(
-                    self.loop.create_task(self.handler_worker(self.locks_list[-1]))
-                )
+        self.update_handler_types = {
+            key: value for key_tuple, value in self.update_handler_types.items() for key in key_tuple
+        }
 
-            log.info("Started %s HandlerTasks", self.client.workers)
+    async def start(self):
+        if not self.client.no_updates:
+            if self.client.update_lanes:
+                # Lanes never block the router, or one slow chat would hold back all the others: they apply the
+                # overflow policy on their own, except for BLOCK, which bounds the updates pending in all lanes
+                capacity = 0 if self.updates_queue.policy == enums.UpdatesOverflowPolicy.BLOCK else \
+                    self.updates_queue.capacity
+
+                self.lanes = [
+                    UpdatesQueue(capacity, self.updates_queue.policy)
+                    for _ in range(self.client.update_lanes)
+                ]
+                self.lane_updates = [0] * len(self.lanes)
+
+                for lane in self.lanes:
+                    self.handler_worker_tasks.append(
+                        self.loop.create_task(self.handler_worker(lane))
+                    )
+
+                self.handler_worker_tasks.append(self.loop.create_task(self.lane_router()))
+
+                log.info("Started %s HandlerTasks in per-chat mode", len(self.lanes))
+            else:
+                for _ in range(self.client.workers):
+                    self.handler_worker_tasks.append(
+                        self.loop.create_task(self.handler_worker())
+                    )
+
+                log.info("Started %s HandlerTasks", self.client.workers)
 
             if not self.client.skip_updates:
                 await self.client.recover_gaps()
 
     async def stop(self):
         if not self.client.no_updates:
-            for i in range(self.client.workers):
+            if self.lanes:
+                # The lane router forwards the stop signal to every lane
                 self.updates_queue.put_nowait(None)
+            else:
+                for i in range(self.client.workers):
+                    self.updates_queue.put_nowait(None)
 
             for i in self.handler_worker_tasks:
                 await i
 
-            self.handler_worker_tasks.clear()
-            self.groups.clear()
-            self.error_handlers.clear()
+            await asyncio.gather(*self.bypass_tasks)
 
-            log.info("Stopped %s HandlerTasks", self.client.workers)
+            log.info("Stopped %s HandlerTasks", len(self.lanes) or self.client.workers)
+
+            self.handler_worker_tasks.clear()
+            self.lanes.clear()
+            self.set_groups(OrderedDict())
+            self.error_handlers = []
 
     def add_handler(self, handler, group: int):
-        async def fn():
-            for lock in self.locks_list:
-                await lock.acquire()
+        if isinstance(handler, ErrorHandler):
+            if handler not in self.error_handlers:
+                self.error_handlers = self.error_handlers + [handler]
+        else:
+            groups = OrderedDict(self.groups)
+            groups[group] = groups.get(group, ()) + (handler,)
+            self.set_groups(OrderedDict(sorted(groups.items())))
 
-            try:
-                if isinstance(handler, ErrorHandler):
-                    if handler not in self.error_handlers:
-                        self.error_handlers.append(handler)
-                else:
-                    if group not in self.groups:
-                        self.groups[group] = []
-                        self.groups = OrderedDict(sorted(self.groups.items()))
-                    self.groups[group].append(handler)
-            finally:
-                for lock in self.locks_list:
-                    lock.release()
+    def remove_handler(self, handler, group: int):
+        if isinstance(handler, ErrorHandler):
+            if handler not in self.error_handlers:
+                raise ValueError(
+                    f"Error handler {handler} does not exist. Handler was not removed."
+                )
+            self.error_handlers = [h for h in self.error_handlers if h is not handler]
+        else:
+            if group not in self.groups:
+                raise ValueError(f"Group {group} does not exist. Handler was not removed.")
+            if handler not in self.groups[group]:
+                raise ValueError(f"Handler {handler} does not exist in group {group}. Handler was not removed.")
 
-        self.loop.create_task(fn())
+            groups = OrderedDict(self.groups)
+            handlers = list(groups[group])
+            handlers.remove(handler)
+            groups[group] = tuple(handlers)
+            self.set_groups(groups)
 
-    def remove_handler(self, handler, group: int):
-        async def fn():
-            for lock in self.locks_list:
-                await lock.acquire()
+    def set_groups(self, groups: OrderedDict):
+        """Atomically replace the registered handlers.
 
-            try:
-                if isinstance(handler, ErrorHandler):
-                    if handler not in self.error_handlers:
-                        raise ValueError(
-                            f"Error handler {handler} does not exist. Handler was not removed."
-                        )
-                    self.error_handlers.remove(handler)
-                else:
-                    if group not in self.groups:
-                        raise ValueError(f"Group {group} does not exist. Handler was not removed.")
-                    self.groups[group].remove(handler)
-            finally:
-                for lock in self.locks_list:
-                    lock.release()
+        Updates being dispatched keep using the handler table they started with, new updates see the new one.
+        """
+        self.handler_table = HandlerTable(groups, self.conversation_handler)
+        self.groups = groups
+
+    def get_routes(self, handler_type: type) -> list:
+        return self.handler_table.get_routes(handler_type)
 
-        self.loop.create_task(fn())
+    def has_consumers(self, handler_type: type) -> bool:
+        return self.handler_table.has_consumers(handler_type)
+
+    async def handler_worker(self, queue: asyncio.Queue = None):
+        queue = queue or self.updates_queue
 
-    async def handler_worker(self, lock: asyncio.Lock):
         while True:
-            packet = await self.updates_queue.get()
+            packet = await queue.get()
+
+            if queue is not self.updates_queue:
+                self.lane_taken.set()
 
             if packet is None:
                 break
 
             try:
-                await self._handle_packet(packet, lock)
-            except pyrogram.StopPropagation:
-                pass
-            except Exception as e:
-                log.exception(e)
+                await self.handle_packet(packet)
+            finally:
+                queue.task_done()
+
+    async def handle_packet(self, packet):
+        try:
+            await self._handle_packet(packet)
+        except pyrogram.StopPropagation:
+            pass
+        except Exception as e:
+            log.exception(e)
+
+    async def lane_router(self):
+        while True:
+            packet = await self.updates_queue.get()
+
+            try:
+                if packet is None:
+                    for lane in self.lanes:
+                        await lane.put(None)
+
+                    break
+
+                key = self.get_update_key(packet[0])
+
+                if key is None:
+                    # Updates not tied to any chat (e.g. deletions outside channels) may concern any of them: they
+                    # wait for every lane to catch up and are handled alone, so that they can't overtake earlier
+                    # updates of their chat nor be overtaken by later ones. A handler that never returns would
+                    # stall every lane, so neither wait lasts longer than LANE_JOIN_TIMEOUT
+                    await self.join_lanes(self.lanes)
+
+                    self.lane_updates[0] += 1
+                    self.lanes[0].put_nowait(packet)
+                    await self.join_lanes(self.lanes[:1])
+
+                    continue
+
+                index = hash(key) % len(self.lanes)
+
+                if self.lanes[index].is_busy() and self.has_waiters():
+                    # A handler of this lane may be waiting for this very update (e.g. Client.listen()), which would
+                    # never reach it from behind the handler: handle it right away instead
+                    self.bypass(packet)
+                    continue
+
+                while self.lanes_full():
+                    self.lane_taken.clear()
+                    await self.lane_taken.wait()
+
+                self.lane_updates[index] += 1
+                self.lanes[index].put_nowait(packet)
             finally:
                 self.updates_queue.task_done()
 
-    async def _handle_packet(self, packet, lock: asyncio.Lock):
+    async def join_lanes(self, lanes: list):
+        tasks = [asyncio.ensure_future(lane.join()) for lane in lanes]
+        _, pending = await asyncio.wait(tasks, timeout=self.LANE_JOIN_TIMEOUT)
+
+        for task in pending:
+            task.cancel()
+
+    def has_waiters(self) -> bool:
+        """Whether a listener or a conversation is waiting for an update."""
+        return any(self.client.listeners.values()) or bool(self.conversation_handler.waiters)
+
+    def bypass(self, packet):
+        self.bypassed_updates += 1
+
+        task = self.loop.create_task(self.handle_packet(packet))
+        self.bypass_tasks.add(task)
+        task.add_done_callback(self.bypass_tasks.discard)
+
+    def lanes_full(self) -> bool:
+        """Whether the BLOCK policy must hold back the updates queue until a lane takes an update."""
+        return (
+            self.updates_queue.policy == enums.UpdatesOverflowPolicy.BLOCK
+            and 0 < self.updates_queue.capacity <= sum(lane.qsize() for lane in self.lanes)
+        )
+
+    @staticmethod
+    def get_update_key(update) -> Optional[int]:
+        """Get the id of the chat (or user) a raw update belongs to, if any."""
+        message = getattr(update, "message", None)
+        peer = getattr(message, "peer_id", None) or getattr(update, "peer", None)
+
+        if peer is not None:
+            try:
+                return utils.get_peer_id(peer)
+            except ValueError:
+                pass
+
+        channel_id = getattr(update, "channel_id", None)
+
+        if channel_id:
+            return utils.get_channel_id(channel_id)
+
+        chat_id = getattr(update, "chat_id", None)
+
+        if chat_id:
+            return -chat_id
+
+        return getattr(update, "user_id", None)
+
+    def get_lane_stats(self) -> dict:
+        """Get the per-chat dispatch statistics.
+
+        Returns:
+            ``dict``: The number of updates routed to each lane, the number of updates still pending in each lane,
+            the number of updates handled outside of their lane because a listener or conversation was waiting and
+            the skew, i.e. the ratio between the busiest lane and the average lane (1.0 means perfectly even).
+        """
+        total = sum(self.lane_updates)
+
+        return {
+            "updates": list(self.lane_updates),
+            "pending": [lane.qsize() for lane in self.lanes],
+            "bypassed": self.bypassed_updates,
+            "skew": max(self.lane_updates) * len(self.lane_updates) / total if total else 0.0
+        }
+
+    async def _handle_packet(self, packet):
         update, users, chats = packet
+        # Cached copies of edited or deleted messages are stale whether or not a handler consumes the update
+        self.client.message_cache.invalidate_update(update)
+
+        if self.client.message_store is not None:
+            self.client.message_store.invalidate_update(update)
+
+        handler_type = self.update_handler_types.get(type(update), type(None))
+        # The whole update is dispatched against the handlers registered at this point in time
+        handler_table = self.handler_table
+
+        if handler_table.has_consumers(handler_type):
+            parsed_update, handler_type = await self._parse_update(update, users, chats)
+        elif handler_table.has_raw_update_handlers:
+            # Only raw update handlers are interested, the update is parsed later on if an error handler needs it
+            parsed_update = None
+        else:
+            self.skipped_updates[type(update).__name__] += 1
+            return
+
+        await self._dispatch_to_handlers(update, users, chats, parsed_update, handler_table, handler_type)
+
+    async def _parse_update(self, update, users, chats):
         parser = self.update_parsers.get(type(update))
 
-        parsed_update, handler_type = (
-            await parser(update, users, chats)
-            if parser is not None else (None, type(None))
-        )
-        async with lock:
-            await self._dispatch_to_handlers(update, users, chats, parsed_update, handler_type)
+        if parser is None:
+            return None, type(None)
+
+        self.parsed_updates[type(update).__name__] += 1
 
+        return await parser(update, users, chats)
 
     async def _dispatch_to_handlers(
-        self, update, users, chats, parsed_update, handler_type,
+        self, update, users, chats, parsed_update, handler_table, handler_type,
     ):
-        for group in self.groups.values():
+        routes = handler_table.get_routes(handler_type)
+        regex_indexes = handler_table.get_regex_indexes(handler_type)
+        regex_value = self._get_regex_value(parsed_update)
+
+        for group, regex_index in zip(routes, regex_indexes):
+            rejected = regex_index.get_rejected(regex_value) if regex_index and regex_value is not None else ()
+
             for handler in group:
+                if handler in rejected:
+                    # The regex filter would have run and found nothing, don't leave earlier matches behind
+                    if regex_value:
+                        parsed_update.matches = None
+
+                    continue
+
                 args = await self._match_handler(
                     handler, update, users, chats, parsed_update, handler_type,
                 )
@@ -386,16 +942,31 @@ class Dispatcher:
                 except pyrogram.ContinuePropagation:
                     continue
                 except Exception as error:
+                    if parsed_update is None:
+                        parsed_update, _ = await self._parse_update(update, users, chats)
+
                     if parsed_update is not None:
                         await self._handle_exception(parsed_update, error)
                 break
 
+    def _get_regex_value(self, parsed_update) -> Optional[str]:
+        # Listeners are checked by the handlers themselves, so every handler must run while any is pending
+        if parsed_update is None or any(self.client.listeners.values()):
+            return None
+
+        try:
+            value = filters.get_regex_value(parsed_update)
+        except ValueError:
+            return None
+
+        return value if isinstance(value, str) else None
+
     async def _match_handler(
         self, handler, update, users, chats, parsed_update, handler_type,
     ):
         try:
             if isinstance(handler, handler_type):
-                if await handler.check(self.client, parsed_update):
+                if parsed_update is not None and await handler.check(self.client, parsed_update):
                     return (parsed_update,)
             elif isinstance(handler, RawUpdateHandler):
                 if await handler.check(self.client, update):
@@ -43,6 +43,7 @@ from .reply_color import ReplyColor
 from .sent_code_type import SentCodeType
 from .stories_privacy_rules import StoriesPrivacyRules
 from .story_privacy import StoryPrivacy
+from .updates_overflow_policy import UpdatesOverflowPolicy
 from .user_status import UserStatus
 
 __all__ = [
@@ -72,5 +73,6 @@ __all__ = [
     'SentCodeType',
     "StoriesPrivacyRules",
     "StoryPrivacy",
+    'UpdatesOverflowPolicy',
     'UserStatus'
 ]
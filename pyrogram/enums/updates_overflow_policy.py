@@ -0,0 +1,38 @@
+#  Pyrofork - Telegram MTProto API Client Library for Python
+#  Copyright (C) 2017-present Dan <https://github.com/delivrance>
+#  Copyright (C) 2022-present Mayuri-Chan <https://github.com/Mayuri-Chan>
+#
+#  This file is part of Pyrofork.
+#
+#  Pyrofork is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Pyrofork is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with Pyrofork.  If not, see <http://www.gnu.org/licenses/>.
+
+from enum import auto
+
+from .auto_name import AutoName
+
+
+class UpdatesOverflowPolicy(AutoName):
+    """What to do when the updates queue of a :obj:`~pyrogram.Client` is full."""
+
+    BLOCK = auto()
+    "Keep every update and deliver them in order; updates received meanwhile wait in memory, so this doesn't bound it"
+
+    DROP_OLDEST = auto()
+    "Drop the oldest pending update to make room for the new one"
+
+    DROP_LOW_PRIORITY = auto()
+    "Drop low priority updates (statuses, typing, read receipts, views) first, then the oldest one of any priority"
+
+    COALESCE = auto()
+    "Replace pending updates superseded by a newer one (e.g. user statuses), then drop the oldest pending update"
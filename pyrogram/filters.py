@@ -18,9 +18,10 @@
 #  You should have received a copy of the GNU Lesser General Public License
 #  along with Pyrofork.  If not, see <http://www.gnu.org/licenses/>.
 
+import functools
 import inspect
 import re
-from typing import Callable, List, Pattern, Union
+from typing import Callable, List, Optional, Pattern, Union
 
 import pyrogram
 from pyrogram import enums
@@ -50,21 +51,36 @@ class Filter:
         return OrFilter(self, other)
 
 
+async def _run_inline(flt: Callable, client: "pyrogram.Client", update: Update):
+    return flt(client, update)
+
+
+async def _run_blocking(flt: Callable, client: "pyrogram.Client", update: Update):
+    return await client.loop.run_in_executor(client.executor, flt, client, update)
+
+
+def compile_filter(flt: Callable) -> Callable:
+    """Get an ``async (client, update)`` evaluator for a filter, deciding once how the filter has to be run.
+
+    Coroutine filters are awaited directly and plain functions run inline. Only filters explicitly marked as
+    blocking (e.g.: ``filters.create(func, blocking=True)``) are offloaded to the client executor.
+    """
+    if inspect.iscoroutinefunction(flt) or inspect.iscoroutinefunction(flt.__call__):
+        return flt
+
+    if getattr(flt, "blocking", False):
+        return functools.partial(_run_blocking, flt)
+
+    return functools.partial(_run_inline, flt)
+
+
 class InvertFilter(Filter):
     def __init__(self, base):
         self.base = base
+        self.evaluate_base = compile_filter(base)
 
     async def __call__(self, client: "pyrogram.Client", update: Update):
-        if inspect.iscoroutinefunction(self.base.__call__):
-            x = await self.base(client, update)
-        else:
-            x = await client.loop.run_in_executor(
-                client.executor,
-                self.base,
-                client, update
-            )
-
-        return not x
+        return not await self.evaluate_base(client, update)
 
 
 class AndFilter(Filter):
@@ -72,30 +88,24 @@ class AndFilter(Filter):
         self.base = base
         self.other = other
 
+        # Chains such as a & b & c are flattened into a single evaluator list
+        self.filters = tuple(
+            f for operand in (base, other)
+            for f in (operand.filters if isinstance(operand, AndFilter) else (operand,))
+        )
+        self.evaluators = tuple(compile_filter(f) for f in self.filters)
+
     async def __call__(self, client: "pyrogram.Client", update: Update):
-        if inspect.iscoroutinefunction(self.base.__call__):
-            x = await self.base(client, update)
-        else:
-            x = await client.loop.run_in_executor(
-                client.executor,
-                self.base,
-                client, update
-            )
+        result = True
 
-        # short circuit
-        if not x:
-            return False
+        for evaluate in self.evaluators:
+            result = await evaluate(client, update)
 
-        if inspect.iscoroutinefunction(self.other.__call__):
-            y = await self.other(client, update)
-        else:
-            y = await client.loop.run_in_executor(
-                client.executor,
-                self.other,
-                client, update
-            )
+            # short circuit
+            if not result:
+                return False
 
-        return x and y
+        return result
 
 
 class OrFilter(Filter):
@@ -103,30 +113,24 @@ class OrFilter(Filter):
         self.base = base
         self.other = other
 
+        # Chains such as a | b | c are flattened into a single evaluator list
+        self.filters = tuple(
+            f for operand in (base, other)
+            for f in (operand.filters if isinstance(operand, OrFilter) else (operand,))
+        )
+        self.evaluators = tuple(compile_filter(f) for f in self.filters)
+
     async def __call__(self, client: "pyrogram.Client", update: Update):
-        if inspect.iscoroutinefunction(self.base.__call__):
-            x = await self.base(client, update)
-        else:
-            x = await client.loop.run_in_executor(
-                client.executor,
-                self.base,
-                client, update
-            )
+        result = False
 
-        # short circuit
-        if x:
-            return True
+        for evaluate in self.evaluators:
+            result = await evaluate(client, update)
 
-        if inspect.iscoroutinefunction(self.other.__call__):
-            y = await self.other(client, update)
-        else:
-            y = await client.loop.run_in_executor(
-                client.executor,
-                self.other,
-                client, update
-            )
+            # short circuit
+            if result:
+                return True
 
-        return x or y
+        return result
 
 
 CUSTOM_FILTER_NAME = "CustomFilter"
@@ -154,6 +158,8 @@ def create(func: Callable, name: str = None, **kwargs) -> Filter:
         **kwargs (``any``, *optional*):
             Any keyword argument you would like to pass. Useful when creating parameterized custom filters, such as
             :meth:`~pyrogram.filters.command` or :meth:`~pyrogram.filters.regex`.
+            Pass ``blocking=True`` if *func* is a plain (non-async) function doing blocking work, so that it is run in
+            the client executor instead of inline on the event loop.
     """
     return type(
         name or func.__name__ or CUSTOM_FILTER_NAME,
@@ -868,6 +874,121 @@ general_forum_topic_unhidden = create(general_topic_unhidden_filter)
 # endregion
 
 # region command_filter
+class CommandRouter:
+    """Resolves commands of incoming messages for all the command filters of a :obj:`~pyrogram.Client`.
+
+    Each message text is tokenized once, no matter how many command filters look at it, and commands are then looked
+    up by prefix and name in the filters' command sets instead of being matched with per-command regular expressions.
+
+    The router only answers the command filters, it doesn't pick the handler itself: command filters are usually
+    combined with other filters (e.g. ``filters.command("start") & filters.private``) and handlers still run in group
+    and registration order, so every command handler keeps evaluating its filters, each at the cost of a set lookup.
+    """
+
+    ARGUMENTS_RE = re.compile(r"([\"'])(.*?)(?<!\\)\1|(\S+)")
+    ESCAPED_QUOTE_RE = re.compile(r"\\([\"'])")
+    HEAD_RE = re.compile(r"\S*")
+
+    def __init__(self, client: "pyrogram.Client"):
+        self.client = client
+        self.me = None
+        self.mentions = frozenset()
+
+    def get_mentions(self) -> frozenset:
+        """Get the (lowercase) usernames a command can be addressed to, as in /start@username."""
+        me = self.client.me
+
+        if me is not self.me:
+            usernames = {me.username} | {u.username for u in me.usernames or []}
+            self.mentions = frozenset(u.lower() for u in usernames if u) or frozenset({""})
+            self.me = me
+
+        return self.mentions
+
+    def tokenize(self, message: Message) -> tuple:
+        """Split the message text into its first word and the rest (arguments), once per message."""
+        tokens = getattr(message, "_command_tokens", None)
+
+        if tokens is None:
+            text = message.text or message.caption or ""
+            head = self.HEAD_RE.match(text).group()
+            tokens = message._command_tokens = (head, text[len(head):])
+
+        return tokens
+
+    def parse_arguments(self, arguments: str) -> List[str]:
+        # match.groups are 1-indexed, group(1) is the quote, group(2) is the text
+        # between the quotes, group(3) is unquoted, whitespace-split text
+
+        # Remove the escape character from the arguments
+        return [
+            self.ESCAPED_QUOTE_RE.sub(r"\1", m.group(2) or m.group(3) or "")
+            for m in self.ARGUMENTS_RE.finditer(arguments)
+        ]
+
+    def match(
+        self,
+        message: Message,
+        prefixes: set,
+        commands: set,
+        case_sensitive: bool,
+        phrases: set = frozenset()
+    ) -> Optional[List[str]]:
+        """Get the *message.command* list if the message is one of *commands*, None otherwise.
+
+        *phrases* holds the (prefix, command) pairs that contain whitespace, which can't be told apart from the first
+        word alone and are matched against the whole text instead.
+        """
+        head, arguments = self.tokenize(message)
+
+        if not head:
+            return None
+
+        for prefix, name in phrases:
+            command = self.match_phrase(message.text or message.caption or "", prefix, name, case_sensitive)
+
+            if command is not None:
+                return command
+
+        for prefix in prefixes:
+            if not head.startswith(prefix):
+                continue
+
+            name, at, mention = head[len(prefix):].partition("@")
+
+            if at and mention.lower() not in self.get_mentions():
+                continue
+
+            name = name if case_sensitive else name.lower()
+
+            if name in commands:
+                return [name] + self.parse_arguments(arguments)
+
+        return None
+
+    def match_phrase(self, text: str, prefix: str, name: str, case_sensitive: bool) -> Optional[List[str]]:
+        phrase = prefix + name
+        start = text[:len(phrase)]
+
+        if (start if case_sensitive else start.lower()) != (phrase if case_sensitive else phrase.lower()):
+            return None
+
+        arguments = text[len(phrase):]
+
+        if arguments.startswith("@"):
+            mention = self.HEAD_RE.match(arguments, 1).group()
+
+            if mention.lower() not in self.get_mentions():
+                return None
+
+            arguments = arguments[1 + len(mention):]
+
+        if arguments and not arguments[0].isspace():
+            return None
+
+        return [name] + self.parse_arguments(arguments)
+
+
 def command(commands: Union[str, List[str]], prefixes: Union[str, List[str]] = "/", case_sensitive: bool = False):
     """Filter commands, i.e.: text messages starting with "/" or any other custom prefix.
 
@@ -877,6 +998,7 @@ def command(commands: Union[str, List[str]], prefixes: Union[str, List[str]] = "
             Examples: "start", ["start", "help", "settings"]. When a message text containing
             a command arrives, the command itself and its arguments will be stored in the *command*
             field of the :obj:`~pyrogram.types.Message`.
+            Commands are matched literally, not as regular expressions, and may contain spaces, e.g. "add user".
 
         prefixes (``str`` | ``list``, *optional*):
             A prefix or a list of prefixes as string the filter should look for.
@@ -887,65 +1009,17 @@ def command(commands: Union[str, List[str]], prefixes: Union[str, List[str]] = "
             Pass True if you want your command(s) to be case sensitive. Defaults to False.
             Examples: when True, command="Start" would trigger /Start but not /start.
     """
-    command_re = re.compile(r"([\"'])(.*?)(?<!\\)\1|(\S+)")
 
     async def func(flt, client: pyrogram.Client, message: Message):
-        usernames = []
-        username = client.me.username or ""
-        if client.me.usernames:
-            usernames.append(username)
-            for user in client.me.usernames:
-                usernames.append(user.username)
-        text = message.text or message.caption
-        message.command = None
-
-        if not text:
-            return False
-
-        for prefix in flt.prefixes:
-            if not text.startswith(prefix):
-                continue
-
-            without_prefix = text[len(prefix):]
-
-            for cmd in flt.commands:
-                if usernames:
-                    for username in usernames:
-                        if not re.match(rf"^(?:{cmd}(?:@?{username})?)(?:\s|$)", without_prefix,
-                                        flags=re.IGNORECASE if not flt.case_sensitive else 0):
-                            continue
-
-                        without_command = re.sub(rf"{cmd}(?:@?{username})?\s?", "", without_prefix, count=1,
-                                                flags=re.IGNORECASE if not flt.case_sensitive else 0)
-
-                        # match.groups are 1-indexed, group(1) is the quote, group(2) is the text
-                        # between the quotes, group(3) is unquoted, whitespace-split text
-
-                        # Remove the escape character from the arguments
-                        message.command = [cmd] + [
-                            re.sub(r"\\([\"'])", r"\1", m.group(2) or m.group(3) or "")
-                            for m in command_re.finditer(without_command)
-                        ]
-                        return True
-                if not re.match(rf"^(?:{cmd}(?:@?{username})?)(?:\s|$)", without_prefix,
-                                flags=re.IGNORECASE if not flt.case_sensitive else 0):
-                    continue
-
-                without_command = re.sub(rf"{cmd}(?:@?{username})?\s?", "", without_prefix, count=1,
-                                         flags=re.IGNORECASE if not flt.case_sensitive else 0)
-
-                # match.groups are 1-indexed, group(1) is the quote, group(2) is the text
-                # between the quotes, group(3) is unquoted, whitespace-split text
-
-                # Remove the escape character from the arguments
-                message.command = [cmd] + [
-                    re.sub(r"\\([\"'])", r"\1", m.group(2) or m.group(3) or "")
-                    for m in command_re.finditer(without_command)
-                ]
-
-                return True
+        message.command = client.command_router.match(
+            message,
+            flt.prefixes,
+            flt.commands,
+            flt.case_sensitive,
+            flt.phrases
+        )
 
-        return False
+        return message.command is not None
 
     commands = commands if isinstance(commands, list) else [commands]
     commands = {c if case_sensitive else c.lower() for c in commands}
@@ -954,17 +1028,117 @@ def command(commands: Union[str, List[str]], prefixes: Union[str, List[str]] = "
     prefixes = prefixes if isinstance(prefixes, list) else [prefixes]
     prefixes = set(prefixes) if prefixes else {""}
 
+    # Multi-word commands (or prefixes) don't fit in the first word of a message and are matched separately
+    phrases = {(p, c) for p in prefixes for c in commands if any(char.isspace() for char in p + c)}
+
     return create(
         func,
         "CommandFilter",
         commands=commands,
         prefixes=prefixes,
-        case_sensitive=case_sensitive
+        case_sensitive=case_sensitive,
+        phrases=phrases
     )
 
 
 # endregion
 
+# region regex_filter
+def get_regex_value(update: Update) -> Union[str, bytes, None]:
+    """Get the value regex filters are matched against for the given update."""
+    if isinstance(update, Message):
+        return update.text or update.caption
+    elif isinstance(update, CallbackQuery):
+        return update.data
+    elif isinstance(update, InlineQuery):
+        return update.query
+    elif isinstance(update, PreCheckoutQuery):
+        return update.payload
+    else:
+        raise ValueError(f"Regex filter doesn't work with {type(update)}")
+
+
+def get_literal_prefix(pattern: Pattern) -> Optional[str]:
+    """Get the literal text every match of an anchored pattern must start with, if it can be told.
+
+    E.g.: ``^page_(\\d+)`` -> ``page_``. Used to skip regex handlers without running their pattern.
+    """
+    if not isinstance(pattern.pattern, str) or pattern.flags & (re.MULTILINE | re.VERBOSE):
+        return None
+
+    source = pattern.pattern
+
+    if source.startswith("^"):
+        i = 1
+    elif source.startswith("\\A"):
+        i = 2
+    else:
+        return None
+
+    # A top-level alternation means the anchor only applies to its first branch
+    depth = 0
+    in_class = False
+    j = 0
+
+    while j < len(source):
+        c = source[j]
+
+        if c == "\\":
+            j += 2
+            continue
+
+        if in_class:
+            in_class = c != "]"
+        elif c == "[":
+            in_class = True
+            j += 2 if source[j + 1:j + 2] == "]" else 1
+            continue
+        elif c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+        elif c == "|" and depth == 0:
+            return None
+
+        j += 1
+
+    literal = []
+
+    while i < len(source):
+        c = source[i]
+
+        if c == "\\":
+            escaped = source[i + 1:i + 2]
+
+            # Escaped punctuation is literal, escapes such as \d or \b are not
+            if not escaped or escaped.isalnum():
+                break
+
+            char, step = escaped, 2
+        elif c in ".^$*+?{}[]|()":
+            break
+        else:
+            char, step = c, 1
+
+        # A quantifier makes the character optional (or repeated)
+        if source[i + step:i + step + 1] in ("*", "?", "{", "+"):
+            break
+
+        literal.append(char)
+        i += step
+
+    return "".join(literal) or None
+
+
+async def regex_filter(flt, _, update: Update):
+    value = get_regex_value(update)
+
+    if value:
+        update.matches = list(flt.p.finditer(value)) or None
+
+    return bool(update.matches)
+
+
 def regex(pattern: Union[str, Pattern], flags: int = 0):
     """Filter updates that match a given regular expression pattern.
 
@@ -985,31 +1159,18 @@ def regex(pattern: Union[str, Pattern], flags: int = 0):
         flags (``int``, *optional*):
             Regex flags.
     """
-
-    async def func(flt, _, update: Update):
-        if isinstance(update, Message):
-            value = update.text or update.caption
-        elif isinstance(update, CallbackQuery):
-            value = update.data
-        elif isinstance(update, InlineQuery):
-            value = update.query
-        elif isinstance(update, PreCheckoutQuery):
-            value = update.payload
-        else:
-            raise ValueError(f"Regex filter doesn't work with {type(update)}")
-
-        if value:
-            update.matches = list(flt.p.finditer(value)) or None
-
-        return bool(update.matches)
+    p = pattern if isinstance(pattern, Pattern) else re.compile(pattern, flags)
 
     return create(
-        func,
+        regex_filter,
         "RegexFilter",
-        p=pattern if isinstance(pattern, Pattern) else re.compile(pattern, flags)
+        p=p,
+        literal_prefix=get_literal_prefix(p)
     )
 
 
+# endregion
+
 # noinspection PyPep8Naming
 class user(Filter, set):
     """Filter messages coming from one or more users.
@@ -106,14 +106,8 @@ class CallbackQueryHandler(Handler):
         listener_does_match = False
 
         if listener:
-            filters = listener.filters
-            if callable(filters):
-                if iscoroutinefunction(filters.__call__):
-                    listener_does_match = await filters(client, query)
-                else:
-                    listener_does_match = await client.loop.run_in_executor(
-                        None, filters, client, query
-                    )
+            if listener.filters_evaluator is not None:
+                listener_does_match = await listener.filters_evaluator(client, query)
             else:
                 listener_does_match = True
 
@@ -132,15 +126,7 @@ class CallbackQueryHandler(Handler):
             client, query
         )
 
-        if callable(self.filters):
-            if iscoroutinefunction(self.filters.__call__):
-                handler_does_match = await self.filters(client, query)
-            else:
-                handler_does_match = await client.loop.run_in_executor(
-                    None, self.filters, client, query
-                )
-        else:
-            handler_does_match = True
+        handler_does_match = await self.check_filters(client, query)
 
         data = self.compose_data_identifier(query)
 
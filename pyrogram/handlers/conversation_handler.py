@@ -17,7 +17,6 @@
 #  You should have received a copy of the GNU Lesser General Public License
 #  along with Pyrofork.  If not, see <http://www.gnu.org/licenses/>.
 
-import inspect
 from typing import Union
 
 import pyrogram
@@ -44,16 +43,9 @@ class ConversationHandler(MessageHandler, CallbackQueryHandler):
         if not waiter or not isinstance(update, waiter['update_type']) or waiter['future'].done():
             return False
 
-        filters = waiter.get('filters')
-        if callable(filters):
-            if inspect.iscoroutinefunction(filters.__call__):
-                filtered = await filters(client, update)
-            else:
-                filtered = await client.loop.run_in_executor(
-                    client.executor,
-                    filters,
-                    client, update
-                )
+        filters_evaluator = waiter.get('filters_evaluator')
+        if filters_evaluator is not None:
+            filtered = await filters_evaluator(client, update)
             if not filtered or waiter['future'].done():
                 return False
 
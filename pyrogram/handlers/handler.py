@@ -17,28 +17,38 @@
 #  You should have received a copy of the GNU Lesser General Public License
 #  along with Pyrofork.  If not, see <http://www.gnu.org/licenses/>.
 
-import inspect
 from typing import Callable
 
 import pyrogram
-from pyrogram.filters import Filter
+from pyrogram.filters import Filter, compile_filter
 from pyrogram.types import Update
 
 
 class Handler:
+    _filters = None
+    filters_evaluator = None
+    # Bumped whenever the filters of any handler change, so that indexes built from them know they are stale
+    filters_version = 0
+
     def __init__(self, callback: Callable, filters: Filter = None):
         self.callback = callback
         self.filters = filters
 
-    async def check(self, client: "pyrogram.Client", update: Update):
-        if callable(self.filters):
-            if inspect.iscoroutinefunction(self.filters.__call__):
-                return await self.filters(client, update)
-            else:
-                return await client.loop.run_in_executor(
-                    client.executor,
-                    self.filters,
-                    client, update
-                )
+    @property
+    def filters(self) -> Filter:
+        return self._filters
+
+    @filters.setter
+    def filters(self, filters: Filter):
+        self._filters = filters
+        self.filters_evaluator = compile_filter(filters) if callable(filters) else None
+        Handler.filters_version += 1
+
+    async def check_filters(self, client: "pyrogram.Client", update: Update) -> bool:
+        if self.filters_evaluator is not None:
+            return await self.filters_evaluator(client, update)
 
         return True
+
+    async def check(self, client: "pyrogram.Client", update: Update):
+        return await self.check_filters(client, update)
@@ -82,14 +82,8 @@ class MessageHandler(Handler):
         listener_does_match = False
 
         if listener:
-            filters = listener.filters
-            if callable(filters):
-                if iscoroutinefunction(filters.__call__):
-                    listener_does_match = await filters(client, message)
-                else:
-                    listener_does_match = await client.loop.run_in_executor(
-                        None, filters, client, message
-                    )
+            if listener.filters_evaluator is not None:
+                listener_does_match = await listener.filters_evaluator(client, message)
             else:
                 listener_does_match = True
 
@@ -107,15 +101,7 @@ class MessageHandler(Handler):
             await self.check_if_has_matching_listener(client, message)
         )[0]
 
-        if callable(self.filters):
-            if iscoroutinefunction(self.filters.__call__):
-                handler_does_match = await self.filters(client, message)
-            else:
-                handler_does_match = await client.loop.run_in_executor(
-                    None, self.filters, client, message
-                )
-        else:
-            handler_does_match = True
+        handler_does_match = await self.check_filters(client, message)
 
         # let handler get the chance to handle if listener
         # exists but its filters doesn't match
@@ -71,6 +71,8 @@ class Invoke:
         if not self.is_connected:
             raise ConnectionError("Client has not been started yet")
 
+        original_query = query
+
         if self.no_updates:
             query = raw.functions.InvokeWithoutUpdates(query=query)
 
@@ -87,4 +89,8 @@ class Invoke:
         await self.fetch_peers(getattr(r, "users", []))
         await self.fetch_peers(getattr(r, "chats", []))
 
+        if not self.no_updates:
+            # The pts of the updates a method result carries won't be pushed again
+            await self.updates_sequencer.apply_result(original_query, r)
+
         return r
@@ -60,7 +60,7 @@ class ResolvePeer:
             raise ConnectionError("Client has not been started yet")
 
         try:
-            return await self.storage.get_peer_by_id(peer_id)
+            return await self.peer_buffer.get_peer_by_id(peer_id)
         except KeyError:
             if isinstance(peer_id, str):
                 if peer_id in ("self", "me"):
@@ -73,7 +73,7 @@ class ResolvePeer:
                     int(peer_id)
                 except ValueError:
                     try:
-                        return await self.storage.get_peer_by_username(peer_id)
+                        return await self.peer_buffer.get_peer_by_username(peer_id)
                     except KeyError:
                         await self.invoke(
                             raw.functions.contacts.ResolveUsername(
@@ -81,10 +81,10 @@ class ResolvePeer:
                             )
                         )
 
-                        return await self.storage.get_peer_by_username(peer_id)
+                        return await self.peer_buffer.get_peer_by_username(peer_id)
                 else:
                     try:
-                        return await self.storage.get_peer_by_phone_number(peer_id)
+                        return await self.peer_buffer.get_peer_by_phone_number(peer_id)
                     except KeyError:
                         raise PeerIdInvalid
 
@@ -122,6 +122,6 @@ class ResolvePeer:
                 )
 
             try:
-                return await self.storage.get_peer_by_id(peer_id)
+                return await self.peer_buffer.get_peer_by_id(peer_id)
             except KeyError:
                 raise PeerIdInvalid
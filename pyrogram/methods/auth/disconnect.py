@@ -38,5 +38,10 @@ class Disconnect:
             raise ConnectionError("Can't disconnect an initialized client")
 
         await self.session.stop()
+        await self.peer_buffer.flush()
+        await self.state_buffer.checkpoint()
         await self.storage.close()
+        self.peer_buffer.clear()
+        self.state_buffer.clear()
+        self.updates_sequencer.clear()
         self.is_connected = False
@@ -49,6 +49,12 @@ class Initialize:
 
         await self.dispatcher.start()
 
+        self.peer_buffer.start()
+        self.state_buffer.start()
+
+        if self.message_store is not None:
+            self.message_store.start()
+
         self.updates_watchdog_task = asyncio.create_task(self.updates_watchdog())
 
         self.is_initialized = True
@@ -17,6 +17,7 @@
 #  You should have received a copy of the GNU Lesser General Public License
 #  along with Pyrofork.  If not, see <http://www.gnu.org/licenses/>.
 
+import asyncio
 import logging
 
 import pyrogram
@@ -45,8 +46,26 @@ class Terminate:
             await self.invoke(raw.functions.account.FinishTakeoutSession())
             log.info("Takeout session %s finished", self.takeout_id)
 
+        if self.gap_recovery_task is not None:
+            self.gap_recovery_task.cancel()
+
+            try:
+                await self.gap_recovery_task
+            except asyncio.CancelledError:
+                pass
+
+            self.gap_recovery_task = None
+
+        await self.difference_batcher.stop()
+        await self.updates_sequencer.stop()
+        await self.peer_buffer.stop()
+        await self.state_buffer.stop()
         await self.storage.save()
         await self.dispatcher.stop()
+        await self.reply_loader.stop()
+
+        if self.message_store is not None:
+            await self.message_store.stop()
 
         for media_session in self.media_sessions.values():
             await media_session.stop()
@@ -42,13 +42,4 @@ class GetListenerMatchingWithData:
         Returns:
             :obj:`~pyrogram.types.Listener`: On success, a Listener is returned.
         """
-        matching = []
-        for listener in self.listeners[listener_type]:
-            if listener.identifier.matches(data):
-                matching.append(listener)
-
-        # in case of multiple matching listeners, the most specific should be returned
-        def count_populated_attributes(listener_item: Listener):
-            return listener_item.identifier.count_populated()
-
-        return max(matching, key=count_populated_attributes, default=None)
+        return self.listeners[listener_type].get_most_specific(data)
@@ -23,7 +23,7 @@ from typing import Union
 from functools import partial
 
 from pyrogram import types
-from pyrogram.filters import Filter
+from pyrogram.filters import Filter, compile_filter
 
 
 class WaitForCallbackQuery:
@@ -79,6 +79,11 @@ class WaitForCallbackQuery:
                 chat_id
             )
         )
-        waiter = dict(future=future, filters=filters, update_type=types.CallbackQuery)
+        waiter = dict(
+            future=future,
+            filters=filters,
+            filters_evaluator=compile_filter(filters) if callable(filters) else None,
+            update_type=types.CallbackQuery
+        )
         conversation_handler.waiters[chat_id] = waiter
         return await asyncio.wait_for(future, timeout=timeout)
@@ -23,7 +23,7 @@ from typing import Union
 from functools import partial
 
 from pyrogram import types
-from pyrogram.filters import Filter
+from pyrogram.filters import Filter, compile_filter
 
 class WaitForMessage:
     async def wait_for_message(
@@ -78,6 +78,11 @@ class WaitForMessage:
                 chat_id
             )
         )
-        waiter = dict(future=future, filters=filters, update_type=types.Message)
+        waiter = dict(
+            future=future,
+            filters=filters,
+            filters_evaluator=compile_filter(filters) if callable(filters) else None,
+            update_type=types.Message
+        )
         conversation_handler.waiters[chat_id] = waiter
         return await asyncio.wait_for(future, timeout=timeout)
\ No newline at end of file
@@ -39,4 +39,4 @@ class RemoveErrorHandler:
             if handler.check_remove(exception)
         ]
         for handler in to_remove:
-            self.dispatcher.error_handlers.remove(handler)
+            self.dispatcher.remove_handler(handler, 0)
@@ -0,0 +1,157 @@
+#  Pyrofork - Telegram MTProto API Client Library for Python
+#  Copyright (C) 2022-present Mayuri-Chan <https://github.com/Mayuri-Chan>
+#
+#  This file is part of Pyrofork.
+#
+#  Pyrofork is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Pyrofork is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with Pyrofork.  If not, see <http://www.gnu.org/licenses/>.
+import asyncio
+import logging
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+import pyrogram
+from pyrogram import types
+
+log = logging.getLogger(__name__)
+
+
+class ReplyBatch:
+    def __init__(self):
+        # message id -> ((replied chat id, replied message id), future)
+        self.requests: Dict[int, Tuple[Tuple[int, Optional[int]], asyncio.Future]] = {}
+
+
+class ReplyLoader:
+    """Batches the replied-message lookups that :meth:`~pyrogram.types.Message._parse` makes on cache misses.
+
+    Updates that arrive together are parsed concurrently, and each one replying to a message that isn't cached used
+    to cost a ``get_messages`` call of its own. Lookups made during the same event loop tick are grouped by chat
+    and reply depth and fetched with one ``messages.GetMessages`` or ``channels.GetMessages`` call per
+    :attr:`BATCH_SIZE` messages; each caller then gets its own replied message back, matched by chat and id.
+    Lookups that can't be matched that way are fetched one by one, so batching never changes what a caller gets.
+    """
+
+    BATCH_SIZE = 100
+
+    def __init__(self, client: "pyrogram.Client"):
+        self.client = client
+
+        self.batches: Dict[Tuple[int, int], ReplyBatch] = {}
+        self.tasks = set()
+
+        self.stats = Counter()
+
+    async def load(
+        self,
+        chat_id: int,
+        message_id: int,
+        reply_to_message_id: Optional[int],
+        replies: int = 0,
+        reply_to_chat_id: Optional[int] = None
+    ) -> Optional["types.Message"]:
+        """Get the message ``message_id`` replies to, which is expected to be ``reply_to_message_id`` of
+        ``reply_to_chat_id`` (the same chat when None)."""
+        key = (chat_id, replies)
+        batch = self.batches.get(key)
+
+        if batch is None:
+            batch = self.batches[key] = ReplyBatch()
+
+            task = asyncio.create_task(self.run(key, batch))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+        request = batch.requests.get(message_id)
+
+        if request is None:
+            request = batch.requests[message_id] = (
+                (reply_to_chat_id or chat_id, reply_to_message_id),
+                asyncio.get_running_loop().create_future()
+            )
+
+        self.stats["requests"] += 1
+
+        return await asyncio.shield(request[1])
+
+    async def run(self, key: Tuple[int, int], batch: ReplyBatch):
+        # Let the other parses scheduled for this tick join the batch
+        await asyncio.sleep(0)
+
+        # Lookups made from now on start a new batch
+        del self.batches[key]
+
+        chat_id, replies = key
+        # Lookups without an expected id can't be told apart in a batch
+        message_ids = [i for i, (expected, _) in batch.requests.items() if expected[1] is not None]
+        single = [i for i, (expected, _) in batch.requests.items() if expected[1] is None]
+
+        for i in range(0, len(message_ids), self.BATCH_SIZE):
+            chunk = message_ids[i:i + self.BATCH_SIZE]
+
+            if len(chunk) == 1:
+                single.extend(chunk)
+                continue
+
+            self.stats["fetches"] += 1
+            self.stats["max_batch_size"] = max(self.stats["max_batch_size"], len(chunk))
+
+            try:
+                messages = await self.client.get_messages(
+                    chat_id,
+                    reply_to_message_ids=chunk,
+                    replies=replies
+                )
+                # Replies come back in no particular order and may belong to other chats, match them by both
+                by_key = {(m.chat.id, m.id): m for m in messages if not m.empty}
+            except Exception as e:
+                for message_id in chunk:
+                    batch.requests[message_id][1].set_exception(e)
+            else:
+                for message_id in chunk:
+                    expected, future = batch.requests[message_id]
+                    message = by_key.get(expected)
+
+                    if message is None:
+                        single.append(message_id)
+                    else:
+                        future.set_result(message)
+
+        await asyncio.gather(*(self.fetch(chat_id, replies, i, batch.requests[i][1]) for i in single))
+
+    async def fetch(self, chat_id: int, replies: int, message_id: int, future: asyncio.Future):
+        self.stats["fetches"] += 1
+        self.stats["max_batch_size"] = max(self.stats["max_batch_size"], 1)
+
+        try:
+            message = await self.client.get_messages(
+                chat_id,
+                reply_to_message_ids=message_id,
+                replies=replies
+            )
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            future.set_result(message if message and not message.empty else None)
+
+    async def stop(self):
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    def get_stats(self) -> dict:
+        return {
+            "requests": self.stats["requests"],
+            "fetches": self.stats["fetches"],
+            "saved": self.stats["requests"] - self.stats["fetches"],
+            "max_batch_size": self.stats["max_batch_size"],
+            "mean_batch_size": self.stats["requests"] / self.stats["fetches"] if self.stats["fetches"] else 0.0
+        }
@@ -27,6 +27,14 @@ except Exception:
 else:
     MONGO_AVAIL = True
     from .mongo_storage import MongoStorage
+REDIS_AVAIL = False
+try:
+    import redis
+except Exception:
+    pass
+else:
+    REDIS_AVAIL = True
+    from .redis_storage import RedisStorage
 from .storage import Storage
 
 __all__ = [
@@ -36,3 +44,5 @@ __all__ = [
 ]
 if MONGO_AVAIL:
     __all__.append("MongoStorage")
+if REDIS_AVAIL:
+    __all__.append("RedisStorage")
@@ -17,12 +17,15 @@
 #  You should have received a copy of the GNU Lesser General Public License
 #  along with Pyrofork.  If not, see <http://www.gnu.org/licenses/>.
 
+import asyncio
 import logging
 import os
 import sqlite3
+import time
 from pathlib import Path
+from typing import Optional
 
-from .sqlite_storage import SQLiteStorage
+from .sqlite_storage import SQLiteStorage, UNAME_SCHEMA
 
 log = logging.getLogger(__name__)
 
@@ -39,13 +42,46 @@ CREATE TABLE update_state
 """
 
 
+MAINTENANCE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS maintenance
+(
+    id          INTEGER PRIMARY KEY CHECK (id = 0),
+    vacuumed_on INTEGER NOT NULL
+);
+"""
+
+
 class FileStorage(SQLiteStorage):
+    """Session stored in a SQLite file.
+
+    Opening a session doesn't rewrite it: the file is switched to WAL journaling and only compacted with ``VACUUM``
+    when :meth:`maintain` finds that enough of it is free pages (*vacuum_free_ratio*) or that the last compaction
+    is older than *vacuum_interval* seconds. :meth:`open` runs that check in the background, :meth:`vacuum` compacts
+    on demand. Pass None to disable a trigger.
+    """
+
     FILE_EXTENSION = ".session"
 
-    def __init__(self, name: str, workdir: Path):
+    PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA cache_size=-8192"
+    )
+
+    def __init__(
+        self,
+        name: str,
+        workdir: Path,
+        vacuum_free_ratio: Optional[float] = 0.25,
+        vacuum_interval: Optional[int] = None
+    ):
         super().__init__(name)
 
         self.database = workdir / (self.name + self.FILE_EXTENSION)
+        self.vacuum_free_ratio = vacuum_free_ratio
+        self.vacuum_interval = vacuum_interval
+        self.maintenance_task = None
 
     def update(self):
         version = self.version()
@@ -68,21 +104,97 @@ class FileStorage(SQLiteStorage):
 
             version += 1
 
+        with self.conn:
+            # Sessions created before the usernames table existed
+            self.conn.executescript(UNAME_SCHEMA)
+
+        if version == 4:
+            with self.conn:
+                # last_update_on is set by the writes themselves now
+                self.conn.execute("DROP TRIGGER IF EXISTS trg_peers_last_update_on")
+                self.conn.execute("DROP TRIGGER IF EXISTS trg_usernames_last_update_on")
+                self.conn.execute("CREATE INDEX IF NOT EXISTS idx_peers_last_update_on ON peers (last_update_on)")
+
+            version += 1
+
         self.version(version)
 
-    async def open(self):
+    def connect(self):
         path = self.database
         file_exists = path.is_file()
 
         self.conn = sqlite3.connect(str(path), timeout=1, check_same_thread=False)
 
+        for pragma in self.PRAGMAS:
+            self.conn.execute(pragma)
+
         if not file_exists:
             self.create()
         else:
             self.update()
 
         with self.conn:
-            self.conn.execute("VACUUM")
+            self.conn.executescript(MAINTENANCE_SCHEMA)
+            self.conn.execute(
+                "INSERT OR IGNORE INTO maintenance (id, vacuumed_on) VALUES (0, ?)",
+                (int(time.time()),)
+            )
+
+        # WAL lets the read-only connection below see committed data while the writer keeps working
+        self.read_conn = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True, timeout=1, check_same_thread=False)
+
+    async def open(self):
+        await self.run(self.connect)
+
+        self.maintenance_task = asyncio.create_task(self.maintain())
+
+    async def close(self):
+        if self.maintenance_task is not None:
+            await self.maintenance_task
+            self.maintenance_task = None
+
+        await self.run(self.conn.execute, "PRAGMA wal_checkpoint(TRUNCATE)")
+        await super().close()
+
+    def needs_vacuum(self) -> bool:
+        if self.vacuum_free_ratio is not None:
+            page_count = self.conn.execute("PRAGMA page_count").fetchone()[0]
+            freelist_count = self.conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+            if page_count and freelist_count / page_count >= self.vacuum_free_ratio:
+                return True
+
+        if self.vacuum_interval is not None:
+            vacuumed_on = self.conn.execute("SELECT vacuumed_on FROM maintenance").fetchone()[0]
+
+            if time.time() - vacuumed_on >= self.vacuum_interval:
+                return True
+
+        return False
+
+    def vacuum_now(self):
+        self.conn.execute("VACUUM")
+
+        with self.conn:
+            self.conn.execute("UPDATE maintenance SET vacuumed_on = ?", (int(time.time()),))
+
+    async def vacuum(self):
+        """Compact the session file."""
+        await self.run(self.vacuum_now)
+
+    async def maintain(self) -> bool:
+        """Compact the session file if one of the triggers is met. Returns True if it was compacted."""
+        try:
+            if not await self.run(self.needs_vacuum):
+                return False
+
+            log.info("Compacting %s", self.database)
+            await self.vacuum()
+        except Exception as e:
+            log.exception(e)
+            return False
+
+        return True
 
     async def delete(self):
         os.remove(self.database)
@@ -33,10 +33,13 @@ class MemoryStorage(SQLiteStorage):
 
         self.session_string = session_string
 
-    async def open(self):
+    def connect(self):
         self.conn = sqlite3.connect(":memory:", check_same_thread=False)
         self.create()
 
+    async def open(self):
+        await self.run(self.connect)
+
         if self.session_string:
             # Old format
             if len(self.session_string) in [self.SESSION_STRING_SIZE, self.SESSION_STRING_SIZE_64]:
@@ -0,0 +1,363 @@
+#  Pyrofork - Telegram MTProto API Client Library for Python
+#  Copyright (C) 2022-present Mayuri-Chan <https://github.com/Mayuri-Chan>
+#
+#  This file is part of Pyrofork.
+#
+#  Pyrofork is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Pyrofork is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with Pyrofork.  If not, see <http://www.gnu.org/licenses/>.
+import asyncio
+import logging
+import sqlite3
+import time
+from collections import Counter
+from concurrent.futures.thread import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import pyrogram
+from pyrogram import raw, types, utils
+from pyrogram.raw.core import TLObject
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages
+(
+    chat_id    INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    data       BLOB    NOT NULL,
+    stored_on  INTEGER NOT NULL,
+    UNIQUE (chat_id, message_id)
+);
+"""
+
+
+class MessageStore:
+    """Second-level message cache, persisted to a local SQLite database.
+
+    Each entry is the raw message serialized as TL bytes, wrapped in a ``messages.Messages`` together with the users
+    and chats it references, so it can be parsed again on demand without any request. Entries survive restarts and
+    serve the lookups that miss :attr:`~pyrogram.Client.message_cache`.
+
+    Writes are queued and flushed in batches on a dedicated thread. Once the live data exceeds *max_size* bytes the
+    least recently written entries are evicted. The database is memory-mapped up to that size, so reads of hot
+    entries don't copy through the page cache twice.
+
+    Entries older than *max_age* seconds are treated as missing, edits made while the client was offline never reach
+    the store. Defaults to :attr:`MAX_AGE` when None.
+    """
+
+    FLUSH_INTERVAL = 1
+    MAX_PENDING = 1000
+    EVICT_BATCH = 100
+    MAX_AGE = 86400
+
+    def __init__(self, client: "pyrogram.Client", path: Path, max_size: int, max_age: Optional[float] = None):
+        self.client = client
+        self.path = path
+        self.max_size = max_size
+        self.max_age = self.MAX_AGE if max_age is None else max_age
+
+        self.conn = None  # type: sqlite3.Connection
+        self.executor = None  # type: ThreadPoolExecutor
+
+        # (chat_id, message_id) -> (serialized entry, write time)
+        self.pending = {}
+        # (chat_id or None, message ids) waiting to be deleted, None stands for any chat that is not a channel
+        self.deleted = []
+        # Keys being parsed from the store, which must not be written back
+        self.loading = set()
+
+        self.stats = Counter()
+        self.running = False
+        self.flush_task = None
+        self.flush_event = asyncio.Event()
+
+    @staticmethod
+    def get_peer_ids(message: "raw.base.Message") -> Tuple[set, set]:
+        """Raw ids of the users and chats needed to parse ``message`` again."""
+        peers = [
+            getattr(message, "from_id", None),
+            getattr(message, "peer_id", None),
+            getattr(message, "saved_peer_id", None),
+            getattr(getattr(message, "fwd_from", None), "from_id", None),
+            getattr(getattr(message, "reply_to", None), "reply_to_peer_id", None)
+        ]
+        user_ids = set()
+        chat_ids = set()
+
+        for peer in peers:
+            if isinstance(peer, raw.types.PeerUser):
+                user_ids.add(peer.user_id)
+            elif peer is not None:
+                chat_ids.add(utils.get_raw_peer_id(peer))
+
+        if getattr(message, "via_bot_id", None):
+            user_ids.add(message.via_bot_id)
+
+        action = getattr(message, "action", None)
+        user_ids.update(getattr(action, "users", None) or ())
+
+        if getattr(action, "user_id", None):
+            user_ids.add(action.user_id)
+
+        return user_ids, chat_ids
+
+    def connect(self):
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(f"PRAGMA mmap_size={int(self.max_size)}")
+
+        # Stores written before entries had a write time can't be aged out, they are only a cache
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(messages)")]
+
+        if columns and "stored_on" not in columns:
+            self.conn.execute("DROP TABLE messages")
+
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    async def run(self, func: Callable, *args) -> Any:
+        """Run ``func`` on the store thread, opening the database first if needed."""
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(1, thread_name_prefix="MessageStore")
+
+        loop = asyncio.get_running_loop()
+
+        if self.conn is None:
+            await loop.run_in_executor(self.executor, self.connect)
+
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    def put(
+        self,
+        message: "raw.base.Message",
+        users: Dict[int, "raw.types.User"],
+        chats: Dict[int, "raw.types.Chat"]
+    ):
+        """Queue ``message`` to be stored; nothing is written until the next flush."""
+        if isinstance(message, raw.types.MessageEmpty) or message.peer_id is None:
+            return
+
+        key = (utils.get_peer_id(message.peer_id), message.id)
+
+        if key in self.loading:
+            return
+
+        user_ids, chat_ids = self.get_peer_ids(message)
+
+        self.pending[key] = (
+            raw.types.messages.Messages(
+                messages=[message],
+                chats=[chats[i] for i in chat_ids if i in chats],
+                users=[users[i] for i in user_ids if i in users],
+                topics=[]
+            ).write(),
+            int(time.time())
+        )
+
+        if len(self.pending) >= self.MAX_PENDING:
+            self.flush_event.set()
+
+    async def get(self, chat_id: int, message_id: int) -> Optional["types.Message"]:
+        key = (chat_id, message_id)
+        row = self.pending.get(key)
+
+        if row is None:
+            row = await self.run(
+                lambda: self.conn.execute(
+                    "SELECT data, stored_on FROM messages WHERE chat_id = ? AND message_id = ?",
+                    key
+                ).fetchone()
+            )
+
+        if row is None:
+            self.stats["misses"] += 1
+            return None
+
+        data, stored_on = row
+
+        if time.time() - stored_on > self.max_age:
+            self.stats["misses"] += 1
+            self.stats["expirations"] += 1
+            return None
+
+        self.stats["hits"] += 1
+        r = TLObject.read(BytesIO(data))
+
+        self.loading.add(key)
+
+        try:
+            return await types.Message._parse(
+                self.client,
+                r.messages[0],
+                {u.id: u for u in r.users},
+                {c.id: c for c in r.chats},
+                replies=0,
+                fetch_relations=False
+            )
+        finally:
+            self.loading.discard(key)
+
+    def invalidate(self, chat_id: Optional[int], message_ids: Iterable[int]):
+        """Forget the given messages; a None ``chat_id`` stands for any chat that is not a channel."""
+        message_ids = list(message_ids)
+
+        for message_id in message_ids:
+            if chat_id is None:
+                keys = [key for key in self.pending if key[1] == message_id and key[0] > utils.MAX_CHANNEL_ID]
+            else:
+                keys = [(chat_id, message_id)]
+
+            for key in keys:
+                self.pending.pop(key, None)
+
+        self.deleted.append((chat_id, message_ids))
+        self.stats["invalidations"] += len(message_ids)
+
+    def invalidate_update(self, update: "raw.base.Update"):
+        """Forget the messages an edit or delete update makes stale."""
+        if isinstance(update, (raw.types.UpdateEditMessage, raw.types.UpdateEditChannelMessage)):
+            message = update.message
+
+            if not isinstance(message, raw.types.MessageEmpty) and message.peer_id is not None:
+                self.invalidate(utils.get_peer_id(message.peer_id), [message.id])
+        elif isinstance(update, raw.types.UpdateDeleteChannelMessages):
+            self.invalidate(utils.get_channel_id(update.channel_id), update.messages)
+        elif isinstance(update, raw.types.UpdateDeleteMessages):
+            self.invalidate(None, update.messages)
+
+    def write(
+        self,
+        deleted: List[Tuple[Optional[int], List[int]]],
+        rows: Dict[Tuple[int, int], Tuple[bytes, int]]
+    ) -> int:
+        # Deletions were queued before the pending rows that replaced them, so they go first
+        for chat_id, message_ids in deleted:
+            if chat_id is None:
+                self.conn.executemany(
+                    "DELETE FROM messages WHERE message_id = ? AND chat_id > ?",
+                    [(message_id, utils.MAX_CHANNEL_ID) for message_id in message_ids]
+                )
+            else:
+                self.conn.executemany(
+                    "DELETE FROM messages WHERE chat_id = ? AND message_id = ?",
+                    [(chat_id, message_id) for message_id in message_ids]
+                )
+
+        # REPLACE inserts a new rowid, so rowid order is write order
+        self.conn.executemany(
+            "REPLACE INTO messages (chat_id, message_id, data, stored_on) VALUES (?, ?, ?, ?)",
+            [(chat_id, message_id, data, stored_on) for (chat_id, message_id), (data, stored_on) in rows.items()]
+        )
+
+        evicted = 0
+
+        # Rowid order is write order, so expired entries are always at the front and only the oldest batch is read
+        while True:
+            deleted_rows = self.conn.execute(
+                "DELETE FROM messages WHERE rowid IN (SELECT rowid FROM "
+                "(SELECT rowid, stored_on FROM messages ORDER BY rowid LIMIT ?) WHERE stored_on < ?)",
+                (self.EVICT_BATCH, int(time.time() - self.max_age))
+            ).rowcount
+
+            if not deleted_rows:
+                break
+
+            evicted += deleted_rows
+
+        while self.get_size() > self.max_size:
+            deleted_rows = self.conn.execute(
+                "DELETE FROM messages WHERE rowid IN (SELECT rowid FROM messages ORDER BY rowid LIMIT ?)",
+                (self.EVICT_BATCH,)
+            ).rowcount
+
+            if not deleted_rows:
+                break
+
+            evicted += deleted_rows
+
+        self.conn.commit()
+
+        return evicted
+
+    def get_size(self) -> int:
+        """Bytes taken by live pages; pages freed by deletions are reused and don't count."""
+        page_count = self.conn.execute("PRAGMA page_count").fetchone()[0]
+        freelist_count = self.conn.execute("PRAGMA freelist_count").fetchone()[0]
+        page_size = self.conn.execute("PRAGMA page_size").fetchone()[0]
+
+        return (page_count - freelist_count) * page_size
+
+    async def flush(self):
+        if not self.pending and not self.deleted:
+            return
+
+        deleted, self.deleted = self.deleted, []
+        rows, self.pending = self.pending, {}
+
+        self.stats["evictions"] += await self.run(self.write, deleted, rows)
+        self.stats["writes"] += len(rows)
+
+    async def flush_worker(self):
+        while self.running:
+            try:
+                await asyncio.wait_for(self.flush_event.wait(), self.FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+            self.flush_event.clear()
+
+            try:
+                await self.flush()
+            except Exception as e:
+                log.exception(e)
+
+    def start(self):
+        if self.flush_task is None:
+            self.running = True
+            self.flush_event.clear()
+            self.flush_task = asyncio.create_task(self.flush_worker())
+
+    async def stop(self):
+        if self.flush_task is not None:
+            self.running = False
+            self.flush_event.set()
+            await self.flush_task
+            self.flush_task = None
+
+        await self.flush()
+
+        if self.conn is not None:
+            await self.run(self.conn.close)
+            self.conn = None
+
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def get_stats(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+
+        return {
+            "pending": len(self.pending),
+            "hits": self.stats["hits"],
+            "misses": self.stats["misses"],
+            "writes": self.stats["writes"],
+            "evictions": self.stats["evictions"],
+            "invalidations": self.stats["invalidations"],
+            "expirations": self.stats["expirations"],
+            "hit_rate": self.stats["hits"] / lookups if lookups else 0.0
+        }
@@ -18,13 +18,12 @@
 #  along with Pyrofork.  If not, see <http://www.gnu.org/licenses/>.
 
 import asyncio
-import inspect
 import time
-from typing import List, Tuple, Any
+from typing import List, Optional, Tuple, Any
 
 from .dummy_client import DummyMongoClient
-from pymongo import MongoClient, UpdateOne, DeleteMany
-from pyrogram.storage.storage import Storage
+from pymongo import MongoClient, UpdateOne
+from pyrogram.storage.storage import SessionData, Storage
 from pyrogram.storage.sqlite_storage import get_input_peer
 
 
@@ -78,6 +77,7 @@ class MongoStorage(Storage):
         self._usernames = database['usernames']
         self._states = database['update_state']
         self._remove_peers = remove_peers
+        self.session = None
 
     async def open(self):
         """
@@ -90,6 +90,9 @@ class MongoStorage(Storage):
         user_id   INTEGER,
         is_bot    INTEGER
         """
+        self.session = None
+        # Used by prune_peers to find the least recently updated peers
+        await self._peer.create_index('last_update_on')
         if await self._session.find_one({'_id': 0}, {}):
             return
         await self._session.insert_one(
@@ -113,6 +116,7 @@ class MongoStorage(Storage):
         pass
 
     async def delete(self):
+        self.session = None
         try:
             await self._session.delete_one({'_id': 0})
             if self._remove_peers:
@@ -123,32 +127,31 @@ class MongoStorage(Storage):
     async def update_peers(self, peers: List[Tuple[int, int, str, str, str]]):
         """(id, access_hash, type, username, phone_number)"""
         s = int(time.time())
+        # One upsert per peer, the latest row wins
+        peers = {i[0]: i for i in peers}
         bulk = [
             UpdateOne(
                 {'_id': i[0]},
                 {'$set': {
-                    'access_hash': i[1], 
-                    'type': i[2], 
-                    'username': i[3], 
+                    'access_hash': i[1],
+                    'type': i[2],
+                    'username': i[3],
                     'phone_number': i[4],
                     'last_update_on': s
                 }},
                 upsert=True
-            ) for i in peers
+            ) for i in peers.values()
         ]
         if not bulk:
             return
         await self._peer.bulk_write(
-            bulk
+            bulk,
+            ordered=False
         )
 
     async def update_usernames(self, usernames: List[Tuple[int, str]]):
         s = int(time.time())
-        bulk_delete = [
-            DeleteMany(
-                {'peer_id': i[0]}
-            ) for i in usernames
-        ]
+        usernames = {i[1]: i for i in usernames}
         bulk = [
             UpdateOne(
                 {'_id': i[1]},
@@ -157,17 +160,45 @@ class MongoStorage(Storage):
                     'last_update_on': s
                 }},
                 upsert=True
-            ) for i in usernames
+            ) for i in usernames.values()
         ]
         if not bulk:
             return
-        await self._usernames.bulk_write(
-            bulk_delete
+        await self._usernames.delete_many(
+            {'peer_id': {'$in': list({i[0] for i in usernames.values()})}}
         )
         await self._usernames.bulk_write(
-            bulk
+            bulk,
+            ordered=False
         )
 
+    async def prune_peers(
+        self,
+        max_peers: Optional[int] = None,
+        max_age: Optional[int] = None,
+        limit: int = 1000
+    ) -> List[int]:
+        deleted = []
+        if max_age is not None:
+            deleted += [
+                d['_id'] async for d in self._peer.find(
+                    {'last_update_on': {'$lt': int(time.time()) - max_age}}, {'_id': 1}
+                ).sort('last_update_on', 1).limit(limit)
+            ]
+        if max_peers is not None and len(deleted) < limit:
+            excess = await self._peer.count_documents({'_id': {'$nin': deleted}}) - max_peers
+            if excess > 0:
+                deleted += [
+                    d['_id'] async for d in self._peer.find(
+                        {'_id': {'$nin': deleted}}, {'_id': 1}
+                    ).sort('last_update_on', 1).limit(min(excess, limit - len(deleted)))
+                ]
+        if not deleted:
+            return deleted
+        await self._peer.delete_many({'_id': {'$in': deleted}})
+        await self._usernames.delete_many({'peer_id': {'$in': deleted}})
+        return deleted
+
     async def update_state(self, value: Tuple[int, int, int, int, int] = object):
         if value == object:
             states = [[state['_id'],state['pts'],state['qts'],state['date'],state['seq']] async for state in self._states.find()]
@@ -178,6 +209,21 @@ class MongoStorage(Storage):
             else:
                 await self._states.update_one({'_id': value[0]}, {'$set': {'pts': value[1], 'qts': value[2], 'date': value[3], 'seq': value[4]}}, upsert=True)
 
+    async def update_states(self, values: List[Tuple[int, int, int, int, int]]):
+        bulk = [
+            UpdateOne(
+                {'_id': value[0]},
+                {'$set': {'pts': value[1], 'qts': value[2], 'date': value[3], 'seq': value[4]}},
+                upsert=True
+            ) for value in values
+        ]
+        if not bulk:
+            return
+        await self._states.bulk_write(
+            bulk,
+            ordered=False
+        )
+
     async def remove_state(self, chat_id):
         await self._states.delete_one({'_id': chat_id})
 
@@ -221,37 +267,63 @@ class MongoStorage(Storage):
 
         return get_input_peer(r['_id'], r['access_hash'], r['type'])
 
-    async def _get(self):
-        attr = inspect.stack()[2].function
-        d = await self._session.find_one({'_id': 0}, {attr: 1})
-        if not d:
+    async def _get_session(self) -> Optional[SessionData]:
+        if self.session is None:
+            d = await self._session.find_one({'_id': 0})
+            if not d:
+                return None
+            self.session = SessionData(**{field: d.get(field) for field in SessionData.get_fields()})
+        return self.session
+
+    async def _get(self, field: str) -> Any:
+        session = await self._get_session()
+        if session is None:
             return
-        return d[attr]
-
-    async def _set(self, value: Any):
-        attr = inspect.stack()[2].function
-        await self._session.update_one({'_id': 0}, {'$set': {attr: value}}, upsert=True)
+        return getattr(session, field)
 
-    async def _accessor(self, value: Any = object):
-        return await self._get() if value == object else await self._set(value)
+    async def _set(self, field: str, value: Any):
+        await self._session.update_one({'_id': 0}, {'$set': {field: value}}, upsert=True)
+        if self.session is not None:
+            setattr(self.session, field, value)
 
     async def dc_id(self, value: int = object):
-        return await self._accessor(value)
+        if value == object:
+            return await self._get("dc_id")
+
+        await self._set("dc_id", value)
 
     async def api_id(self, value: int = object):
-        return await self._accessor(value)
+        if value == object:
+            return await self._get("api_id")
+
+        await self._set("api_id", value)
 
     async def test_mode(self, value: bool = object):
-        return await self._accessor(value)
+        if value == object:
+            return await self._get("test_mode")
+
+        await self._set("test_mode", value)
 
     async def auth_key(self, value: bytes = object):
-        return await self._accessor(value)
+        if value == object:
+            return await self._get("auth_key")
+
+        await self._set("auth_key", value)
 
     async def date(self, value: int = object):
-        return await self._accessor(value)
+        if value == object:
+            return await self._get("date")
+
+        await self._set("date", value)
 
     async def user_id(self, value: int = object):
-        return await self._accessor(value)
+        if value == object:
+            return await self._get("user_id")
+
+        await self._set("user_id", value)
 
     async def is_bot(self, value: bool = object):
-        return await self._accessor(value)
+        if value == object:
+            return await self._get("is_bot")
+
+        await self._set("is_bot", value)
@@ -0,0 +1,247 @@
+#  Pyrofork - Telegram MTProto API Client Library for Python
+#  Copyright (C) 2017-present Dan <https://github.com/delivrance>
+#  Copyright (C) 2022-present Mayuri-Chan <https://github.com/Mayuri-Chan>
+#
+#  This file is part of Pyrofork.
+#
+#  Pyrofork is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Pyrofork is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with Pyrofork.  If not, see <http://www.gnu.org/licenses/>.
+import asyncio
+import logging
+import time
+from collections import Counter, OrderedDict
+from typing import List, Tuple
+
+import pyrogram
+from .peer_cache import PeerCache
+from .sqlite_storage import get_input_peer
+
+log = logging.getLogger(__name__)
+
+
+class PeerBuffer:
+    """Write-behind buffer between :meth:`~pyrogram.Client.fetch_peers` and the storage.
+
+    The same active peers are seen again and again in updates and API responses. The buffer remembers what was
+    last written for each peer and only queues a write when the access hash, type, username or phone number
+    changed, or when the stored row is old enough to need its ``last_update_on`` refreshed. Queued rows are
+    written in a single batch when the flush interval elapses, when too many are pending, and on shutdown.
+
+    Lookups by id are answered from the pending rows first, lookups by username or phone number flush them, so
+    readers never observe a peer as missing because its write is still queued. Lookup results, including misses,
+    are kept in a :class:`~pyrogram.storage.peer_cache.PeerCache` that every queued write invalidates.
+    """
+
+    FLUSH_INTERVAL = 1
+    PRUNE_INTERVAL = 60
+    PRUNE_BATCH = 1000
+    MAX_PENDING = 1000
+    MAX_KNOWN = 100000
+    REFRESH_INTERVAL = 60 * 60
+
+    def __init__(self, client: "pyrogram.Client"):
+        self.client = client
+
+        # peer_id -> (row, usernames, written_at) of the last write, most recently seen last
+        self.known = OrderedDict()
+        self.pending = {}
+        self.pending_usernames = {}
+        self.flushing = {}
+        self.cache = PeerCache()
+
+        self.stats = Counter()
+        self.lock = asyncio.Lock()
+        self.flush_task = None
+        self.flush_event = asyncio.Event()
+
+    async def update(self, peers: List[Tuple[int, int, str, str, str]], usernames: List[Tuple[int, str]]):
+        now = time.monotonic()
+        peer_usernames = {}
+
+        for peer_id, username in usernames:
+            peer_usernames.setdefault(peer_id, []).append(username)
+
+        for peer in peers:
+            peer_id = peer[0]
+            row = peer[1:]
+            names = tuple(peer_usernames.get(peer_id, ()))
+            known = self.known.get(peer_id)
+
+            self.stats["received"] += 1
+
+            if known is not None:
+                self.known.move_to_end(peer_id)
+
+                if known[0] == row and known[1] == names and now - known[2] < self.REFRESH_INTERVAL:
+                    self.stats["skipped"] += 1
+                    continue
+
+            self.known[peer_id] = (row, names, now)
+            self.pending[peer_id] = peer
+            self.cache.invalidate(
+                peer_id,
+                [("username", username) for username in (peer[3],) + names if username]
+                + ([("phone", peer[4])] if peer[4] else [])
+            )
+
+            if names and (known is None or known[1] != names):
+                self.pending_usernames[peer_id] = names
+
+        while len(self.known) > self.MAX_KNOWN:
+            self.known.popitem(last=False)
+
+        if len(self.pending) >= self.MAX_PENDING:
+            await self.flush()
+
+    async def flush(self):
+        async with self.lock:
+            if not self.pending:
+                return
+
+            peers, self.pending = self.pending, {}
+            usernames, self.pending_usernames = self.pending_usernames, {}
+            self.flushing = peers
+
+            try:
+                await self.client.storage.update_peers(list(peers.values()))
+                await self.client.storage.update_usernames(
+                    [(peer_id, username) for peer_id, names in usernames.items() for username in names]
+                )
+            except Exception:
+                # Forget what was written so the peers are queued again the next time they are seen
+                for peer_id in peers:
+                    self.known.pop(peer_id, None)
+
+                raise
+            finally:
+                self.flushing = {}
+
+            self.stats["written"] += len(peers)
+            self.stats["flushes"] += 1
+
+    async def prune(self):
+        """Delete the peers over the client retention limits from the storage, one batch at a time."""
+        max_peers = getattr(self.client, "max_peers", None)
+        max_age = getattr(self.client, "max_peer_age", None)
+
+        if max_peers is None and max_age is None:
+            return
+
+        while True:
+            deleted = await self.client.storage.prune_peers(max_peers, max_age, self.PRUNE_BATCH)
+
+            for peer_id in deleted:
+                # Written again the next time they are seen
+                self.known.pop(peer_id, None)
+                self.cache.invalidate(peer_id)
+
+            self.stats["pruned"] += len(deleted)
+
+            if len(deleted) < self.PRUNE_BATCH or self.flush_event.is_set():
+                break
+
+            # Let other storage work through between batches
+            await asyncio.sleep(0.1)
+
+    async def flush_worker(self):
+        loop = asyncio.get_running_loop()
+        pruned_at = loop.time()
+
+        while True:
+            try:
+                await asyncio.wait_for(self.flush_event.wait(), self.FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+            try:
+                await self.flush()
+
+                if loop.time() - pruned_at >= self.PRUNE_INTERVAL and not self.flush_event.is_set():
+                    pruned_at = loop.time()
+                    await self.prune()
+            except Exception as e:
+                log.exception(e)
+
+            if self.flush_event.is_set():
+                break
+
+    def start(self):
+        if self.flush_task is None:
+            self.flush_event.clear()
+            self.flush_task = asyncio.create_task(self.flush_worker())
+
+    async def stop(self):
+        if self.flush_task is not None:
+            self.flush_event.set()
+            await self.flush_task
+            self.flush_task = None
+
+        await self.flush()
+
+    def clear(self):
+        self.known.clear()
+        self.pending.clear()
+        self.pending_usernames.clear()
+        self.stats.clear()
+        self.cache.clear()
+
+    async def lookup(self, key: tuple, getter, value, flush: bool = False):
+        found, peer = self.cache.get(key)
+
+        if found:
+            if peer is None:
+                raise KeyError(f"Peer not found: {value}")
+
+            return peer
+
+        if flush:
+            await self.flush()
+
+        try:
+            peer = await getter(value)
+        except KeyError:
+            self.cache.put_missing(key)
+            raise
+
+        self.cache.put(key, peer)
+
+        return peer
+
+    async def get_peer_by_id(self, peer_id: int):
+        peer = self.pending.get(peer_id) or self.flushing.get(peer_id)
+
+        if peer is not None:
+            return get_input_peer(*peer[:3])
+
+        return await self.lookup(("id", peer_id), self.client.storage.get_peer_by_id, peer_id)
+
+    async def get_peer_by_username(self, username: str):
+        return await self.lookup(
+            ("username", username), self.client.storage.get_peer_by_username, username, flush=True
+        )
+
+    async def get_peer_by_phone_number(self, phone_number: str):
+        return await self.lookup(
+            ("phone", phone_number), self.client.storage.get_peer_by_phone_number, phone_number, flush=True
+        )
+
+    def get_stats(self) -> dict:
+        return {
+            "received": self.stats["received"],
+            "skipped": self.stats["skipped"],
+            "written": self.stats["written"],
+            "flushes": self.stats["flushes"],
+            "pruned": self.stats["pruned"],
+            "pending": len(self.pending),
+            "known": len(self.known)
+        }
@@ -0,0 +1,137 @@
+#  Pyrofork - Telegram MTProto API Client Library for Python
+#  Copyright (C) 2017-present Dan <https://github.com/delivrance>
+#  Copyright (C) 2022-present Mayuri-Chan <https://github.com/Mayuri-Chan>
+#
+#  This file is part of Pyrofork.
+#
+#  Pyrofork is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Pyrofork is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with Pyrofork.  If not, see <http://www.gnu.org/licenses/>.
+import time
+from collections import Counter, OrderedDict
+from typing import Hashable, Iterable, Optional, Tuple
+
+from pyrogram import raw, utils
+
+
+class PeerCache:
+    """Bounded LRU of resolved peers, keyed by ``("id", peer_id)``, ``("username", username)`` or
+    ``("phone", phone_number)``.
+
+    Lookups that the storage couldn't answer are remembered as well, for *negative_ttl* seconds, so repeated
+    lookups of unknown peers don't reach the storage either. Entries found by username or phone number expire after
+    *ttl* seconds, as the storage itself only trusts them for a while; entries found by id stay until evicted or
+    invalidated by a peer update.
+    """
+
+    def __init__(self, capacity: int = 10000, ttl: float = 300, negative_ttl: float = 5):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+        # key -> (input peer or None, expires at or None, peer id or None)
+        self.entries = OrderedDict()
+        self.keys_by_peer = {}
+
+        self.stats = Counter()
+
+    @staticmethod
+    def get_peer_id(peer: "raw.base.InputPeer") -> Optional[int]:
+        if isinstance(peer, raw.types.InputPeerUser):
+            return peer.user_id
+
+        if isinstance(peer, raw.types.InputPeerChat):
+            return -peer.chat_id
+
+        if isinstance(peer, raw.types.InputPeerChannel):
+            return utils.get_channel_id(peer.channel_id)
+
+        return None
+
+    def get(self, key: Hashable) -> Tuple[bool, Optional["raw.base.InputPeer"]]:
+        """Return whether ``key`` is cached and its peer; a cached None means the peer is known to be missing."""
+        entry = self.entries.get(key)
+
+        if entry is None:
+            self.stats["misses"] += 1
+            return False, None
+
+        peer, expires_at, _ = entry
+
+        if expires_at is not None and expires_at <= time.monotonic():
+            self.discard(key)
+            self.stats["misses"] += 1
+            return False, None
+
+        self.entries.move_to_end(key)
+        self.stats["hits" if peer is not None else "negative_hits"] += 1
+
+        return True, peer
+
+    def put(self, key: Hashable, peer: "raw.base.InputPeer"):
+        peer_id = self.get_peer_id(peer)
+        expires_at = None if key[0] == "id" else time.monotonic() + self.ttl
+
+        self.store(key, (peer, expires_at, peer_id))
+
+        if peer_id is not None:
+            self.keys_by_peer.setdefault(peer_id, set()).add(key)
+
+    def put_missing(self, key: Hashable):
+        self.store(key, (None, time.monotonic() + self.negative_ttl, None))
+
+    def store(self, key: Hashable, entry: tuple):
+        self.discard(key)
+        self.entries[key] = entry
+
+        while len(self.entries) > self.capacity:
+            self.discard(next(iter(self.entries)))
+            self.stats["evictions"] += 1
+
+    def discard(self, key: Hashable):
+        entry = self.entries.pop(key, None)
+
+        if entry is not None and entry[2] is not None:
+            keys = self.keys_by_peer.get(entry[2])
+
+            if keys is not None:
+                keys.discard(key)
+
+                if not keys:
+                    del self.keys_by_peer[entry[2]]
+
+    def invalidate(self, peer_id: int, keys: Iterable[Hashable] = ()):
+        """Forget everything cached about ``peer_id``, plus ``keys`` that may now resolve to it."""
+        for key in list(self.keys_by_peer.get(peer_id, ())):
+            self.discard(key)
+
+        self.discard(("id", peer_id))
+
+        for key in keys:
+            self.discard(key)
+
+    def clear(self):
+        self.entries.clear()
+        self.keys_by_peer.clear()
+        self.stats.clear()
+
+    def get_stats(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["negative_hits"] + self.stats["misses"]
+
+        return {
+            "size": len(self.entries),
+            "hits": self.stats["hits"],
+            "negative_hits": self.stats["negative_hits"],
+            "misses": self.stats["misses"],
+            "evictions": self.stats["evictions"],
+            "hit_rate": (self.stats["hits"] + self.stats["negative_hits"]) / lookups if lookups else 0.0
+        }
@@ -0,0 +1,359 @@
+#  Pyrofork - Telegram MTProto API Client Library for Python
+#  Copyright (C) 2022-present Mayuri-Chan <https://github.com/Mayuri-Chan>
+#
+#  This file is part of Pyrofork.
+#
+#  Pyrofork is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Pyrofork is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with Pyrofork.  If not, see <http://www.gnu.org/licenses/>.
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from redis.exceptions import WatchError
+
+from pyrogram.storage.storage import SessionData, Storage
+from pyrogram.storage.sqlite_storage import get_input_peer
+
+
+class RedisStorage(Storage):
+    """
+    Initializes a new session stored in a Redis-compatible server.
+
+    Several processes can share the same session and peers. Peers are kept as hashes with username and phone number
+    keys pointing to them; writes are sent in pipelines, one round trip per batch.
+
+    Parameters:
+        - name (`str`):
+            The session name, used as prefix of every key.
+
+        - connection (`obj`):
+            ~redis.asyncio.Redis object. Responses must not be decoded (``decode_responses=False``).
+
+        - remove_peers (`bool`, *optional*):
+            Flag to remove the peers too when the session is deleted (on log out).
+
+    Example:
+        from redis.asyncio import Redis
+
+        conn = Redis.from_url("redis://...")
+        session = RedisStorage("my_session", connection=conn, remove_peers=True)
+    """
+    USERNAME_TTL = 8 * 60 * 60
+
+    def __init__(
+        self,
+        name: str,
+        connection: Any,
+        remove_peers: bool = False
+    ):
+        super().__init__(name=name)
+
+        self.redis = connection
+        self._remove_peers = remove_peers
+        self.session = None
+
+    def key(self, *parts) -> str:
+        return ":".join((self.name,) + tuple(str(part) for part in parts))
+
+    @staticmethod
+    def decode(value: Optional[bytes]) -> Optional[str]:
+        return value.decode() if value is not None else None
+
+    async def open(self):
+        self.session = None
+        # Same defaults as a new SQLite session
+        await self.redis.hsetnx(self.key('session'), 'dc_id', 2)
+        await self.redis.hsetnx(self.key('session'), 'date', 0)
+
+    async def save(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def delete(self):
+        self.session = None
+        await self.redis.delete(self.key('session'), self.key('update_state'))
+        if self._remove_peers:
+            keys = [key async for key in self.redis.scan_iter(match=self.key('*'))]
+            if keys:
+                await self.redis.delete(*keys)
+
+    async def update_peers(self, peers: List[Tuple[int, int, str, str, str]]):
+        """(id, access_hash, type, username, phone_number)"""
+        peers = {i[0]: i for i in peers}
+        if not peers:
+            return
+        s = int(time.time())
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for peer_id in peers:
+                pipe.hmget(self.key('peer', peer_id), 'username', 'phone_number')
+            previous = await pipe.execute()
+
+        # Secondary keys of changed usernames and phone numbers, which another peer may have taken since
+        stale = {}
+        for (peer_id, _, _, username, phone_number), (old_username, old_phone_number) in zip(peers.values(), previous):
+            old_username, old_phone_number = self.decode(old_username), self.decode(old_phone_number)
+            if old_username and old_username != username:
+                stale[self.key('username', old_username)] = peer_id
+            if old_phone_number and old_phone_number != phone_number:
+                stale[self.key('phone', old_phone_number)] = peer_id
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            owned = await self.watch_owned(pipe, stale)
+            pipe.multi()
+
+            # Drop them first, a peer in this batch may take them
+            if owned:
+                pipe.delete(*owned)
+
+            for peer_id, access_hash, peer_type, username, phone_number in peers.values():
+                key = self.key('peer', peer_id)
+                mapping = {'type': peer_type, 'last_update_on': s}
+                removed = []
+                # Redis can't store None, min peers come without an access hash
+                for field, value in (('access_hash', access_hash), ('username', username), ('phone_number', phone_number)):
+                    if value is None:
+                        removed.append(field)
+                    else:
+                        mapping[field] = value
+                pipe.hset(key, mapping=mapping)
+                if removed:
+                    pipe.hdel(key, *removed)
+                if username:
+                    pipe.set(self.key('username', username), peer_id, ex=self.USERNAME_TTL)
+                if phone_number:
+                    pipe.set(self.key('phone', phone_number), peer_id)
+            pipe.zadd(self.key('peers'), {peer_id: s for peer_id in peers})
+            await self.execute_watched(pipe, lambda: self.update_peers(list(peers.values())))
+
+    async def watch_owned(self, pipe, keys: Dict[str, int]) -> List[str]:
+        """WATCH ``keys`` and get those still pointing to the peer id they map to; the others belong to another peer.
+
+        Must be called before ``pipe.multi()``, so that the transaction fails if any of them changes meanwhile.
+        """
+        if not keys:
+            return []
+
+        await pipe.watch(*keys)
+        values = await pipe.mget(list(keys))
+
+        return [key for (key, peer_id), value in zip(keys.items(), values) if value and int(value) == peer_id]
+
+    @staticmethod
+    async def execute_watched(pipe, retry):
+        """Execute a transaction made with :meth:`watch_owned`, running it again from ``retry`` if it was raced."""
+        try:
+            await pipe.execute()
+        except WatchError:
+            await pipe.reset()
+            await retry()
+
+    async def update_usernames(self, usernames: List[Tuple[int, str]]):
+        by_peer: Dict[int, set] = {}
+        for peer_id, username in usernames:
+            by_peer.setdefault(peer_id, set()).add(username)
+        if not by_peer:
+            return
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for peer_id in by_peer:
+                pipe.smembers(self.key('usernames', peer_id))
+            previous = await pipe.execute()
+
+        stale = {
+            self.key('username', name): peer_id
+            for (peer_id, names), old_names in zip(by_peer.items(), previous)
+            for name in {self.decode(name) for name in old_names} - names
+        }
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            owned = await self.watch_owned(pipe, stale)
+            pipe.multi()
+            if owned:
+                pipe.delete(*owned)
+            for peer_id, names in by_peer.items():
+                pipe.delete(self.key('usernames', peer_id))
+                pipe.sadd(self.key('usernames', peer_id), *names)
+                for name in names:
+                    pipe.set(self.key('username', name), peer_id, ex=self.USERNAME_TTL)
+            await self.execute_watched(pipe, lambda: self.update_usernames(usernames))
+
+    async def prune_peers(
+        self,
+        max_peers: Optional[int] = None,
+        max_age: Optional[int] = None,
+        limit: int = 1000
+    ) -> List[int]:
+        deleted = []
+        if max_age is not None:
+            deleted += [
+                int(i) for i in await self.redis.zrangebyscore(
+                    self.key('peers'), '-inf', f'({int(time.time()) - max_age}', start=0, num=limit
+                )
+            ]
+        if max_peers is not None and len(deleted) < limit:
+            excess = await self.redis.zcard(self.key('peers')) - len(deleted) - max_peers
+            if excess > 0:
+                oldest = await self.redis.zrange(
+                    self.key('peers'), len(deleted), len(deleted) + min(excess, limit - len(deleted)) - 1
+                )
+                deleted += [int(i) for i in oldest]
+        if not deleted:
+            return deleted
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for peer_id in deleted:
+                pipe.hmget(self.key('peer', peer_id), 'username', 'phone_number')
+                pipe.smembers(self.key('usernames', peer_id))
+            previous = await pipe.execute()
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for i, peer_id in enumerate(deleted):
+                (username, phone_number), names = previous[2 * i], previous[2 * i + 1]
+                keys = [self.key('peer', peer_id), self.key('usernames', peer_id)]
+                keys += [self.key('username', self.decode(name)) for name in names]
+                if username:
+                    keys.append(self.key('username', self.decode(username)))
+                if phone_number:
+                    keys.append(self.key('phone', self.decode(phone_number)))
+                pipe.delete(*keys)
+            pipe.zrem(self.key('peers'), *deleted)
+            await pipe.execute()
+        return deleted
+
+    async def update_state(self, value: Tuple[int, int, int, int, int] = object):
+        if value == object:
+            states = await self.redis.hgetall(self.key('update_state'))
+            return [
+                (int(box_id),) + tuple(int(i) if i else None for i in state.decode().split(','))
+                for box_id, state in states.items()
+            ]
+        else:
+            if isinstance(value, int):
+                await self.redis.hdel(self.key('update_state'), value)
+            else:
+                await self.update_states([value])
+
+    async def update_states(self, values: List[Tuple[int, int, int, int, int]]):
+        if not values:
+            return
+        await self.redis.hset(
+            self.key('update_state'),
+            mapping={
+                value[0]: ','.join('' if i is None else str(i) for i in value[1:])
+                for value in values
+            }
+        )
+
+    async def remove_state(self, chat_id):
+        await self.redis.hdel(self.key('update_state'), chat_id)
+
+    async def get_input_peer(self, peer_id: Optional[bytes]):
+        if peer_id is None:
+            return None
+        access_hash, peer_type = await self.redis.hmget(self.key('peer', int(peer_id)), 'access_hash', 'type')
+        if peer_type is None:
+            return None
+        return get_input_peer(int(peer_id), None if access_hash is None else int(access_hash), peer_type.decode())
+
+    async def get_peer_by_id(self, peer_id: int):
+        if not isinstance(peer_id, int):
+            raise KeyError(f"ID not found: {peer_id}")
+        r = await self.get_input_peer(str(peer_id).encode())
+        if r is None:
+            raise KeyError(f"ID not found: {peer_id}")
+        return r
+
+    async def get_peer_by_username(self, username: str):
+        # Username keys expire after USERNAME_TTL, like the username rows of the other storages
+        r = await self.get_input_peer(await self.redis.get(self.key('username', username)))
+        if r is None:
+            raise KeyError(f"Username not found: {username}")
+        return r
+
+    async def get_peer_by_phone_number(self, phone_number: str):
+        r = await self.get_input_peer(await self.redis.get(self.key('phone', phone_number)))
+        if r is None:
+            raise KeyError(f"Phone number not found: {phone_number}")
+        return r
+
+    @staticmethod
+    def parse_session_field(field: str, value: Optional[bytes]) -> Any:
+        if value is None or field == 'auth_key':
+            return value
+        if field in ('test_mode', 'is_bot'):
+            return bool(int(value))
+        return int(value)
+
+    async def _get_session(self) -> SessionData:
+        if self.session is None:
+            d = await self.redis.hgetall(self.key('session'))
+            self.session = SessionData(**{
+                field: self.parse_session_field(field, d.get(field.encode()))
+                for field in SessionData.get_fields()
+            })
+        return self.session
+
+    async def _get(self, field: str) -> Any:
+        return getattr(await self._get_session(), field)
+
+    async def _set(self, field: str, value: Any):
+        if value is None:
+            await self.redis.hdel(self.key('session'), field)
+        else:
+            await self.redis.hset(self.key('session'), field, int(value) if isinstance(value, bool) else value)
+        if self.session is not None:
+            setattr(self.session, field, value)
+
+    async def dc_id(self, value: int = object):
+        if value == object:
+            return await self._get("dc_id")
+
+        await self._set("dc_id", value)
+
+    async def api_id(self, value: int = object):
+        if value == object:
+            return await self._get("api_id")
+
+        await self._set("api_id", value)
+
+    async def test_mode(self, value: bool = object):
+        if value == object:
+            return await self._get("test_mode")
+
+        await self._set("test_mode", value)
+
+    async def auth_key(self, value: bytes = object):
+        if value == object:
+            return await self._get("auth_key")
+
+        await self._set("auth_key", value)
+
+    async def date(self, value: int = object):
+        if value == object:
+            return await self._get("date")
+
+        await self._set("date", value)
+
+    async def user_id(self, value: int = object):
+        if value == object:
+            return await self._get("user_id")
+
+        await self._set("user_id", value)
+
+    async def is_bot(self, value: bool = object):
+        if value == object:
+            return await self._get("is_bot")
+
+        await self._set("is_bot", value)
@@ -17,13 +17,14 @@
 #  You should have received a copy of the GNU Lesser General Public License
 #  along with Pyrofork.  If not, see <http://www.gnu.org/licenses/>.
 
-import inspect
+import asyncio
 import sqlite3
 import time
-from typing import List, Tuple, Any
+from concurrent.futures.thread import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple
 
 from pyrogram import raw
-from .storage import Storage
+from .storage import SessionData, Storage
 from .. import utils
 
 # language=SQLite
@@ -66,15 +67,7 @@ CREATE TABLE version
 CREATE INDEX idx_peers_id ON peers (id);
 CREATE INDEX idx_peers_username ON peers (username);
 CREATE INDEX idx_peers_phone_number ON peers (phone_number);
-
-CREATE TRIGGER trg_peers_last_update_on
-    AFTER UPDATE
-    ON peers
-BEGIN
-    UPDATE peers
-    SET last_update_on = CAST(STRFTIME('%s', 'now') AS INTEGER)
-    WHERE id = NEW.id;
-END;
+CREATE INDEX idx_peers_last_update_on ON peers (last_update_on);
 """
 
 
@@ -86,14 +79,7 @@ CREATE TABLE IF NOT EXISTS usernames
     last_update_on INTEGER NOT NULL DEFAULT (CAST(STRFTIME('%s', 'now') AS INTEGER))
 );
 
-CREATE TRIGGER IF NOT EXISTS trg_usernames_last_update_on
-    AFTER UPDATE
-    ON usernames
-BEGIN
-    UPDATE usernames
-    SET last_update_on = CAST(STRFTIME('%s', 'now') AS INTEGER)
-    WHERE id = NEW.id;
-END;
+CREATE INDEX IF NOT EXISTS idx_usernames_peer_id ON usernames (peer_id);
 """
 
 
@@ -119,13 +105,50 @@ def get_input_peer(peer_id: int, access_hash: int, peer_type: str):
 
 
 class SQLiteStorage(Storage):
-    VERSION = 4
+    """Base class of the SQLite storages.
+
+    sqlite3 calls block, so none of them runs on the event loop: every statement that touches :attr:`conn` is
+    executed, one at a time, on a dedicated writer thread. Storages that can open the database a second time (see
+    :class:`~pyrogram.storage.FileStorage`) set :attr:`read_conn` to a read-only connection, and lookups are then
+    served from it on a reader thread so they don't queue behind writes.
+    """
+
+    VERSION = 5
     USERNAME_TTL = 8 * 60 * 60
 
     def __init__(self, name: str):
         super().__init__(name)
 
         self.conn = None  # type: sqlite3.Connection
+        self.read_conn = None  # type: sqlite3.Connection
+        self.session = None  # type: SessionData
+
+        self.writer = None  # type: ThreadPoolExecutor
+        self.reader = None  # type: ThreadPoolExecutor
+
+    async def run(self, func: Callable, *args) -> Any:
+        """Run ``func`` on the writer thread."""
+        if self.writer is None:
+            self.writer = ThreadPoolExecutor(1, thread_name_prefix="SQLiteStorageWriter")
+
+        return await asyncio.get_running_loop().run_in_executor(self.writer, func, *args)
+
+    async def read(self, query: str, params: tuple = ()) -> list:
+        """Fetch the rows of a SELECT, from the read-only connection if there is one."""
+        if self.read_conn is None:
+            return await self.run(lambda: self.conn.execute(query, params).fetchall())
+
+        if self.reader is None:
+            self.reader = ThreadPoolExecutor(1, thread_name_prefix="SQLiteStorageReader")
+
+        return await asyncio.get_running_loop().run_in_executor(
+            self.reader, lambda: self.read_conn.execute(query, params).fetchall()
+        )
+
+    async def read_one(self, query: str, params: tuple = ()) -> Optional[tuple]:
+        rows = await self.read(query, params)
+
+        return rows[0] if rows else None
 
     def create(self):
         with self.conn:
@@ -147,64 +170,137 @@ class SQLiteStorage(Storage):
 
     async def save(self):
         await self.date(int(time.time()))
-        self.conn.commit()
+        await self.run(self.conn.commit)
 
     async def close(self):
-        self.conn.close()
+        if self.read_conn is not None:
+            await asyncio.get_running_loop().run_in_executor(self.reader, self.read_conn.close)
+            self.read_conn = None
+
+        await self.run(self.conn.close)
+        self.session = None
+
+        for executor in (self.reader, self.writer):
+            if executor is not None:
+                executor.shutdown(wait=False)
+
+        self.reader = self.writer = None
 
     async def delete(self):
         raise NotImplementedError
 
     async def update_peers(self, peers: List[Tuple[int, int, str, str, str]]):
-        self.conn.executemany(
-            "REPLACE INTO peers (id, access_hash, type, username, phone_number)"
-            "VALUES (?, ?, ?, ?, ?)",
-            peers
-        )
+        now = int(time.time())
+
+        def update_peers():
+            with self.conn:
+                self.conn.executemany(
+                    "REPLACE INTO peers (id, access_hash, type, username, phone_number, last_update_on)"
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [peer + (now,) for peer in peers]
+                )
+
+        await self.run(update_peers)
 
     async def update_usernames(self, usernames: List[Tuple[int, str]]):
-        self.conn.executescript(UNAME_SCHEMA)
-        for user in usernames:
-            self.conn.execute(
-                "DELETE FROM usernames WHERE peer_id=?",
-                (user[0],)
-            )
-        self.conn.executemany(
-            "REPLACE INTO usernames (peer_id, id)"
-            "VALUES (?, ?)",
-            usernames
-        )
+        if not usernames:
+            return
+
+        def update_usernames():
+            with self.conn:
+                self.conn.executemany(
+                    "DELETE FROM usernames WHERE peer_id=?",
+                    {(user[0],) for user in usernames}
+                )
+                self.conn.executemany(
+                    "REPLACE INTO usernames (peer_id, id)"
+                    "VALUES (?, ?)",
+                    usernames
+                )
+
+        await self.run(update_usernames)
+
+    async def prune_peers(
+        self,
+        max_peers: Optional[int] = None,
+        max_age: Optional[int] = None,
+        limit: int = 1000
+    ) -> List[int]:
+        def prune_peers():
+            with self.conn:
+                deleted = []
+
+                if max_age is not None:
+                    deleted += [r[0] for r in self.conn.execute(
+                        "SELECT id FROM peers WHERE last_update_on < ? ORDER BY last_update_on LIMIT ?",
+                        (int(time.time()) - max_age, limit)
+                    )]
+
+                    self.conn.executemany("DELETE FROM peers WHERE id = ?", [(i,) for i in deleted])
+
+                if max_peers is not None and len(deleted) < limit:
+                    excess = self.conn.execute("SELECT COUNT(*) FROM peers").fetchone()[0] - max_peers
+
+                    if excess > 0:
+                        oldest = [r[0] for r in self.conn.execute(
+                            "SELECT id FROM peers ORDER BY last_update_on LIMIT ?",
+                            (min(excess, limit - len(deleted)),)
+                        )]
+
+                        self.conn.executemany("DELETE FROM peers WHERE id = ?", [(i,) for i in oldest])
+                        deleted += oldest
+
+                self.conn.executemany("DELETE FROM usernames WHERE peer_id = ?", [(i,) for i in deleted])
+
+                return deleted
+
+        return await self.run(prune_peers)
 
     async def update_state(self, value: Tuple[int, int, int, int, int] = object):
         if value == object:
-            return self.conn.execute(
+            return await self.read(
                 "SELECT id, pts, qts, date, seq FROM update_state"
-            ).fetchall()
+            )
         else:
+            def update_state():
+                with self.conn:
+                    if isinstance(value, int):
+                        self.conn.execute(
+                            "DELETE FROM update_state WHERE id = ?",
+                            (value,)
+                        )
+                    else:
+                        self.conn.execute(
+                            "REPLACE INTO update_state (id, pts, qts, date, seq)"
+                            "VALUES (?, ?, ?, ?, ?)",
+                            value
+                        )
+
+            await self.run(update_state)
+
+    async def update_states(self, values: List[Tuple[int, int, int, int, int]]):
+        def update_states():
             with self.conn:
-                if isinstance(value, int):
-                    self.conn.execute(
-                        "DELETE FROM update_state WHERE id = ?",
-                        (value,)
-                    )
-                else:
-                    self.conn.execute(
-                        "REPLACE INTO update_state (id, pts, qts, date, seq)"
-                        "VALUES (?, ?, ?, ?, ?)",
-                        value
-                    )
+                self.conn.executemany(
+                    "REPLACE INTO update_state (id, pts, qts, date, seq)"
+                    "VALUES (?, ?, ?, ?, ?)",
+                    values
+                )
+
+        await self.run(update_states)
 
     async def remove_state(self, chat_id):
-        self.conn.execute(
+        await self.run(
+            self.conn.execute,
             "DELETE FROM update_state WHERE id = ?",
             (chat_id,)
         )
 
     async def get_peer_by_id(self, peer_id: int):
-        r = self.conn.execute(
+        r = await self.read_one(
             "SELECT id, access_hash, type FROM peers WHERE id = ?",
             (peer_id,)
-        ).fetchone()
+        )
 
         if r is None:
             raise KeyError(f"ID not found: {peer_id}")
@@ -212,27 +308,27 @@ class SQLiteStorage(Storage):
         return get_input_peer(*r)
 
     async def get_peer_by_username(self, username: str):
-        r = self.conn.execute(
+        r = await self.read_one(
             "SELECT id, access_hash, type, last_update_on FROM peers WHERE username = ?"
             "ORDER BY last_update_on DESC",
             (username,)
-        ).fetchone()
+        )
 
         if r is None:
-            r2 = self.conn.execute(
+            r2 = await self.read_one(
                 "SELECT peer_id, last_update_on FROM usernames WHERE id = ?"
                 "ORDER BY last_update_on DESC",
                 (username,)
-            ).fetchone()
+            )
             if r2 is None:
                 raise KeyError(f"Username not found: {username}")
             if abs(time.time() - r2[1]) > self.USERNAME_TTL:
                 raise KeyError(f"Username expired: {username}")
-            r = r = self.conn.execute(
+            r = await self.read_one(
                 "SELECT id, access_hash, type, last_update_on FROM peers WHERE id = ?"
                 "ORDER BY last_update_on DESC",
                 (r2[0],)
-            ).fetchone()
+            )
             if r is None:
                 raise KeyError(f"Username not found: {username}")
 
@@ -242,55 +338,81 @@ class SQLiteStorage(Storage):
         return get_input_peer(*r[:3])
 
     async def get_peer_by_phone_number(self, phone_number: str):
-        r = self.conn.execute(
+        r = await self.read_one(
             "SELECT id, access_hash, type FROM peers WHERE phone_number = ?",
             (phone_number,)
-        ).fetchone()
+        )
 
         if r is None:
             raise KeyError(f"Phone number not found: {phone_number}")
 
         return get_input_peer(*r)
 
-    def _get(self):
-        attr = inspect.stack()[2].function
+    async def _get_session(self) -> SessionData:
+        if self.session is None:
+            self.session = SessionData(*await self.read_one(
+                f"SELECT {', '.join(SessionData.get_fields())} FROM sessions"
+            ))
 
-        return self.conn.execute(
-            f"SELECT {attr} FROM sessions"
-        ).fetchone()[0]
+        return self.session
 
-    def _set(self, value: Any):
-        attr = inspect.stack()[2].function
+    async def _get(self, field: str) -> Any:
+        return getattr(await self._get_session(), field)
 
-        with self.conn:
-            self.conn.execute(
-                f"UPDATE sessions SET {attr} = ?",
-                (value,)
-            )
+    async def _set(self, field: str, value: Any):
+        def set_value():
+            with self.conn:
+                self.conn.execute(
+                    f"UPDATE sessions SET {field} = ?",
+                    (value,)
+                )
+
+        await self.run(set_value)
 
-    def _accessor(self, value: Any = object):
-        return self._get() if value == object else self._set(value)
+        if self.session is not None:
+            setattr(self.session, field, value)
 
     async def dc_id(self, value: int = object):
-        return self._accessor(value)
+        if value == object:
+            return await self._get("dc_id")
+
+        await self._set("dc_id", value)
 
     async def api_id(self, value: int = object):
-        return self._accessor(value)
+        if value == object:
+            return await self._get("api_id")
+
+        await self._set("api_id", value)
 
     async def test_mode(self, value: bool = object):
-        return self._accessor(value)
+        if value == object:
+            return await self._get("test_mode")
+
+        await self._set("test_mode", value)
 
     async def auth_key(self, value: bytes = object):
-        return self._accessor(value)
+        if value == object:
+            return await self._get("auth_key")
+
+        await self._set("auth_key", value)
 
     async def date(self, value: int = object):
-        return self._accessor(value)
+        if value == object:
+            return await self._get("date")
+
+        await self._set("date", value)
 
     async def user_id(self, value: int = object):
-        return self._accessor(value)
+        if value == object:
+            return await self._get("user_id")
+
+        await self._set("user_id", value)
 
     async def is_bot(self, value: bool = object):
-        return self._accessor(value)
+        if value == object:
+            return await self._get("is_bot")
+
+        await self._set("is_bot", value)
 
     def version(self, value: int = object):
         if value == object:
@@ -0,0 +1,135 @@
+#  Pyrofork - Telegram MTProto API Client Library for Python
+#  Copyright (C) 2017-present Dan <https://github.com/delivrance>
+#  Copyright (C) 2022-present Mayuri-Chan <https://github.com/Mayuri-Chan>
+#
+#  This file is part of Pyrofork.
+#
+#  Pyrofork is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Pyrofork is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with Pyrofork.  If not, see <http://www.gnu.org/licenses/>.
+import asyncio
+import logging
+from collections import Counter
+from typing import Tuple
+
+import pyrogram
+
+log = logging.getLogger(__name__)
+
+
+class StateBuffer:
+    """Keeps the latest update state of each box in memory and checkpoints it to the storage.
+
+    :meth:`~pyrogram.Client.handle_updates` records a new pts for almost every update it receives. Instead of
+    committing each one, only the latest state per box (0 for the common box, the channel id otherwise) is kept and
+    written in a single batch every *interval* seconds, as soon as *threshold* states changed and on shutdown.
+    Gap recovery on the next start works from the last checkpoint, so at most *interval* seconds of updates are
+    fetched again after a crash. An interval of 0 writes every state as soon as it is recorded.
+    """
+
+    def __init__(self, client: "pyrogram.Client", interval: float = 1, threshold: int = 100):
+        self.client = client
+        self.interval = interval
+        self.threshold = threshold
+
+        self.states = {}
+        self.dirty = set()
+        self.removed = set()
+
+        self.stats = Counter()
+        self.lock = asyncio.Lock()
+        self.checkpoint_task = None
+        self.checkpoint_event = asyncio.Event()
+
+    async def update(self, value: Tuple[int, int, int, int, int]):
+        box_id = value[0]
+
+        self.states[box_id] = value
+        self.dirty.add(box_id)
+        self.removed.discard(box_id)
+        self.stats["updated"] += 1
+
+        if not self.interval or len(self.dirty) >= self.threshold:
+            await self.checkpoint()
+
+    async def remove(self, box_id: int):
+        self.states.pop(box_id, None)
+        self.dirty.discard(box_id)
+        self.removed.add(box_id)
+
+        if not self.interval:
+            await self.checkpoint()
+
+    async def checkpoint(self):
+        async with self.lock:
+            if not self.dirty and not self.removed:
+                return
+
+            dirty, self.dirty = self.dirty, set()
+            removed, self.removed = self.removed, set()
+
+            try:
+                for box_id in removed:
+                    await self.client.storage.update_state(box_id)
+
+                await self.client.storage.update_states([self.states[box_id] for box_id in dirty])
+            except Exception:
+                # Keep what could not be written for the next checkpoint
+                self.dirty |= {box_id for box_id in dirty if box_id in self.states}
+                self.removed |= {box_id for box_id in removed if box_id not in self.states}
+
+                raise
+
+            self.stats["written"] += len(dirty)
+            self.stats["checkpoints"] += 1
+
+    async def checkpoint_worker(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.checkpoint_event.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+            try:
+                await self.checkpoint()
+            except Exception as e:
+                log.exception(e)
+
+            if self.checkpoint_event.is_set():
+                break
+
+    def start(self):
+        if self.interval and self.checkpoint_task is None:
+            self.checkpoint_event.clear()
+            self.checkpoint_task = asyncio.create_task(self.checkpoint_worker())
+
+    async def stop(self):
+        if self.checkpoint_task is not None:
+            self.checkpoint_event.set()
+            await self.checkpoint_task
+            self.checkpoint_task = None
+
+        await self.checkpoint()
+
+    def clear(self):
+        self.states.clear()
+        self.dirty.clear()
+        self.removed.clear()
+        self.stats.clear()
+
+    def get_stats(self) -> dict:
+        return {
+            "updated": self.stats["updated"],
+            "written": self.stats["written"],
+            "checkpoints": self.stats["checkpoints"],
+            "pending": len(self.dirty) + len(self.removed)
+        }
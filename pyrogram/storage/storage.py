@@ -20,7 +20,24 @@
 import base64
 import struct
 from abc import abstractmethod
-from typing import List, Tuple
+from dataclasses import dataclass, fields
+from typing import List, Optional, Tuple
+
+
+@dataclass
+class SessionData:
+    """In-memory copy of the session row, loaded once by a storage and updated by its setters."""
+    dc_id: Optional[int] = None
+    api_id: Optional[int] = None
+    test_mode: Optional[bool] = None
+    auth_key: Optional[bytes] = None
+    date: Optional[int] = None
+    user_id: Optional[int] = None
+    is_bot: Optional[bool] = None
+
+    @classmethod
+    def get_fields(cls) -> Tuple[str, ...]:
+        return tuple(field.name for field in fields(cls))
 
 
 class Storage:
@@ -52,6 +69,27 @@ class Storage:
     async def update_usernames(self, usernames: List[Tuple[int, str]]):
         raise NotImplementedError
 
+    async def prune_peers(
+        self,
+        max_peers: Optional[int] = None,
+        max_age: Optional[int] = None,
+        limit: int = 1000
+    ) -> List[int]:
+        """Delete the least recently updated peers, along with their usernames.
+
+        Peers not updated for more than *max_age* seconds are deleted first, then the oldest ones above *max_peers*.
+        Storages without retention support keep every peer.
+
+        Parameters:
+            max_peers (``int``, *optional*): Number of peers to keep.
+            max_age (``int``, *optional*): Age in seconds after which a peer is deleted.
+            limit (``int``, *optional*): Maximum number of peers deleted by this call.
+
+        Returns:
+            ``List[int]``: The ids of the deleted peers.
+        """
+        return []
+
     @abstractmethod
     async def update_state(self, update_state: Tuple[int, int, int, int, int] = object):
         """Get or set the update state of the current session.
@@ -67,6 +105,18 @@ class Storage:
         """
         raise NotImplementedError
 
+    async def update_states(self, update_states: List[Tuple[int, int, int, int, int]]):
+        """Set the update state of many entities at once.
+
+        Storages can override this to write all the states in a single batch.
+
+        Parameters:
+            update_states (``List[Tuple[int, int, int, int, int]]``): A list of update state tuples, in the same
+                format accepted by :meth:`update_state`.
+        """
+        for update_state in update_states:
+            await self.update_state(update_state)
+
     async def get_peer_by_id(self, peer_id: int):
         raise NotImplementedError
 
@@ -724,7 +724,8 @@ class Message(Object, Update):
         topics: Dict[int, "raw.types.ForumTopic"] = None,
         is_scheduled: bool = False,
         business_connection_id: str = None,
-        replies: int = 1
+        replies: int = 1,
+        fetch_relations: bool = True
     ):
         if isinstance(message, raw.types.MessageEmpty):
             return Message(id=message.id, empty=True, client=client, raw=message)
@@ -974,11 +975,18 @@ class Message(Object, Update):
 
             if isinstance(action, raw.types.MessageActionPinMessage):
                 try:
-                    parsed_message.pinned_message = await client.get_messages(
-                        parsed_message.chat.id,
-                        reply_to_message_ids=message.id,
-                        replies=0
-                    )
+                    if message.reply_to:
+                        parsed_message.pinned_message = await client.get_cached_message(
+                            parsed_message.chat.id,
+                            message.reply_to.reply_to_msg_id
+                        )
+
+                    if parsed_message.pinned_message is None and fetch_relations:
+                        parsed_message.pinned_message = await client.reply_loader.load(
+                            parsed_message.chat.id,
+                            message.id,
+                            message.reply_to.reply_to_msg_id if message.reply_to else None
+                        )
 
                     parsed_message.service = enums.MessageServiceType.PINNED_MESSAGE
                 except MessageIdsEmpty:
@@ -989,11 +997,12 @@ class Message(Object, Update):
 
                 if message.reply_to and replies:
                     try:
-                        parsed_message.reply_to_message = await client.get_messages(
-                            parsed_message.chat.id,
-                            reply_to_message_ids=message.id,
-                            replies=0
-                        )
+                        if fetch_relations:
+                            parsed_message.reply_to_message = await client.get_messages(
+                                parsed_message.chat.id,
+                                reply_to_message_ids=message.id,
+                                replies=0
+                            )
 
                         parsed_message.service = enums.MessageServiceType.GAME_HIGH_SCORE
                     except MessageIdsEmpty:
@@ -1004,31 +1013,36 @@ class Message(Object, Update):
                 if action.incompleted:
                     parsed_message.todo_tasks_incompleted = types.TodoTasksIncompleted._parse(action)
                 parsed_message.service_type = enums.MessageServiceType.TODO_TASKS_COMPLETION
-                try:
-                    parsed_message.reply_to_message = await client.get_messages(
-                        parsed_message.chat.id,
-                        reply_to_message_ids=message.id,
-                        replies=0
-                    )
-                except MessageIdsEmpty:
-                    pass
+                if fetch_relations:
+                    try:
+                        parsed_message.reply_to_message = await client.get_messages(
+                            parsed_message.chat.id,
+                            reply_to_message_ids=message.id,
+                            replies=0
+                        )
+                    except MessageIdsEmpty:
+                        pass
                 parsed_message.reply_to_message_id = message.reply_to.reply_to_msg_id
 
             if isinstance(action, raw.types.MessageActionTodoAppendTasks):
                 parsed_message.todo_tasks_added = types.TodoTasksAdded._parse(client, action)
                 parsed_message.service = enums.MessageServiceType.TODO_TASKS_ADDED
-                try:
-                    parsed_message.reply_to_message = await client.get_messages(
-                        parsed_message.chat.id,
-                        reply_to_message_ids=message.id,
-                        replies=0
-                    )
-                except MessageIdsEmpty:
-                    pass
+                if fetch_relations:
+                    try:
+                        parsed_message.reply_to_message = await client.get_messages(
+                            parsed_message.chat.id,
+                            reply_to_message_ids=message.id,
+                            replies=0
+                        )
+                    except MessageIdsEmpty:
+                        pass
                 parsed_message.reply_to_message_id = message.reply_to.reply_to_msg_id
 
             client.message_cache[(parsed_message.chat.id, parsed_message.id)] = parsed_message
 
+            if client.message_store is not None:
+                client.message_store.put(message, users, chats)
+
             if message.reply_to:
                 if message.reply_to.forum_topic:
                     if message.reply_to.reply_to_top_id:
@@ -1319,7 +1333,7 @@ class Message(Object, Update):
                         parsed_message.is_topic_message = True
                         if topics:
                             parsed_message.topic = types.ForumTopic._parse(topics[thread_id])
-                        else:
+                        elif fetch_relations:
                             try:
                                 msg = await client.get_messages(parsed_message.chat.id,message.id)
                                 if getattr(msg, "topic"):
@@ -1345,14 +1359,18 @@ class Message(Object, Update):
                 if replies:
                     if parsed_message.reply_to_message_id:
                         try:
-                            key = (parsed_message.chat.id, parsed_message.reply_to_message_id)
-                            reply_to_message = client.message_cache[key]
+                            reply_to_message = await client.get_cached_message(
+                                parsed_message.chat.id,
+                                parsed_message.reply_to_message_id
+                            )
 
-                            if not reply_to_message:
-                                reply_to_message = await client.get_messages(
+                            if not reply_to_message and fetch_relations:
+                                reply_to_message = await client.reply_loader.load(
                                     parsed_message.chat.id,
-                                    reply_to_message_ids=message.id,
-                                    replies=replies - 1
+                                    message.id,
+                                    parsed_message.reply_to_message_id,
+                                    replies - 1,
+                                    parsed_message.reply_to_chat_id
                                 )
                             if reply_to_message and not reply_to_message.forum_topic_created:
                                 parsed_message.reply_to_message = reply_to_message
@@ -1360,7 +1378,7 @@ class Message(Object, Update):
                             pass
                         except ChannelPrivate:
                             pass
-                    elif parsed_message.reply_to_story_id:
+                    elif parsed_message.reply_to_story_id and fetch_relations:
                         try:
                             reply_to_story = await client.get_stories(
                                 parsed_message.reply_to_story_user_id or parsed_message.reply_to_story_chat_id,
@@ -1377,6 +1395,9 @@ class Message(Object, Update):
             if not parsed_message.poll:  # Do not cache poll messages
                 client.message_cache[(parsed_message.chat.id, parsed_message.id)] = parsed_message
 
+                if client.message_store is not None:
+                    client.message_store.put(message, users, chats)
+
             return parsed_message
 
     @property
@@ -1481,6 +1502,79 @@ class Message(Object, Update):
             message_id=self.id
         )
 
+    async def resolve_relations(self) -> "Message":
+        """Bound method *resolve_relations* of :obj:`~pyrogram.types.Message`.
+
+        Fetch the replied, pinned and topic data that were left out while parsing, either because the client was
+        created with ``defer_message_relations=True`` or because the requests failed. Relations already present are
+        not fetched again and cached messages are used when available.
+
+        Example:
+            .. code-block:: python
+
+                await message.resolve_relations()
+                print(message.reply_to_message)
+
+        Returns:
+            :obj:`~pyrogram.types.Message`: The message itself, with its relations filled in.
+        """
+        client = self._client
+        reply_to = getattr(self.raw, "reply_to", None)
+        reply_to_msg_id = getattr(reply_to, "reply_to_msg_id", None)
+
+        if isinstance(getattr(self.raw, "action", None), raw.types.MessageActionPinMessage):
+            if self.pinned_message is None and reply_to_msg_id:
+                try:
+                    self.pinned_message = await client.get_cached_message(
+                        self.chat.id,
+                        reply_to_msg_id
+                    ) or await client.reply_loader.load(
+                        self.chat.id,
+                        self.id,
+                        reply_to_msg_id
+                    )
+                except MessageIdsEmpty:
+                    pass
+        else:
+            # Game scores reply to the game without setting reply_to_message_id
+            reply_to_message_id = self.reply_to_message_id or (reply_to_msg_id if self.game_high_score else None)
+
+            if self.reply_to_message is None and reply_to_message_id:
+                try:
+                    reply_to_message = await client.get_cached_message(
+                        self.chat.id,
+                        reply_to_message_id
+                    ) or await client.reply_loader.load(
+                        self.chat.id,
+                        self.id,
+                        reply_to_message_id,
+                        reply_to_chat_id=self.reply_to_chat_id
+                    )
+                except (MessageIdsEmpty, ChannelPrivate):
+                    pass
+                else:
+                    if reply_to_message and not reply_to_message.forum_topic_created:
+                        self.reply_to_message = reply_to_message
+
+        if self.reply_to_story_id and self.reply_to_story is None:
+            try:
+                self.reply_to_story = await client.get_stories(
+                    self.reply_to_story_user_id or self.reply_to_story_chat_id,
+                    self.reply_to_story_id
+                )
+            except Exception:
+                pass
+
+        if getattr(reply_to, "forum_topic", False) and self.topic is None:
+            try:
+                message = await client.get_messages(self.chat.id, self.id, replies=0)
+            except Exception:
+                pass
+            else:
+                self.topic = getattr(message, "topic", None)
+
+        return self
+
     async def reply_text(
         self,
         text: str,
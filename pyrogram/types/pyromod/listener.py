@@ -59,3 +59,11 @@ class Listener:
     identifier: Identifier
     future: Future = None
     callback: Callable = None
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+
+        # Compiled once here rather than on every update checked against the listener
+        if name == "filters":
+            evaluator = pyrogram.filters.compile_filter(value) if callable(value) else None
+            super().__setattr__("filters_evaluator", evaluator)
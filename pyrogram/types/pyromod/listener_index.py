@@ -0,0 +1,141 @@
+#  Pyrofork - Telegram MTProto API Client Library for Python
+#  Copyright (C) 2020 Cezar H. <https://github.com/usernein>
+#  Copyright (C) 2022-present Mayuri-Chan <https://github.com/Mayuri-Chan>
+#
+#  This file is part of Pyrofork.
+#
+#  Pyrofork is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Pyrofork is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with Pyrofork.  If not, see <http://www.gnu.org/licenses/>.
+import itertools
+from typing import Dict, Iterator, List, Optional
+
+from .identifier import Identifier
+from .listener import Listener
+
+
+class ListenerIndex:
+    """Listeners of a single :obj:`~pyrogram.enums.ListenerTypes`, indexed by identifier values.
+
+    Each listener is filed under the most selective field its identifier populates (message id, inline message id,
+    chat id, then user id), once per value. Listeners with an empty identifier go to a wildcard bucket that is always
+    considered. Looking up update data therefore only touches the buckets of the values it carries instead of every
+    pending listener, and removing a listener only touches the buckets it was filed under.
+
+    The index iterates like the plain list it replaces, in registration order.
+    """
+
+    FIELDS = ("message_id", "inline_message_id", "chat_id", "from_user_id")
+
+    def __init__(self):
+        self.listeners: Dict[int, Listener] = {}
+        self.order: Dict[int, int] = {}
+        self.keys: Dict[int, tuple] = {}
+        self.buckets: Dict[str, Dict[object, Dict[int, Listener]]] = {field: {} for field in self.FIELDS}
+        self.wildcard: Dict[int, Listener] = {}
+        self.counter = itertools.count()
+
+    def __iter__(self) -> Iterator[Listener]:
+        return iter(list(self.listeners.values()))
+
+    def __len__(self) -> int:
+        return len(self.listeners)
+
+    def __contains__(self, listener: Listener) -> bool:
+        return id(listener) in self.listeners
+
+    @staticmethod
+    def get_values(value) -> list:
+        # Mirrors Identifier.matches, which only treats lists as a set of alternatives
+        return value if isinstance(value, list) else [value]
+
+    def append(self, listener: Listener):
+        key = id(listener)
+
+        if key in self.listeners:
+            return
+
+        self.listeners[key] = listener
+        self.order[key] = next(self.counter)
+
+        for field in self.FIELDS:
+            pattern_value = getattr(listener.identifier, field)
+
+            if pattern_value is not None:
+                values = self.get_values(pattern_value)
+
+                for value in values:
+                    self.buckets[field].setdefault(value, {})[key] = listener
+
+                self.keys[key] = (field, values)
+                break
+        else:
+            self.wildcard[key] = listener
+            self.keys[key] = None
+
+    def remove(self, listener: Listener):
+        key = id(listener)
+
+        if key not in self.listeners:
+            raise ValueError("Listener is not registered")
+
+        del self.listeners[key]
+        del self.order[key]
+        filed = self.keys.pop(key)
+
+        if filed is None:
+            del self.wildcard[key]
+            return
+
+        field, values = filed
+        buckets = self.buckets[field]
+
+        for value in values:
+            bucket = buckets.get(value)
+
+            if bucket is not None:
+                bucket.pop(key, None)
+
+                if not bucket:
+                    del buckets[value]
+
+    def get_candidates(self, data: Identifier) -> List[Listener]:
+        """Listeners that may match ``data``, in registration order. Callers still confirm with ``matches``."""
+        candidates = dict(self.wildcard)
+
+        for field in self.FIELDS:
+            buckets = self.buckets[field]
+
+            if not buckets:
+                continue
+
+            for value in self.get_values(getattr(data, field)):
+                bucket = buckets.get(value)
+
+                if bucket:
+                    candidates.update(bucket)
+
+        if len(candidates) < 2:
+            return list(candidates.values())
+
+        return [candidates[key] for key in sorted(candidates, key=self.order.__getitem__)]
+
+    def get_matching(self, data: Identifier) -> List[Listener]:
+        return [listener for listener in self.get_candidates(data) if listener.identifier.matches(data)]
+
+    def get_most_specific(self, data: Identifier) -> Optional[Listener]:
+        # in case of multiple matching listeners, the most specific should be returned
+        return max(
+            self.get_matching(data),
+            key=lambda listener: listener.identifier.count_populated(),
+            default=None
+        )
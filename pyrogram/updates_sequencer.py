@@ -0,0 +1,399 @@
+#  Pyrofork - Telegram MTProto API Client Library for Python
+#  Copyright (C) 2017-present Dan <https://github.com/delivrance>
+#  Copyright (C) 2022-present Mayuri-Chan <https://github.com/Mayuri-Chan>
+#
+#  This file is part of Pyrofork.
+#
+#  Pyrofork is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Pyrofork is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with Pyrofork.  If not, see <http://www.gnu.org/licenses/>.
+import asyncio
+import logging
+from collections import Counter, OrderedDict
+from typing import Optional, Tuple, Union
+
+import pyrogram
+from pyrogram import raw, utils
+
+log = logging.getLogger(__name__)
+
+
+class UpdatesSequencer:
+    """Applies pts, qts and seq ordered updates in sequence, as described in https://core.telegram.org/api/updates.
+
+    Every box (the common message box 0, each channel by its id and the common qts box) remembers the last applied
+    pts. An update is applied when its ``pts`` equals the local pts plus ``pts_count``, dropped as a duplicate when
+    it is lower and held back when it is higher. Held back updates are applied as soon as the missing ones arrive;
+    if the gap is still there after :attr:`GAP_TIMEOUT` seconds the difference is fetched from the server instead.
+
+    Method results advance the boxes too (see :meth:`apply_result`), without being dispatched, and the messages the
+    client sent are remembered so that they aren't dispatched as new when a difference returns them again.
+    """
+
+    GAP_TIMEOUT = 0.5
+    QTS_BOX = "qts"
+    MAX_SENT = 1000
+    MAX_SEQ_GAP = 1000
+    AFFECTED_TYPES = (
+        raw.types.messages.AffectedMessages,
+        raw.types.messages.AffectedHistory,
+        raw.types.messages.AffectedFoundMessages
+    )
+
+    def __init__(self, client: "pyrogram.Client"):
+        self.client = client
+
+        self.states = {}
+        self.pending = {}
+        self.gap_tasks = {}
+        self.held = set()
+        self.seq = None
+        self.seq_missing = set()
+        self.date = None
+        # (box_id, message_id) of the messages returned by method results, most recent last
+        self.sent = OrderedDict()
+
+        self.stats = Counter()
+
+    async def put(
+        self,
+        box_id: Union[int, str],
+        pts: int,
+        pts_count: Optional[int],
+        date: Optional[int],
+        item: Optional[tuple]
+    ):
+        """Apply, hold back or drop the item carrying ``pts`` in ``box_id``; ``item`` may be None to just advance."""
+        ready = self.advance(box_id, pts, pts_count, date, item)
+
+        if ready:
+            await self.dispatch(box_id, ready)
+
+    def advance(
+        self,
+        box_id: Union[int, str],
+        pts: int,
+        pts_count: Optional[int],
+        date: Optional[int],
+        item: Optional[tuple]
+    ) -> list:
+        """Update the state of ``box_id`` for the item carrying ``pts`` and return the items ready to be dispatched."""
+        if date:
+            self.date = date
+
+        local_pts = self.states.get(box_id)
+
+        if box_id in self.held:
+            # The box is being recovered, keep its updates until the recovered ones were dispatched
+            if local_pts is not None and pts <= local_pts:
+                self.stats["duplicates"] += 1
+            else:
+                self.pending.setdefault(box_id, {})[pts] = (pts - (pts_count or 0), item)
+
+            return []
+
+        if local_pts is None:
+            # First update seen for this box, take it as the reference
+            ready = [(pts, item)] + self.apply(box_id, pts)
+        elif pts_count is None:
+            # Not counted, so it can't be sequenced; the box stays where it is
+            ready = [(local_pts, item)]
+        elif pts == local_pts + pts_count:
+            ready = [(pts, item)] + self.apply(box_id, pts)
+        elif pts <= local_pts:
+            self.stats["duplicates"] += 1
+            return []
+        else:
+            pending = self.pending.setdefault(box_id, {})
+
+            if pts in pending:
+                self.stats["duplicates"] += 1
+                return []
+
+            pending[pts] = (pts - pts_count, item)
+
+            if box_id not in self.gap_tasks:
+                self.stats["gaps"] += 1
+                self.gap_tasks[box_id] = asyncio.create_task(self.resolve_gap(box_id))
+
+            return []
+
+        return ready
+
+    async def put_difference(self, box_id: Union[int, str], pts: int, date: Optional[int], items: list):
+        """Dispatch the updates of a difference that brings ``box_id`` up to ``pts``."""
+        if date:
+            self.date = date
+
+        if self.is_duplicate(box_id, pts):
+            self.stats["duplicates"] += 1
+            return
+
+        ready = self.apply(box_id, pts)
+
+        for item in items:
+            await self.client.dispatcher.updates_queue.put(item)
+
+        await self.dispatch(box_id, [(pts, None)] + ready)
+
+    def is_duplicate(self, box_id: Union[int, str], pts: int) -> bool:
+        local_pts = self.states.get(box_id)
+
+        return local_pts is not None and pts <= local_pts
+
+    def apply(self, box_id: Union[int, str], pts: int) -> list:
+        """Set the local pts of the box and collect the held back updates that now follow it."""
+        self.states[box_id] = pts
+        ready = []
+        pending = self.pending.get(box_id)
+
+        while pending:
+            for pending_pts in sorted(pending):
+                start, item = pending[pending_pts]
+
+                if pending_pts <= pts:
+                    # Already covered by a fetched difference
+                    del pending[pending_pts]
+                elif start == pts:
+                    del pending[pending_pts]
+                    ready.append((pending_pts, item))
+                    pts = pending_pts
+                    break
+            else:
+                break
+
+        self.states[box_id] = pts
+
+        if not pending:
+            self.pending.pop(box_id, None)
+
+            task = self.gap_tasks.pop(box_id, None)
+
+            if task is not None and task is not asyncio.current_task():
+                task.cancel()
+                self.stats["fills"] += 1
+
+        return ready
+
+    async def dispatch(self, box_id: Union[int, str], ready: list, wait: bool = True):
+        """Queue the ready items; with ``wait`` False they are queued even when a BLOCK queue is full."""
+        for pts, item in ready:
+            if item is not None:
+                if wait:
+                    await self.client.dispatcher.updates_queue.put(item)
+                else:
+                    self.client.dispatcher.updates_queue.put_nowait(item)
+
+        if ready and box_id != self.QTS_BOX:
+            await self.client.state_buffer.update((box_id, ready[-1][0], None, self.date, None))
+
+    def check_seq(self, updates: Union["raw.types.Updates", "raw.types.UpdatesCombined"]):
+        """Detect holes in the seq of update containers; they are filled by fetching the common box difference."""
+        if not updates.seq:
+            return
+
+        seq_start = getattr(updates, "seq_start", updates.seq)
+        self.seq_missing.difference_update(range(seq_start, updates.seq + 1))
+
+        if self.seq is not None and seq_start > self.seq + 1:
+            self.seq_missing.update(range(self.seq + 1, min(seq_start, self.seq + 1 + self.MAX_SEQ_GAP)))
+
+            if 0 in self.states and 0 not in self.gap_tasks:
+                self.stats["gaps"] += 1
+                self.gap_tasks[0] = asyncio.create_task(self.resolve_gap(0))
+
+        self.seq = max(self.seq or 0, updates.seq)
+
+    @staticmethod
+    def get_message_box(message: "raw.base.Message") -> int:
+        peer = getattr(message, "peer_id", None)
+
+        return utils.get_channel_id(peer.channel_id) if isinstance(peer, raw.types.PeerChannel) else 0
+
+    @staticmethod
+    def get_query_box(query: "raw.core.TLObject") -> int:
+        """The box whose pts a method result reports: the channel the method acts on, the common box otherwise."""
+        channel_id = getattr(getattr(query, "channel", None), "channel_id", None)
+
+        if channel_id is None and isinstance(getattr(query, "peer", None), raw.types.InputPeerChannel):
+            channel_id = query.peer.channel_id
+
+        return utils.get_channel_id(channel_id) if channel_id else 0
+
+    def remember_sent(self, box_id: int, message_id: int):
+        self.sent[(box_id, message_id)] = None
+        self.sent.move_to_end((box_id, message_id))
+
+        while len(self.sent) > self.MAX_SENT:
+            self.sent.popitem(last=False)
+
+    def is_sent(self, message: "raw.base.Message") -> bool:
+        """Whether ``message`` was sent by the client and already returned by a method result."""
+        return bool(getattr(message, "out", False)) and (self.get_message_box(message), message.id) in self.sent
+
+    async def apply_result(self, query: "raw.core.TLObject", result):
+        """Advance the boxes by the pts and seq a method result carries, without dispatching anything.
+
+        The server doesn't send these updates again, so leaving them out would look like a gap to the next update.
+        The boxes are advanced before anything is awaited, and the held back updates this releases are queued without
+        waiting for room: the caller may be a handler, i.e. the very worker that would make room.
+        """
+        # box_id -> released items, in the order they were released
+        released = {}
+
+        def advance(box_id, pts, pts_count, date):
+            released.setdefault(box_id, []).extend(self.advance(box_id, pts, pts_count, date, None))
+
+        if isinstance(result, (raw.types.Updates, raw.types.UpdatesCombined)):
+            self.check_seq(result)
+
+            for update in result.updates:
+                message = getattr(update, "message", None)
+
+                if isinstance(update, (raw.types.UpdateNewMessage, raw.types.UpdateNewChannelMessage)):
+                    self.remember_sent(self.get_message_box(message), message.id)
+
+                pts = getattr(update, "pts", None)
+                pts_count = getattr(update, "pts_count", None)
+                qts = getattr(update, "qts", None)
+
+                if pts and pts_count is not None:
+                    channel_id = getattr(getattr(message, "peer_id", None), "channel_id", None) or \
+                        getattr(update, "channel_id", None)
+                    advance(utils.get_channel_id(channel_id) if channel_id else 0, pts, pts_count, None)
+                elif qts:
+                    advance(self.QTS_BOX, qts, 1, None)
+        elif isinstance(result, raw.types.UpdateShortSentMessage):
+            self.remember_sent(0, result.id)
+            advance(0, result.pts, result.pts_count, result.date)
+        elif isinstance(result, self.AFFECTED_TYPES):
+            advance(self.get_query_box(query), result.pts, result.pts_count, None)
+
+        for box_id, ready in released.items():
+            if ready:
+                await self.dispatch(box_id, ready, wait=False)
+
+    def fetch_difference(self, box_id: Union[int, str]):
+        """Fetch the difference of ``box_id`` now, e.g. after ``updateChannelTooLong``."""
+        if box_id in self.states and box_id not in self.gap_tasks and box_id not in self.held:
+            self.stats["gaps"] += 1
+            self.gap_tasks[box_id] = asyncio.create_task(self.resolve_gap(box_id, 0, force=True))
+
+    def is_filled(self, box_id: Union[int, str]) -> bool:
+        if self.pending.get(box_id):
+            return False
+
+        return box_id != 0 or not self.seq_missing
+
+    async def resolve_gap(self, box_id: Union[int, str], timeout: float = None, force: bool = False):
+        await asyncio.sleep(self.GAP_TIMEOUT if timeout is None else timeout)
+
+        if not force and self.is_filled(box_id):
+            # The missing updates arrived in the meantime
+            self.gap_tasks.pop(box_id, None)
+            self.stats["fills"] += 1
+            return
+
+        self.stats["differences"] += 1
+        states = {}
+
+        try:
+            if box_id in (0, self.QTS_BOX):
+                # qts updates come with the common box difference
+                if 0 in self.states and self.date:
+                    *_, (pts, qts, date) = await self.get_difference(
+                        0, self.states[0], self.date, self.states.get(self.QTS_BOX, -1)
+                    )
+
+                    states = {0: pts, self.QTS_BOX: qts}
+                    self.date = date or self.date
+                    self.seq_missing.clear()
+            else:
+                *_, (pts, _, _) = await self.get_difference(box_id, self.states[box_id], self.date)
+
+                states = {box_id: pts}
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.exception(e)
+
+        self.gap_tasks.pop(box_id, None)
+
+        if not states.get(box_id) or states[box_id] <= self.states[box_id]:
+            # The difference didn't help, move past the gap rather than holding updates back forever
+            pending = self.pending.get(box_id, {})
+            states[box_id] = min((start for start, _ in pending.values()), default=self.states[box_id])
+
+        for state_box_id, pts in states.items():
+            if not pts or state_box_id not in self.states:
+                continue
+
+            pts = max(pts, self.states[state_box_id])
+            ready = self.apply(state_box_id, pts)
+
+            if state_box_id in self.pending and state_box_id not in self.gap_tasks:
+                self.gap_tasks[state_box_id] = asyncio.create_task(self.resolve_gap(state_box_id))
+
+            await self.dispatch(state_box_id, [(pts, None)] + ready)
+
+    async def get_difference(self, box_id: int, pts: int, date: int, qts: int = 0) -> Tuple[int, int, tuple]:
+        return await self.client.get_box_difference(box_id, pts, date, qts)
+
+    def set_state(self, box_id: Union[int, str], pts: int):
+        """Move ``box_id`` to ``pts``, unless updates already applied took it further."""
+        self.states[box_id] = max(pts, self.states.get(box_id, pts))
+
+    def hold(self, box_id: Union[int, str]):
+        """Hold back the updates of ``box_id`` until :meth:`release` is called."""
+        self.held.add(box_id)
+
+    async def release(self, box_id: Union[int, str], pts: int):
+        """Resume ``box_id`` from ``pts``, dispatching the held back updates that follow it."""
+        self.held.discard(box_id)
+
+        local_pts = self.states.get(box_id)
+        pts = pts if local_pts is None else max(pts, local_pts)
+        ready = self.apply(box_id, pts)
+
+        if box_id in self.pending and box_id not in self.gap_tasks:
+            self.gap_tasks[box_id] = asyncio.create_task(self.resolve_gap(box_id))
+
+        await self.dispatch(box_id, [(pts, None)] + ready)
+
+    async def stop(self):
+        tasks = list(self.gap_tasks.values())
+
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        self.gap_tasks.clear()
+
+    def clear(self):
+        self.states.clear()
+        self.pending.clear()
+        self.held.clear()
+        self.seq = None
+        self.seq_missing.clear()
+        self.date = None
+        self.sent.clear()
+        self.stats.clear()
+
+    def get_stats(self) -> dict:
+        return {
+            "gaps": self.stats["gaps"],
+            "fills": self.stats["fills"],
+            "differences": self.stats["differences"],
+            "duplicates": self.stats["duplicates"],
+            "pending": sum(len(pending) for pending in self.pending.values())
+        }
@@ -16,17 +16,22 @@
 #  You should have received a copy of the GNU Lesser General Public License
 #  along with Pyrogram.  If not, see <http://www.gnu.org/licenses/>.
 
+from pyrogram.filters import CommandRouter
+
+
 class Client:
     def __init__(self):
         self.me = User("username")
+        self.command_router = CommandRouter(self)
 
     async def get_me(self):
         return self.me
 
 
 class User:
-    def __init__(self, username: str = None):
+    def __init__(self, username: str = None, usernames: list = None):
         self.username = username
+        self.usernames = usernames
 
 
 class Message:
@@ -19,7 +19,7 @@
 import pytest
 
 from pyrogram import filters
-from tests.filters import Client, Message
+from tests.filters import Client, Message, User
 
 c = Client()
 
@@ -146,3 +146,50 @@ async def test_no_text():
 
     m = Message()
     assert not await f(c, m)
+
+
+@pytest.mark.asyncio
+async def test_multiple_usernames():
+    client = Client()
+    client.me = User("first", usernames=[User("first"), User("second")])
+
+    f = filters.command("start")
+
+    assert await f(client, Message("/start@first"))
+    assert await f(client, Message("/start@Second"))
+    assert not await f(client, Message("/start@third"))
+
+
+@pytest.mark.asyncio
+async def test_tokenized_once():
+    f1 = filters.command("start")
+    f2 = filters.command("help", prefixes=list("/!"))
+
+    m = Message("!help me")
+    assert not await f1(c, m)
+    tokens = m._command_tokens
+
+    assert await f2(c, m)
+    assert m._command_tokens is tokens
+    assert m.command == ["help", "me"]
+
+
+@pytest.mark.asyncio
+async def test_with_spaces():
+    f = filters.command(["add user", "start"], prefixes=["/", "hey "])
+
+    m = Message("/add user john doe")
+    assert await f(c, m)
+    assert m.command == ["add user", "john", "doe"]
+
+    m = Message("hey start now")
+    assert await f(c, m)
+    assert m.command == ["start", "now"]
+
+    m = Message("HEY Add User@username")
+    assert await f(c, m)
+    assert m.command == ["add user"]
+
+    assert not await f(c, Message("/add username"))
+    assert not await f(c, Message("/add user@another"))
+    assert not await f(c, Message("hey"))
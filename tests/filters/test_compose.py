@@ -0,0 +1,85 @@
+#  Pyrogram - Telegram MTProto API Client Library for Python
+#  Copyright (C) 2017-present Dan <https://github.com/delivrance>
+#
+#  This file is part of Pyrogram.
+#
+#  Pyrogram is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Pyrogram is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with Pyrogram.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from pyrogram import filters
+from tests.filters import Client, Message
+
+
+class ExecutorClient(Client):
+    def __init__(self):
+        super().__init__()
+        self.loop = asyncio.get_event_loop()
+        self.executor = ThreadPoolExecutor(1)
+
+
+def thread_filter(threads):
+    def func(flt, client, message):
+        threads.append(threading.current_thread())
+        return True
+
+    return func
+
+
+@pytest.mark.asyncio
+async def test_sync_filters_run_inline():
+    threads = []
+    f = filters.create(thread_filter(threads)) & filters.text
+
+    assert await f(ExecutorClient(), Message("text"))
+    assert threads == [threading.current_thread()]
+
+
+@pytest.mark.asyncio
+async def test_blocking_filters_are_offloaded():
+    threads = []
+    f = filters.create(thread_filter(threads), blocking=True) & filters.text
+
+    assert await f(ExecutorClient(), Message("text"))
+    assert len(threads) == 1 and threads[0] is not threading.current_thread()
+
+
+@pytest.mark.asyncio
+async def test_chains_are_flattened():
+    c = Client()
+
+    never = filters.create(lambda flt, client, update: False)
+
+    f = filters.text & ~filters.caption & never
+    assert len(f.filters) == 3
+    assert not await f(c, Message("text"))
+    assert await (filters.text & ~filters.caption & filters.all)(c, Message("text"))
+
+    f = filters.text | filters.caption | never
+    assert len(f.filters) == 3
+    assert await f(c, Message(caption="caption"))
+    assert not await f(c, Message())
+
+
+@pytest.mark.asyncio
+async def test_invert():
+    c = Client()
+
+    assert await (~filters.caption)(c, Message("text"))
+    assert not await (~filters.text)(c, Message("text"))
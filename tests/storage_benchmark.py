@@ -0,0 +1,90 @@
+#  Pyrogram - Telegram MTProto API Client Library for Python
+#  Copyright (C) 2017-present Dan <https://github.com/delivrance>
+#
+#  This file is part of Pyrogram.
+#
+#  Pyrogram is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Pyrogram is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with Pyrogram.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Compare peer writes and lookups across storages.
+
+    python -m tests.storage_benchmark
+
+RedisStorage runs against REDIS_URL, or fakeredis when it is unset. MongoStorage runs only when MONGODB_URL is set.
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from pyrogram.storage import FileStorage, MemoryStorage
+
+PEERS = 10000
+BATCH = 100
+
+
+async def run(name, storage):
+    await storage.open()
+
+    peers = [(i, i * 7, "user", f"user{i}", None) for i in range(1, PEERS + 1)]
+
+    start = time.perf_counter()
+    for i in range(0, PEERS, BATCH):
+        await storage.update_peers(peers[i:i + BATCH])
+    write = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(1, PEERS + 1, 10):
+        await storage.get_peer_by_id(i)
+        await storage.get_peer_by_username(f"user{i}")
+    read = time.perf_counter() - start
+
+    print(f"{name:<8} write {PEERS / write:>10.0f} peers/s    lookup {PEERS / 10 * 2 / read:>10.0f} lookups/s")
+
+    await storage.delete()
+    await storage.close()
+
+
+async def main():
+    await run("memory", MemoryStorage("benchmark"))
+
+    with tempfile.TemporaryDirectory() as workdir:
+        await run("file", FileStorage("benchmark", Path(workdir)))
+
+    try:
+        from pyrogram.storage import RedisStorage
+    except ImportError:
+        print("redis   skipped, redis is not installed")
+    else:
+        if os.environ.get("REDIS_URL"):
+            from redis.asyncio import Redis
+            connection = Redis.from_url(os.environ["REDIS_URL"])
+        else:
+            import fakeredis
+            connection = fakeredis.FakeAsyncRedis()
+
+        await run("redis", RedisStorage("benchmark", connection=connection, remove_peers=True))
+
+    if os.environ.get("MONGODB_URL"):
+        from pymongo import AsyncMongoClient
+        from pyrogram.storage import MongoStorage
+
+        connection = AsyncMongoClient(os.environ["MONGODB_URL"])
+        await run("mongodb", MongoStorage("benchmark", connection=connection, remove_peers=True))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,146 @@
+#  Pyrogram - Telegram MTProto API Client Library for Python
+#  Copyright (C) 2017-present Dan <https://github.com/delivrance>
+#
+#  This file is part of Pyrogram.
+#
+#  Pyrogram is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Pyrogram is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with Pyrogram.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from pyrogram import raw
+from pyrogram.difference_batcher import DifferenceBatcher
+from pyrogram.updates_sequencer import UpdatesSequencer
+
+
+class StateBuffer:
+    async def update(self, value):
+        pass
+
+
+class Client:
+    def __init__(self, response):
+        self.dispatcher = SimpleNamespace(updates_queue=asyncio.Queue())
+        self.state_buffer = StateBuffer()
+        self.updates_sequencer = UpdatesSequencer(self)
+        self.response = response
+        self.queries = []
+
+    async def invoke(self, query):
+        self.queries.append(query)
+        return self.response
+
+    async def resolve_peer(self, peer_id):
+        return raw.types.InputPeerChannel(channel_id=-peer_id, access_hash=0)
+
+
+def message(message_id):
+    return raw.types.Message(id=message_id, peer_id=raw.types.PeerUser(user_id=1), date=0, message="")
+
+
+@pytest.mark.asyncio
+async def test_short_updates_share_one_difference():
+    response = raw.types.updates.Difference(
+        new_messages=[message(1), message(2), message(3)],
+        new_encrypted_messages=[],
+        other_updates=[raw.types.UpdateUserTyping(user_id=1, action=raw.types.SendMessageTypingAction())],
+        chats=[],
+        users=[],
+        state=raw.types.updates.State(pts=13, qts=0, date=5, seq=0, unread_count=0)
+    )
+    client = Client(response)
+    batcher = DifferenceBatcher(client)
+    client.updates_sequencer.set_state(0, 10)
+
+    await asyncio.gather(*[batcher.fetch_common_difference(pts, 1, 5) for pts in (11, 12, 13)])
+
+    assert len(client.queries) == 1
+    assert client.queries[0].pts == 10
+
+    queue = client.dispatcher.updates_queue
+    updates = [queue.get_nowait()[0] for _ in range(queue.qsize())]
+
+    assert [update.message.id for update in updates[:3]] == [1, 2, 3]
+    assert isinstance(updates[3], raw.types.UpdateUserTyping)
+    assert client.updates_sequencer.states[0] == 13
+    assert client.updates_sequencer.is_duplicate(0, 12)
+    assert batcher.get_stats() == {"requests": 3, "fetches": 1, "saved": 2}
+
+
+@pytest.mark.asyncio
+async def test_min_peer_lookups_share_one_channel_difference():
+    user = raw.types.User(id=7, access_hash=70)
+    response = raw.types.updates.ChannelDifference(pts=20, new_messages=[], other_updates=[], chats=[], users=[user])
+    client = Client(response)
+    batcher = DifferenceBatcher(client)
+
+    results = await asyncio.gather(*[
+        batcher.fetch_channel_peers(123, message_id, pts, 1)
+        for message_id, pts in ((5, 18), (6, 19), (9, 20))
+    ])
+
+    assert results == [({7: user}, {})] * 3
+    assert len(client.queries) == 1
+
+    query = client.queries[0]
+
+    assert query.pts == 17
+    assert [(r.min_id, r.max_id) for r in query.filter.ranges] == [(5, 6), (9, 9)]
+
+
+@pytest.mark.asyncio
+async def test_slices_are_followed_and_sent_messages_skipped():
+    def state(pts):
+        return raw.types.updates.State(pts=pts, qts=0, date=pts, seq=0, unread_count=0)
+
+    sent = message(2)
+    sent.out = True
+    responses = [
+        raw.types.updates.DifferenceSlice(
+            new_messages=[message(1), sent],
+            new_encrypted_messages=[],
+            other_updates=[],
+            chats=[],
+            users=[],
+            intermediate_state=state(12)
+        ),
+        raw.types.updates.Difference(
+            new_messages=[message(3)],
+            new_encrypted_messages=[],
+            other_updates=[],
+            chats=[],
+            users=[],
+            state=state(13)
+        )
+    ]
+    client = Client(None)
+
+    async def invoke(query):
+        client.queries.append(query)
+        return responses.pop(0)
+
+    client.invoke = invoke
+    batcher = DifferenceBatcher(client)
+    client.updates_sequencer.set_state(0, 10)
+    client.updates_sequencer.remember_sent(0, 2)
+
+    await batcher.fetch_common_difference(13, 3, 5)
+
+    assert [query.pts for query in client.queries] == [10, 12]
+
+    queue = client.dispatcher.updates_queue
+    assert [queue.get_nowait()[0].message.id for _ in range(queue.qsize())] == [1, 3]
+    assert client.updates_sequencer.states[0] == 13
@@ -0,0 +1,509 @@
+#  Pyrogram - Telegram MTProto API Client Library for Python
+#  Copyright (C) 2017-present Dan <https://github.com/delivrance>
+#
+#  This file is part of Pyrogram.
+#
+#  Pyrogram is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Pyrogram is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with Pyrogram.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import asyncio
+import re
+
+import pytest
+
+import pyrogram
+from pyrogram import enums, filters, raw, types
+from pyrogram.client import MessageCache
+from pyrogram.dispatcher import Dispatcher, RegexIndex, UpdatesQueue
+from pyrogram.handlers import CallbackQueryHandler, MessageHandler, RawUpdateHandler, UserStatusHandler
+
+
+class Client:
+    workers = 1
+    max_updates_queue_size = 0
+    updates_overflow_policy = enums.UpdatesOverflowPolicy.BLOCK
+    update_lanes = None
+    no_updates = True
+    skip_updates = True
+
+    def __init__(self):
+        self.listeners = {listener_type: [] for listener_type in enums.ListenerTypes}
+        self.message_cache = MessageCache(100)
+        self.message_store = None
+
+
+async def callback(*args):
+    pass
+
+
+@pytest.mark.asyncio
+async def test_routes_by_handler_type():
+    dispatcher = Dispatcher(Client())
+
+    message_handler = MessageHandler(callback)
+    callback_query_handler = CallbackQueryHandler(callback)
+
+    dispatcher.add_handler(message_handler, 1)
+    dispatcher.add_handler(callback_query_handler, 2)
+
+    routes = dispatcher.get_routes(MessageHandler)
+    assert routes == [(dispatcher.conversation_handler,), (message_handler,)]
+
+    routes = dispatcher.get_routes(CallbackQueryHandler)
+    assert routes == [(dispatcher.conversation_handler,), (callback_query_handler,)]
+
+    assert dispatcher.get_routes(type(None)) == []
+
+
+@pytest.mark.asyncio
+async def test_routes_keep_raw_update_handlers_in_order():
+    dispatcher = Dispatcher(Client())
+
+    first = MessageHandler(callback)
+    raw_update_handler = RawUpdateHandler(callback)
+    last = MessageHandler(callback)
+
+    for handler in (first, raw_update_handler, last):
+        dispatcher.add_handler(handler, 1)
+
+    assert dispatcher.get_routes(MessageHandler)[1] == (first, raw_update_handler, last)
+    assert dispatcher.get_routes(CallbackQueryHandler) == [
+        (dispatcher.conversation_handler,), (raw_update_handler,)
+    ]
+    assert dispatcher.get_routes(type(None)) == [(raw_update_handler,)]
+
+
+@pytest.mark.asyncio
+async def test_routes_are_rebuilt_on_remove():
+    dispatcher = Dispatcher(Client())
+
+    handler = MessageHandler(callback)
+    dispatcher.add_handler(handler, 1)
+    assert len(dispatcher.get_routes(MessageHandler)) == 2
+
+    dispatcher.remove_handler(handler, 1)
+    assert dispatcher.get_routes(MessageHandler) == [(dispatcher.conversation_handler,)]
+
+    with pytest.raises(ValueError):
+        dispatcher.remove_handler(handler, 1)
+
+
+@pytest.mark.asyncio
+async def test_handler_changes_do_not_affect_taken_snapshots():
+    dispatcher = Dispatcher(Client())
+
+    handler_table = dispatcher.handler_table
+    routes = handler_table.get_routes(MessageHandler)
+
+    dispatcher.add_handler(MessageHandler(callback), 1)
+
+    assert handler_table.get_routes(MessageHandler) is routes
+    assert routes == [(dispatcher.conversation_handler,)]
+    assert len(dispatcher.get_routes(MessageHandler)) == 2
+
+
+def user_status_update():
+    return raw.types.UpdateUserStatus(user_id=1, status=raw.types.UserStatusEmpty())
+
+
+@pytest.mark.asyncio
+async def test_unconsumed_updates_are_not_parsed():
+    dispatcher = Dispatcher(Client())
+    dispatcher.add_handler(CallbackQueryHandler(callback), 1)
+
+    await dispatcher._handle_packet((user_status_update(), {}, {}))
+
+    assert dispatcher.skipped_updates["UpdateUserStatus"] == 1
+    assert not dispatcher.parsed_updates
+
+
+@pytest.mark.asyncio
+async def test_raw_update_handlers_do_not_need_parsing():
+    dispatcher = Dispatcher(Client())
+    received = []
+
+    async def raw_callback(client, update, users, chats):
+        received.append(update)
+
+    dispatcher.add_handler(RawUpdateHandler(raw_callback), 1)
+
+    update = user_status_update()
+    await dispatcher._handle_packet((update, {}, {}))
+
+    assert received == [update]
+    assert not dispatcher.parsed_updates
+    assert not dispatcher.skipped_updates
+
+
+@pytest.mark.asyncio
+async def test_consumed_updates_are_parsed():
+    dispatcher = Dispatcher(Client())
+    received = []
+
+    async def user_status_callback(client, user):
+        received.append(user)
+
+    dispatcher.add_handler(UserStatusHandler(user_status_callback), 1)
+
+    await dispatcher._handle_packet((user_status_update(), {}, {}))
+
+    assert dispatcher.parsed_updates["UpdateUserStatus"] == 1
+    assert [user.id for user in received] == [1]
+
+
+def user_status_update_for(user_id, was_online=0):
+    return raw.types.UpdateUserStatus(user_id=user_id, status=raw.types.UserStatusOffline(was_online=was_online))
+
+
+def test_update_key():
+    message = raw.types.Message(id=1, peer_id=raw.types.PeerChannel(channel_id=1), date=0, message="")
+
+    assert Dispatcher.get_update_key(raw.types.UpdateNewChannelMessage(message=message, pts=1, pts_count=1)) \
+        == -1000000000001
+    assert Dispatcher.get_update_key(user_status_update_for(42)) == 42
+    assert Dispatcher.get_update_key(raw.types.UpdateDeleteMessages(messages=[1], pts=1, pts_count=1)) is None
+
+
+@pytest.mark.asyncio
+async def test_per_chat_lanes_keep_order():
+    client = Client()
+    client.no_updates = False
+    client.update_lanes = 4
+
+    dispatcher = Dispatcher(client)
+    received = []
+
+    async def raw_callback(client, update, users, chats):
+        received.append((update.user_id, update.status.was_online))
+        # Yield so that other lanes get a chance to interleave
+        await asyncio.sleep(0)
+
+    dispatcher.add_handler(RawUpdateHandler(raw_callback), 1)
+    await dispatcher.start()
+
+    for i in range(10):
+        for user_id in (1, 2, 3):
+            dispatcher.updates_queue.put_nowait((user_status_update_for(user_id, i), {}, {}))
+
+    await dispatcher.updates_queue.join()
+    await asyncio.gather(*(lane.join() for lane in dispatcher.lanes))
+
+    stats = dispatcher.get_lane_stats()
+    assert sum(stats["updates"]) == 30
+    assert stats["pending"] == [0, 0, 0, 0]
+    assert stats["skew"] >= 1
+
+    for user_id in (1, 2, 3):
+        assert [i for key, i in received if key == user_id] == list(range(10))
+
+    await dispatcher.stop()
+    assert not dispatcher.handler_worker_tasks
+
+
+@pytest.mark.asyncio
+async def test_updates_without_chat_wait_for_every_lane():
+    client = Client()
+    client.no_updates = False
+    client.update_lanes = 4
+
+    dispatcher = Dispatcher(client)
+    received = []
+
+    async def raw_callback(client, update, users, chats):
+        # Updates of user 1 are slow, the deletion must still come after them
+        if isinstance(update, raw.types.UpdateUserStatus) and update.user_id == 1:
+            await asyncio.sleep(0.01)
+
+        received.append(type(update).__name__)
+
+    dispatcher.add_handler(RawUpdateHandler(raw_callback), 1)
+    await dispatcher.start()
+
+    for i in range(3):
+        dispatcher.updates_queue.put_nowait((user_status_update_for(1, i), {}, {}))
+
+    dispatcher.updates_queue.put_nowait((delete_messages_update(1), {}, {}))
+    dispatcher.updates_queue.put_nowait((user_status_update_for(2, 0), {}, {}))
+
+    await dispatcher.updates_queue.join()
+    await asyncio.gather(*(lane.join() for lane in dispatcher.lanes))
+
+    assert received == ["UpdateUserStatus"] * 3 + ["UpdateDeleteMessages", "UpdateUserStatus"]
+
+    await dispatcher.stop()
+
+
+@pytest.mark.asyncio
+async def test_full_lane_does_not_block_the_others():
+    client = Client()
+    client.no_updates = False
+    client.update_lanes = 2
+    client.max_updates_queue_size = 2
+    client.updates_overflow_policy = enums.UpdatesOverflowPolicy.DROP_OLDEST
+
+    dispatcher = Dispatcher(client)
+    slow_chat = asyncio.Event()
+    received = []
+
+    async def raw_callback(client, update, users, chats):
+        if update.user_id == 1:
+            await slow_chat.wait()
+
+        received.append((update.user_id, update.status.was_online))
+
+    dispatcher.add_handler(RawUpdateHandler(raw_callback), 1)
+    await dispatcher.start()
+
+    other = next(user_id for user_id in range(2, 100) if hash(user_id) % 2 != hash(1) % 2)
+
+    for i in range(5):
+        dispatcher.updates_queue.put_nowait((user_status_update_for(1, i), {}, {}))
+        # Let the router move it to its lane, the updates queue is bounded too
+        await asyncio.sleep(0)
+
+    dispatcher.updates_queue.put_nowait((user_status_update_for(other, 0), {}, {}))
+
+    await asyncio.wait_for(dispatcher.updates_queue.join(), 1)
+
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+    assert received == [(other, 0)]
+
+    slow_chat.set()
+    await asyncio.gather(*(lane.join() for lane in dispatcher.lanes))
+
+    # The first update was already being handled, the oldest pending ones were dropped
+    assert [i for user_id, i in received if user_id == 1] == [0, 3, 4]
+
+    await dispatcher.stop()
+
+
+@pytest.mark.asyncio
+async def test_listeners_get_updates_of_their_own_lane():
+    client = Client()
+    client.no_updates = False
+    client.update_lanes = 2
+
+    dispatcher = Dispatcher(client)
+    answer = asyncio.get_running_loop().create_future()
+    received = []
+
+    async def raw_callback(client, update, users, chats):
+        if isinstance(update, raw.types.UpdateUserStatus) and update.status.was_online == 0:
+            # Like Client.listen(): wait for the next update of the same chat
+            client.listeners[enums.ListenerTypes.MESSAGE].append(answer)
+            received.append(await answer)
+            client.listeners[enums.ListenerTypes.MESSAGE].remove(answer)
+        elif isinstance(update, raw.types.UpdateUserStatus) and not answer.done():
+            answer.set_result(update.status.was_online)
+        else:
+            received.append(type(update).__name__)
+
+    dispatcher.add_handler(RawUpdateHandler(raw_callback), 1)
+    await dispatcher.start()
+
+    dispatcher.updates_queue.put_nowait((user_status_update_for(1, 0), {}, {}))
+    await asyncio.sleep(0.01)
+    dispatcher.updates_queue.put_nowait((user_status_update_for(1, 1), {}, {}))
+    dispatcher.updates_queue.put_nowait((delete_messages_update(1), {}, {}))
+
+    await asyncio.wait_for(dispatcher.updates_queue.join(), 1)
+    await asyncio.wait_for(asyncio.gather(*(lane.join() for lane in dispatcher.lanes)), 1)
+
+    assert received == [1, "UpdateDeleteMessages"]
+    assert dispatcher.get_lane_stats()["bypassed"] == 1
+
+    await dispatcher.stop()
+
+
+@pytest.mark.asyncio
+async def test_stalled_lane_does_not_freeze_the_router():
+    client = Client()
+    client.no_updates = False
+    client.update_lanes = 2
+
+    dispatcher = Dispatcher(client)
+    dispatcher.LANE_JOIN_TIMEOUT = 0.01
+    stalled = asyncio.Event()
+    received = []
+
+    async def raw_callback(client, update, users, chats):
+        if isinstance(update, raw.types.UpdateUserStatus) and update.user_id == 1:
+            await stalled.wait()
+
+        received.append(type(update).__name__)
+
+    dispatcher.add_handler(RawUpdateHandler(raw_callback), 1)
+    await dispatcher.start()
+
+    dispatcher.updates_queue.put_nowait((user_status_update_for(1, 0), {}, {}))
+    dispatcher.updates_queue.put_nowait((delete_messages_update(1), {}, {}))
+
+    # The router gives up waiting for the stalled lane and moves on
+    await asyncio.wait_for(dispatcher.updates_queue.join(), 1)
+
+    stalled.set()
+    await asyncio.gather(*(lane.join() for lane in dispatcher.lanes))
+
+    assert sorted(received) == ["UpdateDeleteMessages", "UpdateUserStatus"]
+
+    await dispatcher.stop()
+
+
+def delete_messages_update(message_id):
+    return raw.types.UpdateDeleteMessages(messages=[message_id], pts=1, pts_count=1)
+
+
+def queued_updates(queue):
+    updates = []
+
+    while not queue.empty():
+        updates.append(queue.get_nowait()[0])
+        queue.task_done()
+
+    return updates
+
+
+@pytest.mark.asyncio
+async def test_updates_queue_blocks_when_full():
+    queue = UpdatesQueue(1, enums.UpdatesOverflowPolicy.BLOCK)
+
+    await queue.put((delete_messages_update(1), {}, {}))
+    put = asyncio.ensure_future(queue.put((delete_messages_update(2), {}, {})))
+
+    await asyncio.sleep(0)
+    assert not put.done()
+
+    queue.get_nowait()
+    queue.task_done()
+    await asyncio.wait_for(put, 1)
+
+    assert [update.messages for update in queued_updates(queue)] == [[2]]
+
+    # Stop signals always go through
+    queue.put_nowait(None)
+    queue.put_nowait(None)
+    assert queue.qsize() == 2
+
+
+@pytest.mark.asyncio
+async def test_updates_queue_drops_oldest():
+    queue = UpdatesQueue(2, enums.UpdatesOverflowPolicy.DROP_OLDEST)
+
+    for i in range(4):
+        await queue.put((delete_messages_update(i), {}, {}))
+
+    assert [update.messages for update in queued_updates(queue)] == [[2], [3]]
+    assert queue.get_stats()["dropped"] == {"UpdateDeleteMessages": 2}
+    assert queue.get_stats()["max_depth"] == 2
+
+    await asyncio.wait_for(queue.join(), 1)
+
+
+@pytest.mark.asyncio
+async def test_updates_queue_drops_low_priority_first():
+    queue = UpdatesQueue(2, enums.UpdatesOverflowPolicy.DROP_LOW_PRIORITY)
+
+    await queue.put((user_status_update_for(1), {}, {}))
+    await queue.put((delete_messages_update(1), {}, {}))
+    await queue.put((delete_messages_update(2), {}, {}))
+    await queue.put((user_status_update_for(2), {}, {}))
+
+    assert [update.messages for update in queued_updates(queue)] == [[1], [2]]
+    assert queue.get_stats()["dropped"] == {"UpdateUserStatus": 2}
+
+
+@pytest.mark.asyncio
+async def test_updates_queue_coalesces_superseded_updates():
+    queue = UpdatesQueue(10, enums.UpdatesOverflowPolicy.COALESCE)
+
+    await queue.put((user_status_update_for(1, 1), {}, {}))
+    await queue.put((delete_messages_update(1), {}, {}))
+    await queue.put((user_status_update_for(1, 2), {}, {}))
+    await queue.put((user_status_update_for(2, 3), {}, {}))
+
+    updates = queued_updates(queue)
+    assert [type(update).__name__ for update in updates] == [
+        "UpdateUserStatus", "UpdateDeleteMessages", "UpdateUserStatus"
+    ]
+    assert updates[0].status.was_online == 2
+    assert queue.get_stats()["coalesced"] == {"UpdateUserStatus": 1}
+
+    # Once handed out, a pending update can no longer be replaced
+    await queue.put((user_status_update_for(1, 4), {}, {}))
+    assert queue.qsize() == 1
+
+
+def test_regex_index():
+    page = CallbackQueryHandler(callback, filters.regex(r"^page_(\d+)"))
+    delete = CallbackQueryHandler(callback, filters.regex("^del:") & filters.all)
+    settings = CallbackQueryHandler(callback, filters.regex("^SETTINGS", flags=re.IGNORECASE))
+    unanchored = CallbackQueryHandler(callback, filters.regex("page"))
+    unfiltered = CallbackQueryHandler(callback)
+
+    regex_index = RegexIndex((page, delete, settings, unanchored, unfiltered))
+
+    assert regex_index.handlers == {page, delete, settings}
+    assert regex_index.get_rejected("page_2") == {delete, settings}
+    assert regex_index.get_rejected("del:1") == {page, settings}
+    assert regex_index.get_rejected("Settings") == {page, delete}
+    assert regex_index.get_rejected("other") == {page, delete, settings}
+
+
+def test_regex_index_per_group():
+    dispatcher = Dispatcher(Client())
+
+    page = CallbackQueryHandler(callback, filters.regex("^page_"))
+    dispatcher.add_handler(page, 1)
+    dispatcher.add_handler(CallbackQueryHandler(callback), 2)
+
+    regex_indexes = dispatcher.handler_table.get_regex_indexes(CallbackQueryHandler)
+
+    assert [regex_index and regex_index.handlers for regex_index in regex_indexes] == [None, {page}, None]
+
+
+def test_regex_index_follows_reassigned_filters():
+    dispatcher = Dispatcher(Client())
+
+    page = CallbackQueryHandler(callback, filters.regex("^page_"))
+    dispatcher.add_handler(page, 1)
+
+    assert dispatcher.handler_table.get_regex_indexes(CallbackQueryHandler)[1].get_rejected("del:1") == {page}
+
+    page.filters = filters.regex("^del:")
+
+    assert dispatcher.handler_table.get_regex_indexes(CallbackQueryHandler)[1].get_rejected("del:1") == set()
+
+
+@pytest.mark.asyncio
+async def test_skipped_regex_handlers_clear_matches():
+    dispatcher = Dispatcher(Client())
+    dispatcher.client.get_listener_matching_with_data = lambda data, listener_type: None
+    seen = []
+
+    async def record(client, query):
+        seen.append(query.matches)
+        raise pyrogram.ContinuePropagation
+
+    dispatcher.add_handler(CallbackQueryHandler(record, filters.regex("^oth")), 1)
+    dispatcher.add_handler(CallbackQueryHandler(record, filters.regex("^page_")), 2)
+    dispatcher.add_handler(CallbackQueryHandler(record), 2)
+
+    query = types.CallbackQuery(id="1", from_user=None, chat_instance="1", data="other")
+    handler_table = dispatcher.handler_table
+
+    await dispatcher._dispatch_to_handlers(None, {}, {}, query, handler_table, CallbackQueryHandler)
+
+    assert [matches and [m.group(0) for m in matches] for matches in seen] == [["oth"], None]
@@ -0,0 +1,107 @@
+#  Pyrogram - Telegram MTProto API Client Library for Python
+#  Copyright (C) 2017-present Dan <https://github.com/delivrance>
+#
+#  This file is part of Pyrogram.
+#
+#  Pyrogram is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Pyrogram is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with Pyrogram.  If not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+
+from pyrogram import enums, filters
+from pyrogram.types import Identifier, Listener
+from pyrogram.types.pyromod.listener_index import ListenerIndex
+
+
+def make_listener(**kwargs):
+    return Listener(
+        listener_type=enums.ListenerTypes.MESSAGE,
+        filters=None,
+        unallowed_click_alert=True,
+        identifier=Identifier(**kwargs)
+    )
+
+
+def test_most_specific_listener_wins():
+    index = ListenerIndex()
+    by_chat = make_listener(chat_id=1)
+    by_chat_and_user = make_listener(chat_id=1, from_user_id=2)
+    wildcard = make_listener()
+
+    for listener in (wildcard, by_chat, by_chat_and_user):
+        index.append(listener)
+
+    assert index.get_most_specific(Identifier(chat_id=[1, "chat"], from_user_id=[2, "user"])) is by_chat_and_user
+    assert index.get_most_specific(Identifier(chat_id=[1, "chat"], from_user_id=[3, "other"])) is by_chat
+    assert index.get_most_specific(Identifier(chat_id=[4, None], from_user_id=[2, "user"])) is wildcard
+
+
+def test_candidates_are_limited_to_matching_buckets():
+    index = ListenerIndex()
+
+    for chat_id in range(100):
+        index.append(make_listener(chat_id=chat_id))
+
+    by_username = make_listener(chat_id=["chat", 1000])
+    index.append(by_username)
+
+    assert index.get_candidates(Identifier(chat_id=[5, None])) == [list(index)[5]]
+    assert index.get_matching(Identifier(chat_id=[1000, "chat"])) == [by_username]
+    assert index.get_matching(Identifier(chat_id=[2000, "chat"])) == [by_username]
+
+
+def test_matching_keeps_registration_order():
+    index = ListenerIndex()
+    first = make_listener(chat_id=1)
+    second = make_listener()
+    third = make_listener(chat_id=[1, 2])
+
+    for listener in (first, second, third):
+        index.append(listener)
+
+    assert index.get_matching(Identifier(chat_id=1)) == [first, second, third]
+
+
+def test_remove():
+    index = ListenerIndex()
+    a = make_listener(chat_id=1, message_id=10)
+    b = make_listener(chat_id=1, message_id=10)
+
+    index.append(a)
+    index.append(b)
+    index.remove(a)
+
+    assert a not in index and b in index
+    assert index.get_matching(Identifier(chat_id=1, message_id=10)) == [b]
+
+    index.remove(b)
+
+    assert not index
+    assert index.buckets["message_id"] == {}
+
+    with pytest.raises(ValueError):
+        index.remove(b)
+
+
+@pytest.mark.asyncio
+async def test_listener_filters_are_compiled_once():
+    listener = make_listener(chat_id=1)
+
+    assert listener.filters_evaluator is None
+
+    listener.filters = filters.create(lambda _, __, update: update == "yes")
+    evaluator = listener.filters_evaluator
+
+    assert await evaluator(None, "yes")
+    assert not await evaluator(None, "no")
+    assert listener.filters_evaluator is evaluator
@@ -0,0 +1,110 @@
+#  Pyrogram - Telegram MTProto API Client Library for Python
+#  Copyright (C) 2017-present Dan <https://github.com/delivrance>
+#
+#  This file is part of Pyrogram.
+#
+#  Pyrogram is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Pyrogram is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with Pyrogram.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import time
+
+from pyrogram import raw
+from pyrogram.client import Cache, MessageCache
+
+
+def test_reads_refresh_recency():
+    cache = Cache(2)
+
+    cache["a"] = 1
+    cache["b"] = 2
+    assert cache["a"] == 1
+
+    cache["c"] = 3
+
+    assert "a" in cache
+    assert "b" not in cache
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_entries_expire(monkeypatch):
+    cache = Cache(10, ttl=5)
+    now = time.monotonic()
+
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    cache["a"] = 1
+    assert cache["a"] == 1
+
+    monkeypatch.setattr(time, "monotonic", lambda: now + 5)
+    assert cache["a"] is None
+    assert len(cache) == 0
+
+    stats = cache.get_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["expired"] == 1
+
+    cache["b"] = 2
+    assert "b" in cache
+
+    monkeypatch.setattr(time, "monotonic", lambda: now + 10)
+    assert "b" not in cache
+    assert len(cache) == 0
+    assert cache.get_stats()["expired"] == 2
+
+
+def test_memory_bound():
+    cache = Cache(100, max_memory=Cache.get_size("x" * 1000) * 3)
+
+    for i in range(5):
+        cache[i] = "x" * 1000 + str(i)
+
+    assert list(cache.store) == [3, 4]
+    assert cache.memory == sum(entry[2] for entry in cache.store.values())
+    assert cache.memory <= cache.max_memory
+
+    cache.pop(3)
+    cache.pop(4)
+    assert cache.memory == 0
+
+
+def test_edits_and_deletes_invalidate():
+    cache = MessageCache(100)
+    channel_id = -1001234567890
+
+    cache[(1, 10)] = "private"
+    cache[(-5, 11)] = "group"
+    cache[(channel_id, 10)] = "channel"
+    cache[(channel_id, 11)] = "channel"
+
+    cache.invalidate_update(raw.types.UpdateDeleteMessages(messages=[10, 11], pts=1, pts_count=2))
+
+    assert list(cache.store) == [(channel_id, 10), (channel_id, 11)]
+    assert cache.keys_by_message_id == {}
+
+    cache.invalidate_update(raw.types.UpdateDeleteChannelMessages(channel_id=1234567890, messages=[10], pts=1, pts_count=1))
+    cache.invalidate_update(
+        raw.types.UpdateEditChannelMessage(
+            message=raw.types.Message(
+                id=11,
+                peer_id=raw.types.PeerChannel(channel_id=1234567890),
+                date=0,
+                message="edited"
+            ),
+            pts=2,
+            pts_count=1
+        )
+    )
+
+    assert len(cache) == 0
+    assert cache.get_stats()["invalidations"] == 4
@@ -0,0 +1,89 @@
+#  Pyrogram - Telegram MTProto API Client Library for Python
+#  Copyright (C) 2017-present Dan <https://github.com/delivrance>
+#
+#  This file is part of Pyrogram.
+#
+#  Pyrogram is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Pyrogram is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with Pyrogram.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from io import BytesIO
+
+import pytest
+
+from pyrogram import Client, raw, types
+from pyrogram.raw.core import TLObject
+
+
+def from_wire(obj):
+    # Objects read from the wire have empty vectors instead of None
+    return TLObject.read(BytesIO(obj.write()))
+
+
+def make_message(message_id: int, text: str, reply_to_msg_id: int = None):
+    return from_wire(raw.types.Message(
+        id=message_id,
+        peer_id=raw.types.PeerUser(user_id=1),
+        from_id=raw.types.PeerUser(user_id=1),
+        date=0,
+        message=text,
+        reply_to=raw.types.MessageReplyHeader(reply_to_msg_id=reply_to_msg_id) if reply_to_msg_id else None
+    ))
+
+
+USERS = {1: from_wire(raw.types.User(id=1, access_hash=10, first_name="One"))}
+
+
+@pytest.fixture
+def client(tmp_path):
+    client = Client("test", workdir=tmp_path, in_memory=True, defer_message_relations=True)
+    client.requests = []
+
+    async def get_messages(chat_id, message_ids=None, reply_to_message_ids=None, replies=1):
+        client.requests.append((chat_id, message_ids, reply_to_message_ids))
+        messages = [
+            await types.Message._parse(client, make_message(i - 5, "original"), USERS, {}, replies=0)
+            for i in (reply_to_message_ids if isinstance(reply_to_message_ids, list) else [reply_to_message_ids])
+        ]
+        return messages if isinstance(reply_to_message_ids, list) else messages[0]
+
+    client.get_messages = get_messages
+
+    return client
+
+
+@pytest.mark.asyncio
+async def test_replies_are_not_fetched_while_parsing(client):
+    message = await types.Message._parse(client, make_message(10, "reply", 5), USERS, {}, fetch_relations=False)
+
+    assert message.reply_to_message_id == 5
+    assert message.reply_to_message is None
+    assert client.requests == []
+
+    await message.resolve_relations()
+
+    assert message.reply_to_message.text == "original"
+    assert client.requests == [(1, None, 10)]
+
+    await message.resolve_relations()
+
+    assert len(client.requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_cached_replies_are_attached(client):
+    await types.Message._parse(client, make_message(5, "cached"), USERS, {})
+    message = await types.Message._parse(client, make_message(10, "reply", 5), USERS, {}, fetch_relations=False)
+
+    assert message.reply_to_message.text == "cached"
+    assert client.requests == []
@@ -0,0 +1,166 @@
+#  Pyrogram - Telegram MTProto API Client Library for Python
+#  Copyright (C) 2017-present Dan <https://github.com/delivrance>
+#
+#  This file is part of Pyrogram.
+#
+#  Pyrogram is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Pyrogram is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with Pyrogram.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import pytest
+
+from pyrogram import Client, enums, raw
+from pyrogram.storage.message_store import MessageStore
+
+CHANNEL_ID = -1001234567890
+
+
+def make_message(message_id: int, text: str, peer=None):
+    return raw.types.Message(
+        id=message_id,
+        peer_id=peer or raw.types.PeerUser(user_id=1),
+        from_id=raw.types.PeerUser(user_id=1),
+        date=0,
+        message=text
+    )
+
+
+def make_user():
+    return raw.types.User(id=1, access_hash=10, first_name="One")
+
+
+def make_channel():
+    return raw.types.Channel(id=1234567890, access_hash=20, title="Channel", photo=raw.types.ChatPhotoEmpty(), date=0)
+
+
+@pytest.fixture
+def client(tmp_path):
+    return Client("test", workdir=tmp_path, in_memory=True, message_store_size=1024 * 1024)
+
+
+@pytest.mark.asyncio
+async def test_messages_survive_restart(client):
+    client.message_store.put(make_message(10, "hello"), {1: make_user(), 2: raw.types.User(id=2)}, {})
+
+    message = await client.message_store.get(1, 10)
+    assert message.text == "hello"
+    assert message.from_user.first_name == "One"
+
+    await client.message_store.stop()
+
+    store = MessageStore(client, client.message_store.path, client.message_store.max_size)
+    message = await store.get(1, 10)
+
+    assert message.text == "hello"
+    assert await store.get(1, 11) is None
+    assert store.get_stats()["hits"] == 1
+    assert store.get_stats()["misses"] == 1
+
+    await store.stop()
+
+
+@pytest.mark.asyncio
+async def test_parsed_messages_are_not_written_back(client):
+    store = client.message_store
+    store.put(make_message(10, "hello"), {1: make_user()}, {})
+    await store.flush()
+
+    assert await store.get(1, 10) is not None
+    assert store.pending == {}
+    assert client.message_cache[(1, 10)].text == "hello"
+
+    await store.stop()
+
+
+@pytest.mark.asyncio
+async def test_edits_and_deletes_invalidate(client):
+    store = client.message_store
+    channel = raw.types.PeerChannel(channel_id=1234567890)
+
+    store.put(make_message(10, "private"), {1: make_user()}, {})
+    store.put(make_message(10, "channel", channel), {1: make_user()}, {1234567890: make_channel()})
+    store.put(make_message(11, "channel", channel), {1: make_user()}, {1234567890: make_channel()})
+    await store.flush()
+
+    store.invalidate_update(raw.types.UpdateDeleteMessages(messages=[10], pts=1, pts_count=1))
+    store.invalidate_update(
+        raw.types.UpdateEditChannelMessage(message=make_message(11, "edited", channel), pts=2, pts_count=1)
+    )
+    await store.flush()
+
+    assert await store.get(1, 10) is None
+    assert await store.get(CHANNEL_ID, 11) is None
+    assert (await store.get(CHANNEL_ID, 10)).text == "channel"
+
+    await store.stop()
+
+
+@pytest.mark.asyncio
+async def test_size_bound(client):
+    store = MessageStore(client, client.message_store.path, 256 * 1024)
+
+    for i in range(1, 401):
+        store.put(make_message(i, "x" * 1000), {1: make_user()}, {})
+
+    await store.flush()
+
+    assert 0 < store.get_stats()["evictions"] < 400
+    assert await store.run(store.get_size) <= store.max_size
+    assert await store.get(1, 1) is None
+    assert (await store.get(1, 400)).text == "x" * 1000
+
+    await store.stop()
+
+
+@pytest.mark.asyncio
+async def test_stale_entries_expire(client):
+    store = MessageStore(client, client.message_store.path, client.message_store.max_size, max_age=60)
+
+    store.put(make_message(10, "old"), {1: make_user()}, {})
+    store.put(make_message(11, "new"), {1: make_user()}, {})
+    store.pending[(1, 10)] = (store.pending[(1, 10)][0], store.pending[(1, 10)][1] - 120)
+
+    assert await store.get(1, 10) is None
+    assert store.get_stats()["expirations"] == 1
+
+    await store.flush()
+
+    assert await store.run(lambda: store.conn.execute("SELECT message_id FROM messages").fetchall()) == [(11,)]
+    assert (await store.get(1, 11)).text == "new"
+
+    await store.stop()
+
+
+@pytest.mark.asyncio
+async def test_stored_messages_skip_relation_requests(client):
+    async def invoke(query):
+        raise AssertionError(f"Unexpected request: {query}")
+
+    client.invoke = invoke
+
+    message = raw.types.MessageService(
+        id=10,
+        peer_id=raw.types.PeerUser(user_id=1),
+        from_id=raw.types.PeerUser(user_id=1),
+        date=0,
+        action=raw.types.MessageActionPinMessage(),
+        reply_to=raw.types.MessageReplyHeader(reply_to_msg_id=9)
+    )
+    client.message_store.put(message, {1: make_user()}, {})
+
+    message = await client.message_store.get(1, 10)
+
+    assert message.service == enums.MessageServiceType.PINNED_MESSAGE
+    assert message.pinned_message is None
+
+    await client.message_store.stop()
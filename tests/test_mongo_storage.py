@@ -0,0 +1,198 @@
+#  Pyrogram - Telegram MTProto API Client Library for Python
+#  Copyright (C) 2017-present Dan <https://github.com/delivrance>
+#
+#  This file is part of Pyrogram.
+#
+#  Pyrogram is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Pyrogram is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with Pyrogram.  If not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+
+pytest.importorskip("pymongo")
+
+from pyrogram import raw  # noqa: E402
+from pyrogram.storage import MongoStorage  # noqa: E402
+
+
+def matches(document, query):
+    for key, condition in query.items():
+        value = document.get(key)
+
+        if isinstance(condition, dict):
+            for op, operand in condition.items():
+                if op == "$in" and value not in operand:
+                    return False
+                if op == "$nin" and value in operand:
+                    return False
+                if op == "$lt" and not (value is not None and value < operand):
+                    return False
+        elif value != condition:
+            return False
+
+    return True
+
+
+class Cursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def sort(self, key, direction):
+        self.documents.sort(key=lambda d: d.get(key), reverse=direction < 0)
+        return self
+
+    def limit(self, limit):
+        self.documents = self.documents[:limit]
+        return self
+
+    async def __aiter__(self):
+        for document in self.documents:
+            yield document
+
+
+class Collection:
+    """Just enough of an async MongoDB collection for MongoStorage, counting the round trips."""
+
+    def __init__(self):
+        self.documents = {}
+        self.calls = 0
+
+    def select(self, query):
+        return [dict(d) for d in self.documents.values() if matches(d, query)]
+
+    async def find_one(self, query, projection=None):
+        self.calls += 1
+        found = self.select(query)
+        return found[0] if found else None
+
+    def find(self, query=None, projection=None):
+        self.calls += 1
+        return Cursor(self.select(query or {}))
+
+    async def count_documents(self, query):
+        self.calls += 1
+        return len(self.select(query))
+
+    async def insert_one(self, document):
+        self.calls += 1
+        self.documents[document["_id"]] = dict(document)
+
+    async def update_one(self, query, update, upsert=False):
+        self.calls += 1
+        self.apply(query, update, upsert)
+
+    def apply(self, query, update, upsert):
+        found = self.select(query)
+
+        if found:
+            self.documents[found[0]["_id"]].update(update["$set"])
+        elif upsert:
+            self.documents[query["_id"]] = {"_id": query["_id"], **update["$set"]}
+
+    async def bulk_write(self, operations, ordered=True):
+        self.calls += 1
+
+        for operation in operations:
+            self.apply(operation._filter, operation._doc, operation._upsert)
+
+    async def delete_one(self, query):
+        self.calls += 1
+
+        for document in self.select(query)[:1]:
+            del self.documents[document["_id"]]
+
+    async def delete_many(self, query):
+        self.calls += 1
+
+        for document in self.select(query):
+            del self.documents[document["_id"]]
+
+    async def create_index(self, key):
+        pass
+
+
+class Database(dict):
+    def __missing__(self, name):
+        self[name] = Collection()
+        return self[name]
+
+
+class Connection:
+    def __init__(self, *args, **kwargs):
+        self.databases = Database()
+
+    def __getitem__(self, name):
+        return self.databases.setdefault(name, Database())
+
+    def get_database(self, name=None, **kwargs):
+        return self[name]
+
+    async def start_session(self, **kwargs):
+        raise NotImplementedError
+
+
+async def open_storage():
+    connection = Connection()
+    storage = MongoStorage("test", connection=connection)
+    await storage.open()
+
+    return storage, connection["test"]
+
+
+@pytest.mark.asyncio
+async def test_session_fields_are_cached():
+    storage, database = await open_storage()
+    session = database["session"]
+    calls = session.calls
+
+    for _ in range(10):
+        assert await storage.dc_id() == 2
+        assert await storage.auth_key() == b""
+
+    assert session.calls == calls + 1
+
+    await storage.auth_key(b"key")
+
+    assert await storage.auth_key() == b"key"
+    assert session.documents[0]["auth_key"] == b"key"
+    assert session.calls == calls + 2
+
+
+@pytest.mark.asyncio
+async def test_peer_writes_are_batched():
+    storage, database = await open_storage()
+
+    await storage.update_peers([(1, 10, "user", "one", None), (2, 20, "bot", None, None), (1, 11, "user", "one", None)])
+    await storage.update_usernames([(1, "one"), (1, "uno"), (2, "two")])
+
+    assert database["peers"].calls == 1
+    assert database["usernames"].calls == 2
+    assert await storage.get_peer_by_id(1) == raw.types.InputPeerUser(user_id=1, access_hash=11)
+    assert await storage.get_peer_by_username("uno") == raw.types.InputPeerUser(user_id=1, access_hash=11)
+
+    await storage.update_usernames([(1, "one")])
+
+    assert sorted(database["usernames"].documents) == ["one", "two"]
+
+
+@pytest.mark.asyncio
+async def test_prune_peers():
+    storage, database = await open_storage()
+
+    await storage.update_peers([(i, i, "user", None, None) for i in range(1, 6)])
+
+    for document in database["peers"].documents.values():
+        document["last_update_on"] -= document["_id"] * 1000
+
+    assert await storage.prune_peers(max_age=3500) == [5, 4]
+    assert await storage.prune_peers(max_peers=1) == [3, 2]
+    assert sorted(database["peers"].documents) == [1]
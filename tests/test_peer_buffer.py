@@ -0,0 +1,174 @@
+#  Pyrogram - Telegram MTProto API Client Library for Python
+#  Copyright (C) 2017-present Dan <https://github.com/delivrance>
+#
+#  This file is part of Pyrogram.
+#
+#  Pyrogram is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Pyrogram is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with Pyrogram.  If not, see <http://www.gnu.org/licenses/>.
+
+from types import SimpleNamespace
+
+import pytest
+
+from pyrogram import raw
+from pyrogram.storage import MemoryStorage
+from pyrogram.storage.peer_buffer import PeerBuffer
+from pyrogram.storage.peer_cache import PeerCache
+
+
+class CountingStorage(MemoryStorage):
+    def __init__(self):
+        super().__init__("test")
+
+        self.peer_writes = 0
+
+    async def update_peers(self, peers):
+        self.peer_writes += len(peers)
+        await super().update_peers(peers)
+
+
+async def open_buffer():
+    storage = CountingStorage()
+    await storage.open()
+
+    return PeerBuffer(SimpleNamespace(storage=storage)), storage
+
+
+@pytest.mark.asyncio
+async def test_unchanged_peers_are_not_rewritten():
+    buffer, storage = await open_buffer()
+    peers = [(i, i * 10, "user", f"user{i}", None) for i in range(1, 6)]
+
+    await buffer.update(peers, [])
+    await buffer.update(peers, [])
+    await buffer.flush()
+
+    assert storage.peer_writes == 5
+    assert buffer.get_stats()["skipped"] == 5
+
+    await buffer.update([(1, 11, "user", "user1", None)], [])
+    await buffer.flush()
+
+    assert storage.peer_writes == 6
+    assert buffer.get_stats()["flushes"] == 2
+
+
+@pytest.mark.asyncio
+async def test_pending_peers_are_visible_before_flush():
+    buffer, storage = await open_buffer()
+
+    await buffer.update([(1, 10, "user", "someone", "123")], [(1, "someone"), (1, "another")])
+
+    assert storage.peer_writes == 0
+    assert await buffer.get_peer_by_id(1) == raw.types.InputPeerUser(user_id=1, access_hash=10)
+    assert storage.peer_writes == 0
+
+    assert await buffer.get_peer_by_username("another") == raw.types.InputPeerUser(user_id=1, access_hash=10)
+    assert storage.peer_writes == 1
+    assert await buffer.get_peer_by_phone_number("123") == raw.types.InputPeerUser(user_id=1, access_hash=10)
+
+
+@pytest.mark.asyncio
+async def test_flush_on_size_and_stop():
+    buffer, storage = await open_buffer()
+    buffer.MAX_PENDING = 3
+
+    await buffer.update([(i, i, "user", None, None) for i in range(1, 3)], [])
+    assert storage.peer_writes == 0
+
+    await buffer.update([(3, 3, "user", None, None)], [])
+    assert storage.peer_writes == 3
+
+    buffer.start()
+    await buffer.update([(4, 4, "user", None, None)], [])
+    await buffer.stop()
+
+    assert storage.peer_writes == 4
+    assert buffer.flush_task is None
+
+
+class LookupCountingStorage(CountingStorage):
+    def __init__(self):
+        super().__init__()
+
+        self.lookups = 0
+
+    async def get_peer_by_id(self, peer_id):
+        self.lookups += 1
+        return await super().get_peer_by_id(peer_id)
+
+    async def get_peer_by_username(self, username):
+        self.lookups += 1
+        return await super().get_peer_by_username(username)
+
+
+@pytest.mark.asyncio
+async def test_lookups_are_cached_and_invalidated():
+    storage = LookupCountingStorage()
+    await storage.open()
+    buffer = PeerBuffer(SimpleNamespace(storage=storage))
+
+    await buffer.update([(1, 10, "user", "someone", None)], [])
+    await buffer.flush()
+
+    for _ in range(5):
+        assert await buffer.get_peer_by_id(1) == raw.types.InputPeerUser(user_id=1, access_hash=10)
+        assert await buffer.get_peer_by_username("someone") == raw.types.InputPeerUser(user_id=1, access_hash=10)
+
+    assert storage.lookups == 2
+
+    for _ in range(5):
+        with pytest.raises(KeyError):
+            await buffer.get_peer_by_username("nobody")
+
+    assert storage.lookups == 3
+
+    # A peer update replaces the cached entries, including the negative one for its new username
+    await buffer.update([(1, 11, "user", "nobody", None)], [])
+
+    assert await buffer.get_peer_by_username("nobody") == raw.types.InputPeerUser(user_id=1, access_hash=11)
+    assert await buffer.get_peer_by_id(1) == raw.types.InputPeerUser(user_id=1, access_hash=11)
+    assert ("username", "someone") not in buffer.cache.entries
+
+    stats = buffer.cache.get_stats()
+
+    assert stats["hits"] == 8 and stats["negative_hits"] == 4
+
+
+def test_cache_is_bounded():
+    cache = PeerCache(capacity=2)
+
+    for i in range(1, 4):
+        cache.put(("id", i), raw.types.InputPeerUser(user_id=i, access_hash=0))
+
+    assert list(cache.entries) == [("id", 2), ("id", 3)]
+    assert cache.get_stats()["evictions"] == 1
+    assert cache.keys_by_peer == {2: {("id", 2)}, 3: {("id", 3)}}
+
+
+@pytest.mark.asyncio
+async def test_pruned_peers_are_written_again():
+    buffer, storage = await open_buffer()
+    buffer.client.max_peers = 1
+    buffer.client.max_peer_age = None
+
+    await buffer.update([(1, 1, "user", None, None), (2, 2, "user", None, None)], [])
+    await buffer.flush()
+    await buffer.prune()
+
+    assert buffer.get_stats()["pruned"] == 1
+    assert len(await storage.read("SELECT id FROM peers")) == 1
+
+    await buffer.update([(1, 1, "user", None, None), (2, 2, "user", None, None)], [])
+
+    assert len(buffer.pending) == 1
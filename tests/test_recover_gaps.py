@@ -0,0 +1,141 @@
+#  Pyrogram - Telegram MTProto API Client Library for Python
+#  Copyright (C) 2017-present Dan <https://github.com/delivrance>
+#
+#  This file is part of Pyrogram.
+#
+#  Pyrogram is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Pyrogram is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with Pyrogram.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+
+import pytest
+
+import pyrogram
+from pyrogram.storage import MemoryStorage
+
+
+async def make_client(states, **kwargs):
+    client = pyrogram.Client("test", in_memory=True, **kwargs)
+    client.storage = MemoryStorage("test")
+    await client.storage.open()
+    await client.storage.update_states(states)
+
+    return client
+
+
+@pytest.mark.asyncio
+async def test_channels_are_recovered_concurrently():
+    client = await make_client([(0, 5, None, 1, None)] + [(-1000 - i, 10, None, 1, None) for i in range(6)],
+                               gap_recovery_workers=3)
+    running = []
+    peak = []
+
+    async def get_box_difference(id, local_pts, local_date, local_qts=0):
+        running.append(id)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.remove(id)
+
+        return 1, 2, (local_pts + 1, 0, local_date)
+
+    client.get_box_difference = get_box_difference
+
+    assert await client.recover_gaps() == (7, 14)
+    assert max(peak) == 3
+    assert client.updates_sequencer.states[0] == 6
+    assert client.updates_sequencer.states[-1003] == 11
+
+    await client.state_buffer.checkpoint()
+
+    assert await client.storage.update_state() == []
+
+
+@pytest.mark.asyncio
+async def test_background_recovery_holds_live_updates():
+    client = await make_client([(-1001, 10, None, 1, None)], gap_recovery_in_background=True)
+    client.dispatcher.updates_queue = asyncio.Queue()
+    release = asyncio.Event()
+
+    async def get_box_difference(id, local_pts, local_date, local_qts=0):
+        await release.wait()
+        await client.dispatcher.updates_queue.put("recovered")
+
+        return 1, 0, (11, 0, local_date)
+
+    client.get_box_difference = get_box_difference
+
+    await client.recover_gaps()
+    await client.updates_sequencer.put(-1001, 12, 1, 1, "live")
+
+    assert client.dispatcher.updates_queue.empty()
+
+    release.set()
+    await client.gap_recovery_task
+
+    queue = client.dispatcher.updates_queue
+
+    assert [queue.get_nowait() for _ in range(queue.qsize())] == ["recovered", "live"]
+
+
+@pytest.mark.asyncio
+async def test_recovery_keeps_newer_live_states():
+    client = await make_client([(0, 5, None, 1, None)])
+    client.dispatcher.updates_queue = asyncio.Queue()
+
+    async def get_box_difference(id, local_pts, local_date, local_qts=0):
+        # A live update is applied while the difference is being fetched
+        await client.updates_sequencer.put(0, 20, 1, 2, "live")
+
+        return 1, 0, (6, 0, local_date)
+
+    client.get_box_difference = get_box_difference
+
+    await client.recover_gaps()
+    await client.state_buffer.checkpoint()
+
+    assert client.updates_sequencer.states[0] == 20
+    assert await client.storage.update_state() == [(0, 20, None, 2, None)]
+
+
+@pytest.mark.asyncio
+async def test_box_difference_skips_sent_messages():
+    client = await make_client([])
+    responses = [
+        pyrogram.raw.types.updates.DifferenceSlice(
+            new_messages=[
+                pyrogram.raw.types.Message(
+                    id=i,
+                    peer_id=pyrogram.raw.types.PeerUser(user_id=1),
+                    date=1,
+                    message="",
+                    out=True
+                )
+                for i in (1, 2)
+            ],
+            new_encrypted_messages=[],
+            other_updates=[],
+            chats=[],
+            users=[],
+            intermediate_state=pyrogram.raw.types.updates.State(pts=20, qts=0, date=2, seq=0, unread_count=0)
+        ),
+        pyrogram.raw.types.updates.DifferenceTooLong(pts=50)
+    ]
+
+    async def invoke(query, *args, **kwargs):
+        return responses.pop(0)
+
+    client.invoke = invoke
+    client.updates_sequencer.remember_sent(0, 1)
+
+    assert await client.get_box_difference(0, 10, 1) == (1, 0, (50, 0, 2))
+    assert [update.message.id for update, _, _ in client.dispatcher.updates_queue._queue] == [2]
@@ -0,0 +1,183 @@
+#  Pyrogram - Telegram MTProto API Client Library for Python
+#  Copyright (C) 2017-present Dan <https://github.com/delivrance>
+#
+#  This file is part of Pyrogram.
+#
+#  Pyrogram is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Pyrogram is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with Pyrogram.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from pyrogram import raw  # noqa: E402
+from pyrogram.storage import RedisStorage  # noqa: E402
+
+
+async def open_storage(**kwargs):
+    connection = fakeredis.FakeAsyncRedis()
+    storage = RedisStorage("test", connection=connection, **kwargs)
+    await storage.open()
+
+    return storage, connection
+
+
+@pytest.mark.asyncio
+async def test_session_fields_are_cached():
+    storage, connection = await open_storage()
+
+    assert await storage.dc_id() == 2
+    assert await storage.auth_key() is None
+
+    await connection.hset("test:session", "dc_id", 4)
+
+    assert await storage.dc_id() == 2
+
+    await storage.auth_key(b"key")
+    await storage.is_bot(True)
+
+    assert await storage.auth_key() == b"key"
+    assert await connection.hget("test:session", "auth_key") == b"key"
+
+    reopened = RedisStorage("test", connection=connection)
+    await reopened.open()
+
+    assert await reopened.dc_id() == 4
+    assert await reopened.is_bot() is True
+    assert await reopened.user_id() is None
+
+
+@pytest.mark.asyncio
+async def test_peers_and_usernames():
+    storage, connection = await open_storage()
+
+    await storage.update_peers([(1, 10, "user", "one", "123"), (2, 20, "bot", None, None), (1, 11, "user", "one", "123")])
+    await storage.update_usernames([(1, "one"), (1, "uno"), (2, "two")])
+
+    assert await storage.get_peer_by_id(1) == raw.types.InputPeerUser(user_id=1, access_hash=11)
+    assert await storage.get_peer_by_username("uno") == raw.types.InputPeerUser(user_id=1, access_hash=11)
+    assert await storage.get_peer_by_phone_number("123") == raw.types.InputPeerUser(user_id=1, access_hash=11)
+
+    await storage.update_peers([(1, 11, "user", "first", None)])
+    await storage.update_usernames([(1, "first")])
+
+    for username in ("one", "uno"):
+        with pytest.raises(KeyError):
+            await storage.get_peer_by_username(username)
+
+    with pytest.raises(KeyError):
+        await storage.get_peer_by_phone_number("123")
+
+    assert await storage.get_peer_by_username("first") == raw.types.InputPeerUser(user_id=1, access_hash=11)
+
+    with pytest.raises(KeyError):
+        await storage.get_peer_by_id(3)
+
+
+@pytest.mark.asyncio
+async def test_min_peers_without_access_hash():
+    storage, _ = await open_storage()
+
+    await storage.update_peers([(1, None, "user", None, None), (2, 5, "user", "a", None)])
+
+    assert await storage.get_peer_by_id(1) == raw.types.InputPeerUser(user_id=1, access_hash=None)
+    assert await storage.get_peer_by_username("a") == raw.types.InputPeerUser(user_id=2, access_hash=5)
+
+    await storage.update_peers([(2, None, "user", "a", None)])
+
+    assert await storage.get_peer_by_id(2) == raw.types.InputPeerUser(user_id=2, access_hash=None)
+
+
+@pytest.mark.asyncio
+async def test_taken_usernames_are_kept():
+    storage, _ = await open_storage()
+
+    await storage.update_peers([(1, 10, "user", "a", "123")])
+    await storage.update_usernames([(1, "a"), (1, "x")])
+    # Peer 2 took both names and the phone number, peer 1 wasn't updated since
+    await storage.update_peers([(2, 20, "user", "a", "123")])
+    await storage.update_usernames([(2, "x")])
+
+    await storage.update_peers([(1, 10, "user", "b", None)])
+    await storage.update_usernames([(1, "b")])
+
+    assert await storage.get_peer_by_username("a") == raw.types.InputPeerUser(user_id=2, access_hash=20)
+    assert await storage.get_peer_by_username("x") == raw.types.InputPeerUser(user_id=2, access_hash=20)
+    assert await storage.get_peer_by_phone_number("123") == raw.types.InputPeerUser(user_id=2, access_hash=20)
+    assert await storage.get_peer_by_username("b") == raw.types.InputPeerUser(user_id=1, access_hash=10)
+
+
+@pytest.mark.asyncio
+async def test_raced_username_changes_are_retried():
+    storage, connection = await open_storage()
+
+    await storage.update_peers([(1, 10, "user", "a", None)])
+
+    watch_owned = storage.watch_owned
+    raced = []
+
+    async def racing_watch_owned(pipe, keys):
+        owned = await watch_owned(pipe, keys)
+
+        if not raced:
+            # Another process gives the name to peer 2 between the check and the transaction
+            raced.append(True)
+            await connection.set("test:username:a", 2)
+
+        return owned
+
+    storage.watch_owned = racing_watch_owned
+
+    await storage.update_peers([(1, 10, "user", "b", None)])
+
+    assert await connection.get("test:username:a") == b"2"
+    assert await storage.get_peer_by_username("b") == raw.types.InputPeerUser(user_id=1, access_hash=10)
+
+
+@pytest.mark.asyncio
+async def test_update_states():
+    storage, _ = await open_storage()
+
+    await storage.update_states([(1, 10, None, 100, None), (-1002, 20, None, 200, None)])
+    await storage.update_state((1, 11, 5, 101, 3))
+    await storage.update_state(-1002)
+
+    assert await storage.update_state() == [(1, 11, 5, 101, 3)]
+
+
+@pytest.mark.asyncio
+async def test_prune_peers():
+    storage, connection = await open_storage()
+
+    await storage.update_peers([(i, i, "user", f"user{i}", None) for i in range(1, 6)])
+    now = await connection.zscore("test:peers", 1)
+    await connection.zadd("test:peers", {i: now - i * 1000 for i in range(1, 6)})
+
+    assert await storage.prune_peers(max_age=3500) == [5, 4]
+    assert await storage.prune_peers(max_peers=1) == [3, 2]
+    assert await connection.zrange("test:peers", 0, -1) == [b"1"]
+
+    with pytest.raises(KeyError):
+        await storage.get_peer_by_username("user2")
+
+
+@pytest.mark.asyncio
+async def test_delete():
+    storage, connection = await open_storage(remove_peers=True)
+
+    await storage.update_peers([(1, 10, "user", "one", None)])
+    await storage.update_state((1, 10, None, 100, None))
+    await storage.delete()
+
+    assert await connection.keys("test:*") == []
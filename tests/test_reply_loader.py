@@ -0,0 +1,131 @@
+#  Pyrogram - Telegram MTProto API Client Library for Python
+#  Copyright (C) 2017-present Dan <https://github.com/delivrance>
+#
+#  This file is part of Pyrogram.
+#
+#  Pyrogram is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Pyrogram is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with Pyrogram.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import asyncio
+
+import pytest
+
+from pyrogram.errors import ChannelPrivate
+from pyrogram.reply_loader import ReplyLoader
+
+
+class Chat:
+    def __init__(self, chat_id: int):
+        self.id = chat_id
+
+
+class Message:
+    def __init__(self, chat_id: int, message_id: int):
+        self.chat = Chat(chat_id)
+        self.id = message_id
+        self.empty = False
+
+
+class Client:
+    def __init__(self):
+        self.requests = []
+        # (chat id, message id) -> replied message, for the replies that don't follow the n - 1000 rule
+        self.replies = {}
+
+    async def get_messages(self, chat_id, reply_to_message_ids=None, replies=1):
+        is_iterable = isinstance(reply_to_message_ids, list)
+        message_ids = reply_to_message_ids if is_iterable else [reply_to_message_ids]
+
+        self.requests.append((chat_id, list(message_ids), replies))
+
+        if chat_id == -100:
+            raise ChannelPrivate()
+
+        # Message n replies to message n - 1000 of the same chat, returned in reverse order
+        messages = [self.replies.get((chat_id, i)) or Message(chat_id, i - 1000) for i in reversed(message_ids)]
+
+        return messages if is_iterable else messages[0]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_lookups_share_requests():
+    client = Client()
+    loader = ReplyLoader(client)
+
+    results = await asyncio.gather(
+        *(loader.load(1, 1000 + i, i) for i in range(1, 6)),
+        loader.load(2, 1001, 1),
+        loader.load(1, 1001, 1, replies=1)
+    )
+
+    assert [r.id for r in results] == [1, 2, 3, 4, 5, 1, 1]
+    assert sorted(client.requests) == [
+        (1, [1001], 1),
+        (1, [1001, 1002, 1003, 1004, 1005], 0),
+        (2, [1001], 0)
+    ]
+    assert loader.get_stats() == {
+        "requests": 7,
+        "fetches": 3,
+        "saved": 4,
+        "max_batch_size": 5,
+        "mean_batch_size": 7 / 3
+    }
+
+
+@pytest.mark.asyncio
+async def test_batches_are_split():
+    client = Client()
+    loader = ReplyLoader(client)
+    loader.BATCH_SIZE = 2
+
+    results = await asyncio.gather(*(loader.load(1, 1000 + i, i) for i in range(1, 6)))
+
+    assert [r.id for r in results] == [1, 2, 3, 4, 5]
+    assert [len(request[1]) for request in client.requests] == [2, 2, 1]
+
+
+@pytest.mark.asyncio
+async def test_errors_reach_every_caller():
+    loader = ReplyLoader(Client())
+
+    results = await asyncio.gather(
+        loader.load(-100, 1001, 1),
+        loader.load(-100, 1002, 2),
+        return_exceptions=True
+    )
+
+    assert all(isinstance(r, ChannelPrivate) for r in results)
+
+
+@pytest.mark.asyncio
+async def test_unmatched_lookups_are_fetched_alone():
+    client = Client()
+    client.replies[(1, 1002)] = Message(2, 2)
+    client.replies[(1, 1003)] = Message(1, 9)
+    loader = ReplyLoader(client)
+
+    results = await asyncio.gather(
+        loader.load(1, 1001, 1),
+        loader.load(1, 1002, 2, reply_to_chat_id=2),
+        loader.load(1, 1003, 3),
+        loader.load(1, 1004, None)
+    )
+
+    assert [(r.chat.id, r.id) for r in results] == [(1, 1), (2, 2), (1, 9), (1, 4)]
+    assert client.requests == [
+        (1, [1001, 1002, 1003], 0),
+        (1, [1004], 0),
+        (1, [1003], 0)
+    ]
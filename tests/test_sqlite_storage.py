@@ -0,0 +1,191 @@
+#  Pyrogram - Telegram MTProto API Client Library for Python
+#  Copyright (C) 2017-present Dan <https://github.com/delivrance>
+#
+#  This file is part of Pyrogram.
+#
+#  Pyrogram is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Pyrogram is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with Pyrogram.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+from pathlib import Path
+
+import pytest
+
+from pyrogram import raw
+from pyrogram.storage import FileStorage, MemoryStorage
+
+
+@pytest.mark.asyncio
+async def test_file_storage_runs_off_the_event_loop(tmp_path):
+    storage = FileStorage("test", tmp_path)
+    await storage.open()
+
+    assert storage.read_conn is not None
+    assert await storage.run(threading.get_ident) != threading.get_ident()
+
+    await storage.dc_id(4)
+    await storage.update_peers([(1, 10, "user", "someone", "123")])
+
+    assert await storage.dc_id() == 4
+    assert await storage.get_peer_by_id(1) == raw.types.InputPeerUser(user_id=1, access_hash=10)
+    assert await storage.get_peer_by_username("someone") == raw.types.InputPeerUser(user_id=1, access_hash=10)
+
+    await storage.save()
+    await storage.close()
+
+    assert storage.writer is None and storage.reader is None
+
+    storage = FileStorage("test", tmp_path)
+    await storage.open()
+
+    assert await storage.dc_id() == 4
+    assert await storage.get_peer_by_phone_number("123") == raw.types.InputPeerUser(user_id=1, access_hash=10)
+
+    await storage.close()
+
+
+@pytest.mark.asyncio
+async def test_file_storage_opens_a_relative_workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    storage = FileStorage("test", Path("."))
+    await storage.open()
+    await storage.dc_id(4)
+
+    assert await storage.run(lambda: storage.read_conn.execute("SELECT dc_id FROM sessions").fetchone()) == (4,)
+
+    await storage.close()
+
+
+@pytest.mark.asyncio
+async def test_memory_storage_reads_through_the_writer():
+    storage = MemoryStorage("test")
+    await storage.open()
+
+    assert storage.read_conn is None
+
+    await storage.update_states([(1, 2, None, 3, None)])
+
+    assert await storage.update_state() == [(1, 2, None, 3, None)]
+
+    await storage.close()
+
+
+@pytest.mark.asyncio
+async def test_file_storage_compacts_only_when_needed(tmp_path):
+    storage = FileStorage("test", tmp_path)
+    await storage.open()
+    await storage.maintenance_task
+
+    assert await storage.run(lambda: storage.conn.execute("PRAGMA journal_mode").fetchone()[0]) == "wal"
+    assert not await storage.maintain()
+
+    await storage.update_peers([(i, i, "user", f"user{i}", None) for i in range(1, 5001)])
+    await storage.run(lambda: storage.conn.execute("DELETE FROM peers") and storage.conn.commit())
+
+    assert await storage.maintain()
+    assert not await storage.maintain()
+
+    storage.vacuum_free_ratio = None
+    storage.vacuum_interval = 0
+
+    assert await storage.maintain()
+
+    await storage.close()
+
+
+@pytest.mark.asyncio
+async def test_session_row_is_read_once(tmp_path):
+    storage = FileStorage("test", tmp_path)
+    await storage.open()
+
+    queries = []
+    read = storage.read
+
+    async def counting_read(query, params=()):
+        queries.append(query)
+        return await read(query, params)
+
+    storage.read = counting_read
+
+    for _ in range(10):
+        assert await storage.dc_id() == 2
+        assert await storage.auth_key() is None
+
+    await storage.auth_key(b"key")
+
+    assert await storage.auth_key() == b"key"
+    assert len(queries) == 1
+
+    await storage.close()
+
+    storage = FileStorage("test", tmp_path)
+    await storage.open()
+
+    assert await storage.auth_key() == b"key"
+
+    await storage.close()
+
+
+@pytest.mark.asyncio
+async def test_prune_peers():
+    storage = MemoryStorage("test")
+    await storage.open()
+
+    await storage.update_peers([(i, i, "user", None, None) for i in range(1, 11)])
+    await storage.update_usernames([(1, "one"), (1, "uno"), (5, "five")])
+    await storage.run(lambda: storage.conn.execute(
+        "UPDATE peers SET last_update_on = last_update_on - id * 1000"
+    ) and storage.conn.commit())
+
+    # Oldest first: the highest ids were moved furthest back in time
+    assert await storage.prune_peers(max_age=8500) == [10, 9]
+    assert await storage.prune_peers(max_peers=5, limit=2) == [8, 7]
+    assert await storage.prune_peers(max_peers=5) == [6]
+    assert await storage.prune_peers(max_peers=5, max_age=10 ** 6) == []
+    assert await storage.prune_peers() == []
+
+    await storage.prune_peers(max_peers=0)
+
+    assert await storage.read("SELECT * FROM usernames") == []
+
+    await storage.close()
+
+
+@pytest.mark.asyncio
+async def test_file_storage_migrates_peers_trigger(tmp_path):
+    storage = FileStorage("test", tmp_path)
+    await storage.open()
+
+    def downgrade():
+        with storage.conn:
+            storage.conn.execute("DROP INDEX idx_peers_last_update_on")
+            storage.conn.execute(
+                "CREATE TRIGGER trg_peers_last_update_on AFTER UPDATE ON peers BEGIN "
+                "UPDATE peers SET last_update_on = 0 WHERE id = NEW.id; END"
+            )
+        storage.version(4)
+
+    await storage.run(downgrade)
+    await storage.close()
+
+    storage = FileStorage("test", tmp_path)
+    await storage.open()
+
+    names = [r[0] for r in await storage.read("SELECT name FROM sqlite_master")]
+
+    assert "trg_peers_last_update_on" not in names
+    assert "idx_peers_last_update_on" in names
+    assert await storage.run(storage.version) == 5
+
+    await storage.close()
@@ -0,0 +1,93 @@
+#  Pyrogram - Telegram MTProto API Client Library for Python
+#  Copyright (C) 2017-present Dan <https://github.com/delivrance>
+#
+#  This file is part of Pyrogram.
+#
+#  Pyrogram is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Pyrogram is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with Pyrogram.  If not, see <http://www.gnu.org/licenses/>.
+
+from types import SimpleNamespace
+
+import pytest
+
+from pyrogram.storage import MemoryStorage
+from pyrogram.storage.state_buffer import StateBuffer
+
+
+class CountingStorage(MemoryStorage):
+    def __init__(self):
+        super().__init__("test")
+
+        self.batches = 0
+
+    async def update_states(self, values):
+        self.batches += 1
+        await super().update_states(values)
+
+
+async def open_buffer(**kwargs):
+    storage = CountingStorage()
+    await storage.open()
+
+    return StateBuffer(SimpleNamespace(storage=storage), **kwargs), storage
+
+
+@pytest.mark.asyncio
+async def test_only_latest_state_is_checkpointed():
+    buffer, storage = await open_buffer(interval=60)
+
+    for pts in range(1, 101):
+        await buffer.update((0, pts, None, pts, None))
+        await buffer.update((-1001, pts * 2, None, pts, None))
+
+    assert await storage.update_state() == []
+
+    await buffer.checkpoint()
+
+    assert sorted(await storage.update_state()) == [(-1001, 200, None, 100, None), (0, 100, None, 100, None)]
+    assert storage.batches == 1
+    assert buffer.get_stats() == {"updated": 200, "written": 2, "checkpoints": 1, "pending": 0}
+
+
+@pytest.mark.asyncio
+async def test_threshold_and_write_through():
+    buffer, storage = await open_buffer(interval=60, threshold=2)
+
+    await buffer.update((1, 1, None, 1, None))
+    assert storage.batches == 0
+
+    await buffer.update((2, 1, None, 1, None))
+    assert storage.batches == 1
+
+    buffer, storage = await open_buffer(interval=0)
+
+    await buffer.update((1, 1, None, 1, None))
+    assert await storage.update_state() == [(1, 1, None, 1, None)]
+
+
+@pytest.mark.asyncio
+async def test_remove_and_stop():
+    buffer, storage = await open_buffer(interval=60)
+
+    await buffer.update((1, 1, None, 1, None))
+    await buffer.update((2, 1, None, 1, None))
+    await buffer.checkpoint()
+
+    await buffer.remove(1)
+    await buffer.update((2, 5, None, 2, None))
+
+    buffer.start()
+    await buffer.stop()
+
+    assert await storage.update_state() == [(2, 5, None, 2, None)]
+    assert buffer.checkpoint_task is None
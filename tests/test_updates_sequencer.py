@@ -0,0 +1,257 @@
+#  Pyrogram - Telegram MTProto API Client Library for Python
+#  Copyright (C) 2017-present Dan <https://github.com/delivrance>
+#
+#  This file is part of Pyrogram.
+#
+#  Pyrogram is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Pyrogram is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with Pyrogram.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from pyrogram import enums, raw
+from pyrogram.dispatcher import UpdatesQueue
+from pyrogram.updates_sequencer import UpdatesSequencer
+
+
+class StateBuffer:
+    def __init__(self):
+        self.states = {}
+
+    async def update(self, value):
+        self.states[value[0]] = value
+
+
+class Client:
+    def __init__(self, difference=None):
+        self.dispatcher = SimpleNamespace(updates_queue=asyncio.Queue())
+        self.state_buffer = StateBuffer()
+        self.difference = difference
+        self.difference_calls = []
+
+    async def get_box_difference(self, box_id, pts, date, qts=0):
+        self.difference_calls.append((box_id, pts))
+
+        for item in self.difference["items"]:
+            await self.dispatcher.updates_queue.put(item)
+
+        return len(self.difference["items"]), 0, (self.difference["pts"], 0, date)
+
+
+def drain(queue: asyncio.Queue):
+    items = []
+
+    while not queue.empty():
+        items.append(queue.get_nowait())
+
+    return items
+
+
+@pytest.mark.asyncio
+async def test_in_order_and_duplicates():
+    client = Client()
+    sequencer = UpdatesSequencer(client)
+
+    await sequencer.put(0, 10, 1, 1, "a")
+    await sequencer.put(0, 11, 1, 1, "b")
+    await sequencer.put(0, 11, 1, 1, "b")
+    await sequencer.put(0, 13, 2, 1, "c")
+
+    assert drain(client.dispatcher.updates_queue) == ["a", "b", "c"]
+    assert sequencer.get_stats()["duplicates"] == 1
+    assert client.state_buffer.states[0] == (0, 13, None, 1, None)
+
+
+@pytest.mark.asyncio
+async def test_out_of_order_updates_are_reordered():
+    client = Client()
+    sequencer = UpdatesSequencer(client)
+
+    await sequencer.put(-100, 10, 1, 1, "a")
+    await sequencer.put(-100, 13, 1, 1, "d")
+    await sequencer.put(-100, 12, 1, 1, "c")
+
+    assert drain(client.dispatcher.updates_queue) == ["a"]
+
+    await sequencer.put(-100, 11, 1, 1, "b")
+
+    assert drain(client.dispatcher.updates_queue) == ["b", "c", "d"]
+    assert sequencer.get_stats() == {"gaps": 1, "fills": 1, "differences": 0, "duplicates": 0, "pending": 0}
+    assert not sequencer.gap_tasks
+
+
+@pytest.mark.asyncio
+async def test_unfilled_gap_fetches_difference():
+    client = Client(difference={"items": ["b"], "pts": 11})
+    sequencer = UpdatesSequencer(client)
+    sequencer.GAP_TIMEOUT = 0
+
+    await sequencer.put(-100, 10, 1, 1, "a")
+    await sequencer.put(-100, 12, 1, 1, "c")
+    await sequencer.gap_tasks[-100]
+
+    assert client.difference_calls == [(-100, 10)]
+    assert drain(client.dispatcher.updates_queue) == ["a", "b", "c"]
+    assert sequencer.states[-100] == 12
+    assert sequencer.get_stats()["differences"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_difference_skips_gap():
+    client = Client(difference={"items": [], "pts": 10})
+    sequencer = UpdatesSequencer(client)
+    sequencer.GAP_TIMEOUT = 0
+
+    await sequencer.put(-100, 10, 1, 1, "a")
+    await sequencer.put(-100, 15, 1, 1, "c")
+    await sequencer.gap_tasks[-100]
+
+    assert drain(client.dispatcher.updates_queue) == ["a", "c"]
+    assert sequencer.states[-100] == 15
+    assert not sequencer.pending
+
+
+@pytest.mark.asyncio
+async def test_held_box_waits_for_release():
+    client = Client()
+    sequencer = UpdatesSequencer(client)
+
+    sequencer.hold(-100)
+
+    await sequencer.put(-100, 11, 1, 1, "live-1")
+    await sequencer.put(-100, 12, 1, 1, "live-2")
+    await sequencer.put(-200, 5, 1, 1, "other")
+
+    assert drain(client.dispatcher.updates_queue) == ["other"]
+
+    await client.dispatcher.updates_queue.put("recovered")
+    await sequencer.release(-100, 11)
+
+    assert drain(client.dispatcher.updates_queue) == ["recovered", "live-2"]
+    assert sequencer.states[-100] == 12
+    assert not sequencer.gap_tasks
+
+
+def sent_message(message_id, channel_id=None):
+    return raw.types.Message(
+        id=message_id,
+        peer_id=raw.types.PeerChannel(channel_id=channel_id) if channel_id else raw.types.PeerUser(user_id=1),
+        date=1,
+        message="sent",
+        out=True
+    )
+
+
+@pytest.mark.asyncio
+async def test_method_results_advance_boxes():
+    client = Client()
+    sequencer = UpdatesSequencer(client)
+
+    await sequencer.put(0, 10, 1, 1, "a")
+    await sequencer.put(-1000000000100, 20, 1, 1, "b")
+
+    await sequencer.apply_result(
+        raw.functions.messages.SendMessage(peer=raw.types.InputPeerSelf(), message="sent", random_id=1),
+        raw.types.UpdateShortSentMessage(id=5, pts=11, pts_count=1, date=2)
+    )
+    await sequencer.apply_result(
+        raw.functions.channels.DeleteMessages(
+            channel=raw.types.InputChannel(channel_id=100, access_hash=0),
+            id=[1]
+        ),
+        raw.types.messages.AffectedMessages(pts=21, pts_count=1)
+    )
+    await sequencer.apply_result(
+        raw.functions.messages.SendMessage(peer=raw.types.InputPeerSelf(), message="sent", random_id=2),
+        raw.types.Updates(
+            updates=[raw.types.UpdateNewMessage(message=sent_message(6), pts=12, pts_count=1)],
+            users=[],
+            chats=[],
+            date=2,
+            seq=0
+        )
+    )
+
+    await sequencer.put(0, 13, 1, 2, "c")
+    await sequencer.put(-1000000000100, 22, 1, 2, "d")
+
+    assert drain(client.dispatcher.updates_queue) == ["a", "b", "c", "d"]
+    assert not sequencer.gap_tasks
+    assert sequencer.is_sent(sent_message(5))
+    assert sequencer.is_sent(sent_message(6))
+    assert not sequencer.is_sent(sent_message(6, channel_id=100))
+
+
+@pytest.mark.asyncio
+async def test_method_results_do_not_wait_for_a_full_queue():
+    client = Client()
+    client.dispatcher.updates_queue = UpdatesQueue(1, enums.UpdatesOverflowPolicy.BLOCK)
+    sequencer = UpdatesSequencer(client)
+
+    await sequencer.put(0, 10, 1, 1, "a")
+    await sequencer.put(0, 12, 1, 1, "c")
+
+    await asyncio.wait_for(
+        sequencer.apply_result(
+            raw.functions.messages.SendMessage(peer=raw.types.InputPeerSelf(), message="sent", random_id=1),
+            raw.types.UpdateShortSentMessage(id=5, pts=11, pts_count=1, date=2)
+        ),
+        1
+    )
+
+    assert sequencer.states[0] == 12
+    assert drain(client.dispatcher.updates_queue) == ["a", "c"]
+
+    await sequencer.stop()
+
+
+@pytest.mark.asyncio
+async def test_uncounted_updates_keep_the_reference():
+    client = Client(difference={"items": ["missed"], "pts": 30})
+    sequencer = UpdatesSequencer(client)
+
+    await sequencer.put(-100, 10, 1, 1, "a")
+    await sequencer.put(-100, 25, None, 1, "too-long")
+
+    assert sequencer.states[-100] == 10
+
+    sequencer.fetch_difference(-100)
+    await sequencer.gap_tasks[-100]
+
+    assert client.difference_calls == [(-100, 10)]
+    assert drain(client.dispatcher.updates_queue) == ["a", "too-long", "missed"]
+    assert sequencer.states[-100] == 30
+
+
+@pytest.mark.asyncio
+async def test_filled_seq_hole_skips_difference():
+    client = Client()
+    sequencer = UpdatesSequencer(client)
+    sequencer.GAP_TIMEOUT = 0
+
+    def container(seq):
+        return raw.types.Updates(updates=[], users=[], chats=[], date=1, seq=seq)
+
+    await sequencer.put(0, 10, 1, 1, "a")
+    sequencer.check_seq(container(1))
+    sequencer.check_seq(container(3))
+    task = sequencer.gap_tasks[0]
+
+    sequencer.check_seq(container(2))
+    await task
+
+    assert client.difference_calls == []
+    assert sequencer.get_stats()["differences"] == 0
+    assert sequencer.get_stats()["fills"] == 1